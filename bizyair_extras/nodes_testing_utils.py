@@ -7,11 +7,10 @@ import os
 import random
 
 import folder_paths
-import numpy as np
 from PIL import Image
 
 from bizyair import NODE_CLASS_MAPPINGS
-from bizyair.image_utils import decode_data, encode_data
+from bizyair.image_utils import comfy_image_to_uint8, decode_data, encode_data
 
 
 class ImagesTest:
@@ -76,8 +75,7 @@ class ImagesTest:
             # image diff
             image = image1.cpu() - image2.cpu()
 
-            i = 255.0 * image.cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
+            img = Image.fromarray(comfy_image_to_uint8(image))
             metadata = None
             file = f"{filename}_{counter:05}_.png"
             img.save(
@@ -110,9 +108,7 @@ class ImagesTest:
         return {"ui": {"images": results}}
 
     def image_to_numpy(self, image):
-        i = 255.0 * image.cpu().numpy()
-        img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-        return np.array(img)
+        return comfy_image_to_uint8(image)
 
 
 class ImageEncodeDecodeTest:
@@ -6,6 +6,7 @@ from aiohttp import web
 from server import PromptServer
 
 from bizyair.common.env_var import BIZYAIR_SERVER_ADDRESS
+from bizyair.common.governor import governor
 from bizyair.image_utils import decode_data, encode_comfy_image, encode_data
 
 from .utils import (
@@ -25,9 +26,10 @@ async def fetch_all_models(api_key):
 
     try:
         async with aiohttp.ClientSession() as session:
-            async with session.get(
+            async with governor.async_slot(), session.get(
                 url, headers=headers, params=params, timeout=10
             ) as response:
+                governor.observe(response.status, response.headers.get("Retry-After"))
                 if response.status == 200:
                     data = await response.json()
                     all_models = [model["id"] for model in data["data"]]
@@ -18,6 +18,8 @@ class ProgressCallback:
         self.pbar = comfy.utils.ProgressBar(None)
 
     def __call__(self, value, total=None, preview=None):
+        # Raising here also aborts a streaming request when the prompt is cancelled
+        comfy.model_management.throw_exception_if_processing_interrupted()
         self.pbar.update_absolute(value, total, preview)
 
 
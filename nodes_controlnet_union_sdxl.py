@@ -7,12 +7,11 @@ import json
 import os
 
 import numpy as np
-import requests
 
 from bizyair.common.env_var import BIZYAIR_SERVER_ADDRESS
 from bizyair.image_utils import decode_comfy_image, encode_comfy_image
 
-from .utils import get_api_key
+from .utils import get_api_key, send_post_request
 
 
 class StableDiffusionXLControlNetUnionPipeline:
@@ -141,16 +140,10 @@ class StableDiffusionXLControlNetUnionPipeline:
         }
         payload.update(**kwargs)
 
-        response = requests.post(
-            self.API_URL,
-            json=payload,
-            headers=self.get_headers(),
+        result = json.loads(
+            send_post_request(self.API_URL, payload=payload, headers=self.get_headers())
         )
 
-        result = response.json()
-        if response.status_code != 200:
-            raise RuntimeError(f"Failed to create task: {result['error']}")
-
         if "result" in result:  # cloud
             msg = json.loads(result["result"])
             if "error" in msg:
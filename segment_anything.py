@@ -4,12 +4,16 @@ import os
 from enum import Enum
 
 import folder_paths
-import numpy as np
 import torch
 from PIL import Image, ImageOps, ImageSequence
 
 from bizyair.common.env_var import BIZYAIR_SERVER_ADDRESS
-from bizyair.image_utils import decode_base64_to_np, encode_image_to_base64
+from bizyair.image_utils import (
+    comfy_image_to_uint8,
+    decode_base64_to_np,
+    encode_image_to_base64,
+    uint8_to_comfy_image,
+)
 from nodes import LoadImage
 
 from .route_sam import SAM_COORDINATE
@@ -77,8 +81,7 @@ class BizyAirSegmentAnythingText:
             "content-type": "application/json",
             "authorization": auth,
         }
-        image = image.squeeze(0).numpy()
-        image_pil = Image.fromarray((image * 255).astype(np.uint8))
+        image_pil = Image.fromarray(comfy_image_to_uint8(image.squeeze(0)))
         input_image = encode_image_to_base64(image_pil, format="webp")
         payload["image"] = input_image
 
@@ -105,12 +108,12 @@ class BizyAirSegmentAnythingText:
         mask_image = msg["mask_image"]
 
         img = (
-            (torch.from_numpy(decode_base64_to_np(img)).float() / 255.0)
+            torch.from_numpy(uint8_to_comfy_image(decode_base64_to_np(img)))
             .unsqueeze(0)
             .to(device)
         )
-        img_mask = (
-            torch.from_numpy(decode_base64_to_np(mask_image)).float() / 255.0
+        img_mask = torch.from_numpy(
+            uint8_to_comfy_image(decode_base64_to_np(mask_image))
         ).to(device)
         img_mask = img_mask.mean(dim=-1)
         img_mask = img_mask.unsqueeze(0)
@@ -205,8 +208,7 @@ class BizyAirSegmentAnythingPointBox:
             "content-type": "application/json",
             "authorization": auth,
         }
-        image = image.squeeze(0).numpy()
-        image_pil = Image.fromarray((image * 255).astype(np.uint8))
+        image_pil = Image.fromarray(comfy_image_to_uint8(image.squeeze(0)))
         input_image = encode_image_to_base64(image_pil, format="webp")
         payload["image"] = input_image
 
@@ -233,12 +235,12 @@ class BizyAirSegmentAnythingPointBox:
         mask_image = msg["mask_image"]
 
         img = (
-            (torch.from_numpy(decode_base64_to_np(img)).float() / 255.0)
+            torch.from_numpy(uint8_to_comfy_image(decode_base64_to_np(img)))
             .unsqueeze(0)
             .to(device)
         )
-        img_mask = (
-            torch.from_numpy(decode_base64_to_np(mask_image)).float() / 255.0
+        img_mask = torch.from_numpy(
+            uint8_to_comfy_image(decode_base64_to_np(mask_image))
         ).to(device)
         img_mask = img_mask.mean(dim=-1)
         img_mask = img_mask.unsqueeze(0)
@@ -1,13 +1,6 @@
-import threading
-
-from .execution import upload_worker
 from .server import BizyAirServer
 
 bizy_server = BizyAirServer()
-threading.Thread(
-    target=upload_worker,
-    daemon=True,
-    args=(bizy_server, bizy_server.upload_queue),
-).start()
+bizy_server.upload_queue.start(bizy_server.loop, bizy_server.upload_manager.do_upload)
 if bizy_server:
     print("\n\n\033[92m[BizyAir]\033[0m Model hosting service initialized.\n\n")
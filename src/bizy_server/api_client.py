@@ -1,14 +1,15 @@
+import asyncio
 import json
 import os
-import urllib.parse
-import urllib.request
 from collections import defaultdict
 
-import requests
+import aiohttp
 
 import bizyair
 import bizyair.common
 from bizyair.common.env_var import BIZYAIR_SERVER_ADDRESS
+from bizyair.common.governor import governor
+from bizyair.common.transport import get_aiohttp_session
 
 from .errno import (
     CHANGE_PUBLIC_ERR,
@@ -31,14 +32,19 @@ from .errno import (
 )
 from .error_handler import ErrorHandler
 
+_TIMEOUT = aiohttp.ClientTimeout(total=3)
+
 
 class APIClient:
     def __init__(self):
         self.error_handler = ErrorHandler()
 
-    def auth_header(self):
+    async def auth_header(self):
         try:
-            api_key = bizyair.common.get_api_key()
+            # Validating the key can take a request to the server
+            api_key = await asyncio.get_running_loop().run_in_executor(
+                None, bizyair.common.get_api_key
+            )
             auth = f"Bearer {api_key}"
             headers = {
                 "accept": "application/json",
@@ -51,30 +57,41 @@ class APIClient:
             INVALID_API_KEY_ERR.message = error_message
             return None, INVALID_API_KEY_ERR
 
-    def do_get(self, url, params=None, headers=None):
-        if params:
-            query_string = urllib.parse.urlencode(params)
-            url = f"{url}?{query_string}"
-        response = requests.get(url, params=params, headers=headers, timeout=3)
-        return response.text
+    async def _request(self, method, url, params=None, data=None, headers=None):
+        _, _, text = await self._fetch(method, url, params, data, headers)
+        return text
 
-    def do_post(self, url, data=None, headers=None):
+    async def _fetch(self, method, url, params=None, data=None, headers=None):
+        """Status, headers and body text of a request."""
+        if params:
+            # Same query string as urlencode, aiohttp rejects bool values
+            params = {key: str(value) for key, value in params.items()}
         if data:
             data = json.dumps(data)
-        response = requests.post(url, data=data, headers=headers, timeout=3)
-        return response.text
-
-    def do_put(self, url, data=None, headers=None):
-        if data:
-            data = bytes(json.dumps(data), "utf-8")
-        response = requests.put(url, data=data, headers=headers, timeout=3)
-        return response.text
-
-    def do_delete(self, url, data=None, headers=None):
-        if data:
-            data = bytes(json.dumps(data), "utf-8")
-        response = requests.delete(url, data=data, headers=headers, timeout=3)
-        return response.text
+        # Shared keep-alive session of the running loop, never blocks the loop
+        session = get_aiohttp_session()
+        async with governor.async_slot(), session.request(
+            method,
+            url,
+            params=params,
+            data=data,
+            headers=headers,
+            timeout=_TIMEOUT,
+        ) as response:
+            governor.observe(response.status, response.headers.get("Retry-After"))
+            return response.status, response.headers, await response.text()
+
+    async def do_get(self, url, params=None, headers=None):
+        return await self._request("GET", url, params=params, headers=headers)
+
+    async def do_post(self, url, data=None, headers=None):
+        return await self._request("POST", url, data=data, headers=headers)
+
+    async def do_put(self, url, data=None, headers=None):
+        return await self._request("PUT", url, data=data, headers=headers)
+
+    async def do_delete(self, url, data=None, headers=None):
+        return await self._request("DELETE", url, data=data, headers=headers)
 
     async def check_model(self, type: str, name: str) -> (bool, ErrorNo):
         server_url = f"{BIZYAIR_SERVER_ADDRESS}/models/check"
@@ -83,12 +100,12 @@ class APIClient:
             "name": name,
             "type": type,
         }
-        headers, err = self.auth_header()
+        headers, err = await self.auth_header()
         if err is not None:
             return None, err
 
         try:
-            resp = self.do_get(server_url, params=payload, headers=headers)
+            resp = await self.do_get(server_url, params=payload, headers=headers)
             ret = json.loads(resp)
             if ret["code"] != CODE_OK:
                 return None, ErrorNo(500, ret["code"], None, ret["message"])
@@ -100,12 +117,12 @@ class APIClient:
 
     async def sign(self, signature: str) -> (dict, ErrorNo):
         server_url = f"{BIZYAIR_SERVER_ADDRESS}/files/{signature}"
-        headers, err = self.auth_header()
+        headers, err = await self.auth_header()
         if err is not None:
             return None, err
 
         try:
-            resp = self.do_get(server_url, params=None, headers=headers)
+            resp = await self.do_get(server_url, params=None, headers=headers)
             ret = json.loads(resp)
             if ret["code"] != CODE_OK:
                 return None, ErrorNo(500, ret["code"], None, ret["message"])
@@ -123,12 +140,12 @@ class APIClient:
             "sign": signature,
             "object_key": object_key,
         }
-        headers, err = self.auth_header()
+        headers, err = await self.auth_header()
         if err is not None:
             return None, err
 
         try:
-            resp = self.do_post(server_url, data=payload, headers=headers)
+            resp = await self.do_post(server_url, data=payload, headers=headers)
             ret = json.loads(resp)
             if ret["code"] != CODE_OK:
                 return None, ErrorNo(500, ret["code"], None, ret["message"])
@@ -149,12 +166,12 @@ class APIClient:
             "overwrite": overwrite,
             "files": model_files,
         }
-        headers, err = self.auth_header()
+        headers, err = await self.auth_header()
         if err is not None:
             return None, err
 
         try:
-            resp = self.do_post(server_url, data=payload, headers=headers)
+            resp = await self.do_post(server_url, data=payload, headers=headers)
             ret = json.loads(resp)
             if ret["code"] != CODE_OK:
                 return None, ErrorNo(500, ret["code"], None, ret["message"])
@@ -171,12 +188,12 @@ class APIClient:
             "name": model_name,
             "type": model_type,
         }
-        headers, err = self.auth_header()
+        headers, err = await self.auth_header()
         if err is not None:
             return err
 
         try:
-            resp = self.do_delete(server_url, data=payload, headers=headers)
+            resp = await self.do_delete(server_url, data=payload, headers=headers)
             ret = json.loads(resp)
             if ret["code"] != CODE_OK:
                 return ErrorNo(500, ret["code"], None, ret["message"])
@@ -196,12 +213,12 @@ class APIClient:
             "type": model_type,
             "public": public,
         }
-        headers, err = self.auth_header()
+        headers, err = await self.auth_header()
         if err is not None:
             return err
 
         try:
-            resp = self.do_put(server_url, data=payload, headers=headers)
+            resp = await self.do_put(server_url, data=payload, headers=headers)
             ret = json.loads(resp)
             if ret["code"] != CODE_OK:
                 return ErrorNo(500, ret["code"], None, ret["message"])
@@ -212,13 +229,13 @@ class APIClient:
             return CHANGE_PUBLIC_ERR
 
     async def get_model_files(self, payload) -> (dict, ErrorNo):
-        headers, err = self.auth_header()
+        headers, err = await self.auth_header()
         if err is not None:
             return None, err
 
         server_url = f"{BIZYAIR_SERVER_ADDRESS}/models/files"
         try:
-            resp = self.do_get(server_url, params=payload, headers=headers)
+            resp = await self.do_get(server_url, params=payload, headers=headers)
             ret = json.loads(resp)
             if ret["code"] != CODE_OK:
                 if ret["code"] == CODE_NO_MODEL_FOUND:
@@ -280,13 +297,13 @@ class APIClient:
             return [], LIST_SHARE_MODEL_FILE_ERR
 
     async def get_models(self, payload) -> (dict, ErrorNo):
-        headers, err = self.auth_header()
+        headers, err = await self.auth_header()
         if err is not None:
             return None, err
 
         server_url = f"{BIZYAIR_SERVER_ADDRESS}/models"
         try:
-            resp = self.do_get(server_url, params=payload, headers=headers)
+            resp = await self.do_get(server_url, params=payload, headers=headers)
             ret = json.loads(resp)
             if ret["code"] != CODE_OK:
                 return None, ErrorNo(500, ret["code"], None, ret["message"])
@@ -300,14 +317,42 @@ class APIClient:
         models = ret["data"]["models"]
         return models, None
 
+    async def poll_models(self, payload, etag: str = None) -> (list, str, ErrorNo):
+        """
+        Like get_models, but conditional on the ETag of an earlier answer.
+        The models are None when the list did not change since then.
+        """
+        headers, err = await self.auth_header()
+        if err is not None:
+            return None, etag, err
+        if etag:
+            headers["if-none-match"] = etag
+
+        server_url = f"{BIZYAIR_SERVER_ADDRESS}/models"
+        try:
+            status, resp_headers, resp = await self._fetch(
+                "GET", server_url, params=payload, headers=headers
+            )
+            if status == 304:
+                return None, etag, None
+            ret = json.loads(resp)
+            if ret["code"] != CODE_OK:
+                return None, etag, ErrorNo(500, ret["code"], None, ret["message"])
+        except Exception as e:
+            print(f"\033[31m[BizyAir]\033[0m Fail to list model: {str(e)}")
+            return None, etag, LIST_MODEL_ERR
+
+        models = ret["data"]["models"] if ret["data"] else []
+        return models, resp_headers.get("ETag"), None
+
     async def user_info(self) -> (dict, ErrorNo):
-        headers, err = self.auth_header()
+        headers, err = await self.auth_header()
         if err is not None:
             return None, err
 
         server_url = f"{BIZYAIR_SERVER_ADDRESS}/user/info"
         try:
-            resp = self.do_get(server_url, headers=headers)
+            resp = await self.do_get(server_url, headers=headers)
             ret = json.loads(resp)
             if ret["code"] != CODE_OK:
                 if ret["code"] == 401:
@@ -321,13 +366,15 @@ class APIClient:
             return None, GET_USER_INFO_ERR
 
     async def update_share_id(self, share_id) -> (dict, ErrorNo):
-        headers, err = self.auth_header()
+        headers, err = await self.auth_header()
         if err is not None:
             return None, err
 
         server_url = f"{BIZYAIR_SERVER_ADDRESS}/user/update_share_id"
         try:
-            resp = self.do_put(server_url, data={"share_id": share_id}, headers=headers)
+            resp = await self.do_put(
+                server_url, data={"share_id": share_id}, headers=headers
+            )
 
             ret = json.loads(resp)
             if ret["code"] != CODE_OK:
@@ -339,13 +386,13 @@ class APIClient:
             return None, UPDATE_SHATE_ID_ERR
 
     async def get_description(self, payload) -> (dict, ErrorNo):
-        headers, err = self.auth_header()
+        headers, err = await self.auth_header()
         if err is not None:
             return None, err
 
         server_url = f"{BIZYAIR_SERVER_ADDRESS}/models/get_description"
         try:
-            resp = self.do_get(server_url, params=payload, headers=headers)
+            resp = await self.do_get(server_url, params=payload, headers=headers)
 
             ret = json.loads(resp)
             if ret["code"] != CODE_OK:
@@ -360,13 +407,13 @@ class APIClient:
             return None, GET_DESCRIPTION_ERR
 
     async def update_description(self, payload) -> (dict, ErrorNo):
-        headers, err = self.auth_header()
+        headers, err = await self.auth_header()
         if err is not None:
             return None, err
 
         server_url = f"{BIZYAIR_SERVER_ADDRESS}/models/update_description"
         try:
-            resp = self.do_put(server_url, data=payload, headers=headers)
+            resp = await self.do_put(server_url, data=payload, headers=headers)
 
             ret = json.loads(resp)
             if ret["code"] != CODE_OK:
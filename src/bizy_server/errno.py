@@ -26,6 +26,7 @@ NO_SHARE_ID_ERR = ErrorNo(
     400, 400117, None, 'The parameter "share_id" is not provided.'
 )
 INVALID_DESCRIPTION = ErrorNo(400, 400118, None, "Invalid description")
+INVALID_PRIORITY = ErrorNo(400, 400119, None, "Invalid priority")
 INVALID_API_KEY_ERR = ErrorNo(401, 401000, None, "Invalid API key")
 INVALID_USER_ERR = ErrorNo(401, 401001, None, "Invalid user")
 
@@ -1,54 +1,135 @@
 import asyncio
-import copy
 import heapq
+import itertools
 import logging
 import threading
+import time
+
+from bizyair.common.env_var import BIZYAIR_UPLOAD_WORKERS
 
 
 class UploadQueue:
-    def __init__(self):
-        self.mutex = threading.RLock()
-        self.not_empty = threading.Condition(self.mutex)
-        self.task_counter = 0
+    """
+    Uploads waiting for one of `workers` worker tasks on the server loop. Lower
+    priority values run first, equal priorities in submission order. A queued
+    or running upload can be cancelled by its upload id.
+
+    The handler is awaited as `handler(item, cancel_event)`. The work it does
+    in threads must stop once the threading.Event `cancel_event` is set.
+    """
+
+    def __init__(self, workers: int = BIZYAIR_UPLOAD_WORKERS):
+        self.workers = max(1, workers)
+        # (priority, sequence, upload_id), cancelled entries are skipped on pop
         self.queue = []
-        self.currently_running = {}
-
-    def put(self, item):
-        with self.mutex:
-            heapq.heappush(self.queue, item)
-            self.not_empty.notify()
-
-    def get(self, timeout=None):
-        with self.not_empty:
-            while len(self.queue) == 0:
-                self.not_empty.wait(timeout=timeout)
-                if timeout is not None and len(self.queue) == 0:
-                    return None
-            item = heapq.heappop(self.queue)
-            i = self.task_counter
-            self.currently_running[i] = copy.deepcopy(item)
-            self.task_counter += 1
-            return (item, i)
-
-    def task_done(self, item_id):
-        with self.mutex:
-            self.currently_running.pop(item_id)
-
-
-def upload_worker(server, q):
-    timeout = 1000.0
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
-    while True:
-        try:
-            queue_item = q.get(timeout=timeout)
-            if queue_item is not None:
-                item, item_id = queue_item
-                loop = asyncio.get_event_loop()
-                loop.run_until_complete(server.upload_manager.do_upload(item))
-                q.task_done(item_id)
-            else:
+        self.counter = itertools.count()
+        # upload_id -> (item, enqueued at) while waiting
+        self.waiting = {}
+        # upload_id -> (task, cancel event) while running
+        self.running = {}
+        self.worker_tasks = []
+        self._wakeup = asyncio.Event()
+        self.stats = {
+            "submitted": 0,
+            "started": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+        }
+
+    def start(self, loop: asyncio.AbstractEventLoop, handler):
+        """Starts the workers on `loop`, each runs `await handler(item, event)`."""
+        self.worker_tasks = [
+            loop.create_task(self._worker(handler)) for _ in range(self.workers)
+        ]
+
+    def put(self, item, priority: int = 0):
+        """Must be called on the loop the queue was started on."""
+        upload_id = item["upload_id"]
+        heapq.heappush(self.queue, (priority, next(self.counter), upload_id))
+        self.waiting[upload_id] = (item, time.monotonic())
+        self.stats["submitted"] += 1
+        self._wakeup.set()
+
+    async def cancel(self, upload_id) -> bool:
+        """
+        Drops a waiting upload or stops a running one, returning once its
+        handler is done. False if there is no such upload or it finished anyway.
+        """
+        if self.waiting.pop(upload_id, None) is not None:
+            self.stats["cancelled"] += 1
+            return True
+        running = self.running.get(upload_id)
+        if running is None:
+            return False
+        task, cancel_event = running
+        cancel_event.set()
+        await asyncio.wait([task])
+        return task.cancelled() or task.exception() is not None
+
+    def _pop(self):
+        while self.queue:
+            _, _, upload_id = heapq.heappop(self.queue)
+            entry = self.waiting.pop(upload_id, None)
+            if entry is not None:
+                return upload_id, entry
+        return None
+
+    async def _worker(self, handler):
+        while True:
+            popped = self._pop()
+            if popped is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
                 continue
-        except Exception as e:
-            logging.error(f"Failed to upload file: {e}")
+            upload_id, (item, enqueued_at) = popped
+            waited = time.monotonic() - enqueued_at
+            self.stats["started"] += 1
+            self.stats["wait_total"] += waited
+            self.stats["wait_max"] = max(self.stats["wait_max"], waited)
+
+            cancel_event = threading.Event()
+            task = asyncio.ensure_future(handler(item, cancel_event))
+            self.running[upload_id] = (task, cancel_event)
+            try:
+                # Does not raise when the upload fails or is cancelled, only
+                # when the worker itself is cancelled
+                await asyncio.wait([task])
+            except asyncio.CancelledError:
+                cancel_event.set()
+                task.cancel()
+                raise
+            finally:
+                self.running.pop(upload_id, None)
+            if task.cancelled():
+                self.stats["cancelled"] += 1
+            elif task.exception() is not None and cancel_event.is_set():
+                self.stats["cancelled"] += 1
+            elif task.exception() is not None:
+                self.stats["failed"] += 1
+                logging.error(f"Failed to upload file: {task.exception()}")
+            else:
+                self.stats["completed"] += 1
+
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        stats = self.stats
+        return {
+            "workers": self.workers,
+            "depth": len(self.waiting),
+            "running": len(self.running),
+            "submitted": stats["submitted"],
+            "completed": stats["completed"],
+            "failed": stats["failed"],
+            "cancelled": stats["cancelled"],
+            "wait_mean": (
+                stats["wait_total"] / stats["started"] if stats["started"] else None
+            ),
+            "wait_max": stats["wait_max"],
+            "oldest_wait": max(
+                (now - enqueued_at for _, enqueued_at in self.waiting.values()),
+                default=None,
+            ),
+        }
@@ -0,0 +1,78 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List
+
+# Directories skipped while scanning
+SKIP_DIRS = {".git"}
+
+
+class FolderScanner:
+    """
+    Lists the files below a folder with their sizes, walking it with
+    os.scandir. The listing of every directory is cached by the directory's
+    mtime, so scanning an unchanged tree again only stats the directories.
+
+    A file rewritten in place does not change the mtime of its directory, its
+    cached size stays until an entry of the directory is added or removed.
+    """
+
+    def __init__(self, max_dirs: int = 10000):
+        self.max_dirs = max_dirs
+        # path -> (mtime_ns, [(file name, size)], [subdirectory names])
+        self._dirs: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _list(self, path: str):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return [], []
+        with self._lock:
+            cached = self._dirs.get(path)
+            if cached is not None and cached[0] == mtime_ns:
+                self._dirs.move_to_end(path)
+                return cached[1], cached[2]
+
+        files, dirs = [], []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            # Like os.walk, symlinked directories are not followed
+                            if entry.name not in SKIP_DIRS and not entry.is_symlink():
+                                dirs.append(entry.name)
+                        else:
+                            files.append((entry.name, entry.stat().st_size))
+                    except OSError:
+                        # Broken symlink or removed while scanning
+                        continue
+        except OSError:
+            return [], []
+
+        with self._lock:
+            self._dirs[path] = (mtime_ns, files, dirs)
+            self._dirs.move_to_end(path)
+            while len(self._dirs) > self.max_dirs:
+                self._dirs.popitem(last=False)
+        return files, dirs
+
+    def scan(self, root: str) -> List[dict]:
+        """
+        Files as {"path": relative path with "/", "size": bytes}, in the order
+        of os.walk.
+        """
+        results = []
+        # Relative directories still to list, popped in pre-order
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            files, dirs = self._list(os.path.join(root, rel_dir))
+            for name, size in files:
+                results.append({"path": f"{rel_dir}{name}", "size": size})
+            stack.extend(f"{rel_dir}{name}/" for name in reversed(dirs))
+        return results
+
+
+folder_scanner = FolderScanner()
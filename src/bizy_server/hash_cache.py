@@ -0,0 +1,69 @@
+import json
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from typing import Optional
+
+from bizyair.common.env_var import BIZYAIR_UPLOAD_HASH_CACHE
+
+
+class FileHashCache:
+    """
+    Upload signatures of local files keyed by (path, size, mtime, inode), so an
+    unchanged file is not read again. Persisted as one JSON file, oldest entries
+    are dropped past `max_entries`.
+    """
+
+    def __init__(self, path: Optional[str], max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(file_path: str) -> str:
+        stat = os.stat(file_path)
+        return (
+            f"{os.path.realpath(file_path)}|{stat.st_size}|"
+            f"{stat.st_mtime_ns}|{stat.st_ino}"
+        )
+
+    def _load(self):
+        self._entries = OrderedDict()
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            warnings.warn(f"Ignoring unreadable upload hash cache {self.path}: {e}")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            return self._entries.get(key)
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if not self.path:
+                return
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self._entries, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                warnings.warn(f"Failed to write upload hash cache {self.path}: {e}")
+
+
+file_hash_cache = FileHashCache(BIZYAIR_UPLOAD_HASH_CACHE)
@@ -3,9 +3,12 @@ import logging
 import os
 
 import oss2
-from oss2.models import PartInfo
 from tqdm import tqdm
 
+from bizyair.common.env_var import BIZYAIR_UPLOAD_MULTIPART_THRESHOLD
+
+from .parallel_upload import ParallelUploader, check_cancelled, upload_bandwidth
+
 logging.basicConfig(level=logging.DEBUG)
 
 
@@ -63,7 +66,11 @@ class AliOssStorageClient:
 
         return f"{self.bucket_name}/{self.region}/{object_name}"
 
-    async def upload_file(self, file_path, object_name):
+    async def upload_file(self, file_path, object_name, cancel_event=None):
+        """
+        Uploads in an executor thread. Setting `cancel_event` stops it there and
+        raises UploadCancelled once that thread is done.
+        """
         total_size = os.path.getsize(file_path)
         progress_bar = tqdm(
             total=total_size,
@@ -77,6 +84,7 @@ class AliOssStorageClient:
 
         def progress_callback(bytes_sent, total_bytes):
             nonlocal bytes_uploaded
+            check_cancelled(cancel_event)
             progress_increment = bytes_sent - bytes_uploaded
             progress_bar.update(progress_increment)
             bytes_uploaded = bytes_sent  # 更新累计已发送的字节数
@@ -85,14 +93,24 @@ class AliOssStorageClient:
 
         try:
             loop = asyncio.get_running_loop()
-            await loop.run_in_executor(
-                None,
-                self.bucket.put_object_from_file,
-                object_name,
-                file_path,
-                None,
-                progress_callback,
-            )
+            if total_size >= BIZYAIR_UPLOAD_MULTIPART_THRESHOLD * 1024 * 1024:
+                await loop.run_in_executor(
+                    None,
+                    ParallelUploader(self.bucket).upload,
+                    file_path,
+                    object_name,
+                    progress_callback,
+                    cancel_event,
+                )
+            else:
+                await loop.run_in_executor(
+                    None,
+                    self.bucket.put_object_from_file,
+                    object_name,
+                    file_path,
+                    None,
+                    upload_bandwidth.throttle(progress_callback),
+                )
         except oss2.exceptions.OssError as e:
             logging.error(f"Failed to upload file: {e}")
             raise e
@@ -102,34 +120,14 @@ class AliOssStorageClient:
         return f"{self.bucket_name}/{self.region}/{object_name}"
 
     async def multipart_upload(self, file_path, object_name):
-        total_size = os.path.getsize(file_path)
-        part_size = oss2.determine_part_size(total_size, preferred_size=1024 * 1024)
-        upload_id = self.bucket.init_multipart_upload(object_name).upload_id
-
-        parts = []
         loop = asyncio.get_running_loop()
-        with open(file_path, "rb") as f:
-            for part_number in range(1, (total_size + part_size - 1) // part_size + 1):
-                offset = (part_number - 1) * part_size
-                size = min(part_size, total_size - offset)
-                result = await loop.run_in_executor(
-                    None,
-                    self.bucket.upload_part,
-                    object_name,
-                    upload_id,
-                    part_number,
-                    f.read(size),
-                )
-                parts.append(PartInfo(part_number, result.etag))
-                logging.debug(f"Uploaded part {part_number} for {object_name}")
-
         try:
             await loop.run_in_executor(
                 None,
-                self.bucket.complete_multipart_upload,
+                ParallelUploader(self.bucket).upload,
+                file_path,
                 object_name,
-                upload_id,
-                parts,
+                self.onUploading,
             )
         except oss2.exceptions.OssError as e:
             logging.error(f"Failed to complete multipart upload: {e}")
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
+
+import oss2
+from oss2.models import PartInfo
+from oss2.utils import SizedFileAdapter
+
+from bizyair.common.env_var import (
+    BIZYAIR_UPLOAD_BANDWIDTH,
+    BIZYAIR_UPLOAD_CHECKPOINT_DIR,
+    BIZYAIR_UPLOAD_THREADS,
+)
+
+MIN_PART_SIZE = 8 * 1024 * 1024
+MAX_PART_SIZE = 128 * 1024 * 1024
+
+
+class UploadCancelled(Exception):
+    """Raised in the thread doing the upload work once its cancel flag is set."""
+
+
+def check_cancelled(cancel_event: Optional[threading.Event]):
+    if cancel_event is not None and cancel_event.is_set():
+        raise UploadCancelled
+
+
+def choose_part_size(total_size: int, num_threads: int) -> int:
+    """
+    Enough parts to keep every thread busy a few times over, each large enough
+    that the per-request overhead does not matter. OSS allows 10000 parts.
+    """
+    preferred = min(MAX_PART_SIZE, max(MIN_PART_SIZE, total_size // (num_threads * 4)))
+    return oss2.determine_part_size(total_size, preferred_size=preferred)
+
+
+class BandwidthLimiter:
+    """
+    Token bucket over bytes, shared by every upload thread so that all uploads
+    together stay under `rate` bytes per second. 0 disables the limit.
+    """
+
+    def __init__(self, rate: float = 0):
+        self.rate = rate
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size: int):
+        """Blocks until `size` more bytes may be sent."""
+        if self.rate <= 0 or size <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                float(self.rate), self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Bytes already read by the sender are taken on credit
+            self._tokens -= size
+            delay = -self._tokens / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+    def throttle(self, callback: Optional[Callable[[int, int], None]]):
+        """
+        Wraps an oss2 progress callback of one request. oss2 calls it as the
+        body is read, so waiting in there slows down the upload itself.
+        """
+        consumed = 0
+
+        def on_progress(bytes_sent, total_bytes):
+            nonlocal consumed
+            self.consume(bytes_sent - consumed)
+            consumed = bytes_sent
+            if callback:
+                callback(bytes_sent, total_bytes)
+
+        return on_progress
+
+
+upload_bandwidth = BandwidthLimiter(BIZYAIR_UPLOAD_BANDWIDTH * 1024 * 1024)
+
+
+class UploadCheckpoint:
+    """
+    The upload id and finished parts of a multipart upload, so that uploading
+    the same unchanged file to the same object again only sends missing parts.
+    """
+
+    def __init__(self, directory: Optional[str], fingerprint: dict):
+        self.fingerprint = fingerprint
+        self.path = None
+        if directory:
+            digest = hashlib.sha256(
+                json.dumps(fingerprint, sort_keys=True).encode("utf-8")
+            ).hexdigest()
+            self.path = os.path.join(directory, f"{digest}.json")
+
+    def load(self) -> Optional[dict]:
+        if self.path is None:
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return state if state.get("fingerprint") == self.fingerprint else None
+
+    def save(self, state: dict):
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            warnings.warn(f"Failed to write upload checkpoint {self.path}: {e}")
+
+    def remove(self):
+        if self.path is None:
+            return
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ParallelUploader:
+    """
+    Multipart upload with `num_threads` parts in flight. Every part is streamed
+    from its own file handle at its offset, nothing is buffered in memory.
+    Finished parts are recorded in a checkpoint under `checkpoint_dir`, an
+    interrupted upload resumes from there.
+
+    `progress_callback(bytes_sent, total_bytes)` gets the bytes of all parts.
+    Parts are sent no faster than `bandwidth` allows. Once `cancel_event` is
+    set, parts in flight stop at their next progress update, the multipart
+    upload is aborted and UploadCancelled raised.
+    """
+
+    def __init__(
+        self,
+        bucket: oss2.Bucket,
+        num_threads: int = BIZYAIR_UPLOAD_THREADS,
+        checkpoint_dir: Optional[str] = BIZYAIR_UPLOAD_CHECKPOINT_DIR,
+        part_size: int = None,
+        bandwidth: BandwidthLimiter = upload_bandwidth,
+    ):
+        self.bucket = bucket
+        self.num_threads = max(1, num_threads)
+        self.checkpoint_dir = checkpoint_dir
+        self.part_size = part_size
+        self.bandwidth = bandwidth
+
+    def upload(
+        self,
+        file_path: str,
+        object_name: str,
+        progress_callback: Callable[[int, int], None] = None,
+        cancel_event: threading.Event = None,
+    ):
+        check_cancelled(cancel_event)
+        stat = os.stat(file_path)
+        checkpoint = UploadCheckpoint(
+            self.checkpoint_dir,
+            {
+                "endpoint": self.bucket.endpoint,
+                "bucket": self.bucket.bucket_name,
+                "key": object_name,
+                "path": os.path.realpath(file_path),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            },
+        )
+        state = checkpoint.load()
+        if state is not None:
+            try:
+                return self._upload(
+                    file_path,
+                    object_name,
+                    checkpoint,
+                    state,
+                    progress_callback,
+                    cancel_event,
+                )
+            except oss2.exceptions.NoSuchUpload:
+                # The server dropped the unfinished upload, start over
+                checkpoint.remove()
+
+        part_size = self.part_size or choose_part_size(stat.st_size, self.num_threads)
+        state = {
+            "fingerprint": checkpoint.fingerprint,
+            "upload_id": self.bucket.init_multipart_upload(object_name).upload_id,
+            "part_size": part_size,
+            "parts": {},
+        }
+        checkpoint.save(state)
+        return self._upload(
+            file_path, object_name, checkpoint, state, progress_callback, cancel_event
+        )
+
+    def _upload(
+        self, file_path, object_name, checkpoint, state, progress_callback, cancel_event
+    ):
+        total_size = checkpoint.fingerprint["size"]
+        part_size = state["part_size"]
+        upload_id = state["upload_id"]
+        part_count = max(1, (total_size + part_size - 1) // part_size)
+
+        def part_range(part_number):
+            offset = (part_number - 1) * part_size
+            return offset, min(part_size, total_size - offset)
+
+        lock = threading.Lock()
+        sent = sum(part_range(int(number))[1] for number in state["parts"])
+        in_flight = {}
+
+        def report():
+            if progress_callback:
+                progress_callback(sent + sum(in_flight.values()), total_size)
+
+        def upload_part(part_number):
+            nonlocal sent
+            check_cancelled(cancel_event)
+            offset, size = part_range(part_number)
+
+            def on_part_progress(consumed, _):
+                # oss2 calls this while reading the body, raising ends the request
+                check_cancelled(cancel_event)
+                with lock:
+                    in_flight[part_number] = consumed
+                    report()
+
+            with open(file_path, "rb") as f:
+                f.seek(offset)
+                result = self.bucket.upload_part(
+                    object_name,
+                    upload_id,
+                    part_number,
+                    SizedFileAdapter(f, size),
+                    progress_callback=self.bandwidth.throttle(on_part_progress),
+                )
+            with lock:
+                in_flight.pop(part_number, None)
+                sent += size
+                state["parts"][str(part_number)] = result.etag
+                checkpoint.save(state)
+                report()
+            logging.debug(f"Uploaded part {part_number} for {object_name}")
+
+        missing = [
+            number
+            for number in range(1, part_count + 1)
+            if str(number) not in state["parts"]
+        ]
+        if len(missing) < part_count:
+            logging.debug(
+                f"Resuming upload of {object_name}, {len(missing)}/{part_count} parts left"
+            )
+        report()
+        pool = ThreadPoolExecutor(
+            max_workers=self.num_threads, thread_name_prefix="bizyair-upload"
+        )
+        try:
+            futures = [pool.submit(upload_part, number) for number in missing]
+            for future in as_completed(futures):
+                future.result()
+        except UploadCancelled:
+            # Running parts see the flag as well, none is left once the pool is down
+            pool.shutdown(wait=True, cancel_futures=True)
+            try:
+                self.bucket.abort_multipart_upload(object_name, upload_id)
+            except oss2.exceptions.OssError as e:
+                logging.warning(f"Failed to abort upload of {object_name}: {e}")
+            checkpoint.remove()
+            raise
+        finally:
+            # On error, parts that did not start are dropped, running ones finish
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        parts = [
+            PartInfo(int(number), etag)
+            for number, etag in sorted(
+                state["parts"].items(), key=lambda item: int(item[0])
+            )
+        ]
+        result = self.bucket.complete_multipart_upload(object_name, upload_id, parts)
+        checkpoint.remove()
+        return result
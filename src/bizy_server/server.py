@@ -17,6 +17,7 @@ from .errno import (
     INVALID_CLIENT_ID_ERR,
     INVALID_DESCRIPTION,
     INVALID_NAME,
+    INVALID_PRIORITY,
     INVALID_SHARE_ID,
     INVALID_TYPE,
     INVALID_UPLOAD_ID_ERR,
@@ -29,7 +30,9 @@ from .errno import (
 )
 from .error_handler import ErrorHandler
 from .execution import UploadQueue
+from .folder_scan import folder_scanner
 from .resp import ErrResponse, OKResponse
+from .sync_watcher import ModelSyncWatcher
 from .upload_manager import UploadManager
 from .utils import (
     check_str_param,
@@ -37,7 +40,6 @@ from .utils import (
     get_html_content,
     is_string_valid,
     list_types,
-    to_slash,
 )
 
 API_PREFIX = "bizyair"
@@ -52,6 +54,7 @@ class BizyAirServer:
         BizyAirServer.instance = self
         self.api_client = APIClient()
         self.upload_manager = UploadManager(self)
+        self.model_sync_watcher = ModelSyncWatcher(self)
         self.error_handler = ErrorHandler()
         self.prompt_server = PromptServer.instance
         self.sockets = dict()
@@ -144,19 +147,9 @@ class BizyAirServer:
             if not os.path.exists(absolute_path):
                 return ErrResponse(PATH_NOT_EXISTS_ERR)
 
-            relative_paths = []
-            for root, dirs, files in os.walk(absolute_path):
-                # Skip the .git directory
-                if ".git" in dirs:
-                    dirs.remove(".git")
-
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(file_path, absolute_path)
-                    file_size = os.path.getsize(file_path)
-                    relative_paths.append(
-                        {"path": to_slash(relative_path), "size": file_size}
-                    )
+            relative_paths = await asyncio.get_running_loop().run_in_executor(
+                None, folder_scanner.scan, absolute_path
+            )
 
             if len(relative_paths) < 1:
                 return ErrResponse(EMPTY_FILES_ERR)
@@ -207,16 +200,47 @@ class BizyAirServer:
             ):
                 return ErrResponse(MODEL_ALREADY_EXISTS_ERR)
 
+            priority = json_data.get("priority", 0)
+            if type(priority) is not int:
+                return ErrResponse(INVALID_PRIORITY)
+
             self.uploads[upload_id]["sid"] = sid
             self.uploads[upload_id]["type"] = json_data["type"]
             self.uploads[upload_id]["name"] = json_data["name"]
-            self.upload_queue.put(self.uploads[upload_id])
+            self.upload_queue.put(self.uploads[upload_id], priority=priority)
 
             # enable refresh for lora
             # TODO: enable refresh for other types
             bizyair.path_utils.path_manager.enable_refresh_options("loras")
             return OKResponse(None)
 
+        @self.prompt_server.routes.post(f"/{MODEL_HOST_API}/cancel_upload")
+        async def cancel_upload(request):
+            json_data = await request.json()
+            err = check_str_param(json_data, "upload_id", EMPTY_UPLOAD_ID_ERR)
+            if err is not None:
+                return err
+
+            upload_id = json_data["upload_id"]
+            # Returns once the upload threads are done
+            if not await self.upload_queue.cancel(upload_id):
+                return ErrResponse(INVALID_UPLOAD_ID_ERR)
+
+            await self.send_json(
+                event="status",
+                data={
+                    "status": "cancelled",
+                    "upload_id": upload_id,
+                    "message": "uploading cancelled",
+                },
+                sid=self.uploads[upload_id].get("sid"),
+            )
+            return OKResponse(None)
+
+        @self.prompt_server.routes.get(f"/{MODEL_HOST_API}/upload_queue")
+        async def upload_queue_metrics(request):
+            return OKResponse(self.upload_queue.metrics())
+
         @self.prompt_server.routes.get(f"/{MODEL_HOST_API}/models/files")
         async def list_model_files(request):
             err = check_type(request.rel_url.query)
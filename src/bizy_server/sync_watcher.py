@@ -0,0 +1,97 @@
+import asyncio
+import time
+from collections import defaultdict
+
+
+class ModelSyncWatcher:
+    """
+    Tells sockets when an uploaded model becomes available. One task per model
+    type polls the model list for all names waiting on that type, conditional
+    on the ETag of the previous answer. The interval doubles up to
+    `max_interval` while the list does not change, and a name is given up
+    after `timeout` seconds. A new name makes the next poll unconditional, as
+    its model may have become available before it was watched.
+    """
+
+    def __init__(
+        self,
+        server,
+        interval: float = 5,
+        max_interval: float = 60,
+        timeout: float = 3600,
+        max_errors: int = 5,
+    ):
+        self.server = server
+        self.interval = interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.max_errors = max_errors
+        # model type -> model name -> (sids to notify, deadline)
+        self.pending = defaultdict(dict)
+        self.tasks = {}
+        # Model types whose next poll must not send the ETag
+        self.unconditional = set()
+
+    def watch(self, model_type: str, model_name: str, sid=None):
+        """Can be called from any thread, the watching runs on the server loop."""
+        self.server.loop.call_soon_threadsafe(self._add, model_type, model_name, sid)
+
+    def _add(self, model_type, model_name, sid):
+        if model_name not in self.pending[model_type]:
+            self.unconditional.add(model_type)
+        sids, _ = self.pending[model_type].get(model_name, (set(), None))
+        sids.add(sid)
+        self.pending[model_type][model_name] = (sids, time.monotonic() + self.timeout)
+        if model_type not in self.tasks:
+            self.tasks[model_type] = asyncio.ensure_future(self._run(model_type))
+
+    async def _run(self, model_type):
+        pending = self.pending[model_type]
+        etag = None
+        delay = 0
+        errors = 0
+        try:
+            while pending:
+                await asyncio.sleep(delay)
+                if model_type in self.unconditional:
+                    self.unconditional.discard(model_type)
+                    etag = None
+                models, etag, err = await self.server.api_client.poll_models(
+                    {"type": model_type, "available": True}, etag
+                )
+                if err is not None:
+                    errors += 1
+                    if errors >= self.max_errors:
+                        await self._fail(pending, err)
+                    delay = min(max(delay, self.interval) * 2, self.max_interval)
+                    continue
+                errors = 0
+                if models is None:
+                    delay = min(max(delay, self.interval) * 2, self.max_interval)
+                else:
+                    delay = self.interval
+                    available = {model["name"] for model in models}
+                    for name in [name for name in pending if name in available]:
+                        sids, _ = pending.pop(name)
+                        for sid in sids:
+                            await self.server.send_json(
+                                "synced",
+                                {"model_type": model_type, "model_name": name},
+                                sid,
+                            )
+                now = time.monotonic()
+                for name in [name for name, (_, dl) in pending.items() if dl < now]:
+                    print(
+                        f"\033[31m[BizyAir]\033[0m Gave up waiting for {name} to sync"
+                    )
+                    del pending[name]
+        finally:
+            # No await between the last check of `pending` and this
+            del self.tasks[model_type]
+
+    async def _fail(self, pending, err):
+        data = {"message": err.message, "code": err.code, "data": err.data}
+        for sids, _ in pending.values():
+            for sid in sids:
+                await self.server.send_json("error", data, sid)
+        pending.clear()
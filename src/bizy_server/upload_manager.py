@@ -2,18 +2,71 @@ import asyncio
 import base64
 import hashlib
 import os
-import threading
 import time
 
-import aiofiles
 import crcmod
 import oss2
 
+from bizyair.common.env_var import BIZYAIR_UPLOAD_CONCURRENCY
+
 from .errno import FILE_NOT_EXISTS_ERR, UPLOAD_ERR
 from .error_handler import ErrorHandler
+from .hash_cache import file_hash_cache
 from .oss import AliOssStorageClient
+from .parallel_upload import UploadCancelled, check_cancelled
 from .utils import is_string_valid
 
+# Bytes read at a time while hashing, into one buffer reused for the whole file
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+_crc64 = crcmod.mkCrcFun(
+    0x142F0E1EBA9EA3693, initCrc=0, xorOut=0xFFFFFFFFFFFFFFFF, rev=True
+)
+
+
+def hash_file(file_path, cancel_event=None):
+    """
+    Upload signature of a file, CRC64 and MD5 are computed in a single read.
+    Raises UploadCancelled between blocks once `cancel_event` is set.
+    """
+    crc64_signature = 0
+    md5_hash = hashlib.md5()
+    buffer = bytearray(HASH_BLOCK_SIZE)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while size := f.readinto(buffer):
+            check_cancelled(cancel_event)
+            chunk = view[:size]
+            crc64_signature = _crc64(chunk, crc64_signature)
+            md5_hash.update(chunk)
+    md5_str = base64.b64encode(md5_hash.digest()).decode("utf-8")
+
+    hasher = hashlib.sha256()
+    hasher.update(f"{md5_str}{crc64_signature}".encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def cached_hash_file(file_path, cancel_event=None):
+    """hash_file through the signature cache, both read and write files."""
+    key = file_hash_cache.key(file_path)
+    hash_string = file_hash_cache.get(key)
+    if hash_string is not None:
+        return hash_string
+
+    hash_string = hash_file(file_path, cancel_event)
+    # Not cached if the file changed while it was read
+    if file_hash_cache.key(file_path) == key:
+        file_hash_cache.put(key, hash_string)
+    return hash_string
+
+
+class UploadFailed(Exception):
+    """Stops the upload of a model, `err` is sent to the client."""
+
+    def __init__(self, err):
+        super().__init__(err.message)
+        self.err = err
+
 
 class UploadManager:
     def __init__(self, server):
@@ -21,30 +74,97 @@ class UploadManager:
         self.upload_progresses_updated_at = dict()
         self.server = server
 
-    async def calculate_hash(self, file_path):
-        do_crc64 = crcmod.mkCrcFun(
-            0x142F0E1EBA9EA3693, initCrc=0, xorOut=0xFFFFFFFFFFFFFFFF, rev=True
+    async def calculate_hash(self, file_path, cancel_event=None):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, cached_hash_file, file_path, cancel_event
         )
-        crc64_signature = 0
-        buf_size = 65536 * 16
 
-        async with aiofiles.open(file_path, "rb") as f:
-            while chunk := await f.read(buf_size):
-                crc64_signature = do_crc64(chunk, crc64_signature)
+    def progress_reporter(self, sid, upload_id, filename):
+        key = (upload_id, filename)
+        self.upload_progresses_updated_at[key] = 0
+
+        def updateProgress(consume_bytes, total_bytes):
+            current_time = time.time()
+            updated_at = self.upload_progresses_updated_at.get(key)
+            # Reports from a thread still running after its upload was dropped
+            if updated_at is None:
+                return
+            if current_time - updated_at >= 1:
+                self.upload_progresses_updated_at[key] = current_time
+
+                progress = (
+                    f"{consume_bytes / total_bytes * 100:.0f}%"
+                    if consume_bytes / total_bytes * 100
+                    == int(consume_bytes / total_bytes * 100)
+                    else "{:.2f}%".format(consume_bytes / total_bytes * 100)
+                )
+                self.server.send_sync(
+                    event="progress",
+                    data={
+                        "upload_id": upload_id,
+                        "path": filename,
+                        "progress": progress,
+                    },
+                    sid=sid,
+                )
+
+        return updateProgress
 
-        md5_hash = hashlib.md5()
-        async with aiofiles.open(file_path, "rb") as file:
-            while chunk := await file.read(buf_size):
-                md5_hash.update(chunk)
-        md5_str = base64.b64encode(md5_hash.digest()).decode("utf-8")
+    async def upload_model_file(
+        self, item, filename, filepath, hash_slot, upload_slots, cancel_event
+    ):
+        sid = item["sid"]
+        upload_id = item["upload_id"]
+        async with hash_slot:
+            sha256sum = await self.calculate_hash(filepath, cancel_event)
 
-        hasher = hashlib.sha256()
-        hasher.update(f"{md5_str}{crc64_signature}".encode("utf-8"))
-        hash_string = hasher.hexdigest()
+        sign_data, err = await self.server.api_client.sign(sha256sum)
+        if err is not None:
+            raise UploadFailed(err)
+        file_record = sign_data.get("file")
 
-        return hash_string
+        if not is_string_valid(file_record.get("id")):
+            async with upload_slots:
+                print(f"\033[94m[BizyAir]\033[0m Start uploading file: {filename}")
+                file_storage = sign_data.get("storage")
+                try:
+                    oss_client = AliOssStorageClient(
+                        endpoint=file_storage.get("endpoint"),
+                        bucket_name=file_storage.get("bucket"),
+                        access_key=file_record.get("access_key_id"),
+                        secret_key=file_record.get("access_key_secret"),
+                        security_token=file_record.get("security_token"),
+                        onUploading=self.progress_reporter(sid, upload_id, filename),
+                    )
+                    await oss_client.upload_file(
+                        filepath, file_record.get("object_key"), cancel_event
+                    )
+                except oss2.exceptions.OssError as e:
+                    print(f"\033[31m[BizyAir]\033[0m OSS err:{str(e)}")
+                    raise UploadFailed(UPLOAD_ERR) from e
+                finally:
+                    self.upload_progresses_updated_at.pop((upload_id, filename), None)
+
+            commit_data, err = await self.server.api_client.commit_file(
+                signature=sha256sum, object_key=file_record.get("object_key")
+            )
+            if err is not None:
+                raise UploadFailed(err)
 
-    async def do_upload(self, item):
+            print(f"\033[32m[BizyAir]\033[0m {filename} Already Uploaded")
+        self.server.send_sync(
+            event="progress",
+            data={"upload_id": upload_id, "path": filename, "progress": "100%"},
+            sid=sid,
+        )
+        return {"sign": sha256sum, "path": filename}
+
+    async def do_upload(self, item, cancel_event):
+        """
+        Uploads the files of a model and commits it. Once `cancel_event` is set
+        the hashing and upload threads stop, UploadCancelled is raised after
+        all of them are done.
+        """
         sid = item["sid"]
         upload_id = item["upload_id"]
         self.server.send_sync(
@@ -58,83 +178,41 @@ class UploadManager:
         )
 
         root_dir = item["root"]
-        model_files = []
+        files = []
         for file in item["files"]:
             filename = file["path"]
             filepath = os.path.abspath(os.path.join(root_dir, filename))
             if not os.path.exists(filepath):
                 self.server.send_sync_error(err=FILE_NOT_EXISTS_ERR, sid=sid)
                 return
-
-            sha256sum = await self.calculate_hash(filepath)
-
-            sign_data, err = await self.server.api_client.sign(sha256sum)
-            file_record = sign_data.get("file")
-            if err is not None:
-                self.server.send_sync_error(err=err, sid=sid)
-                return
-
-            if not is_string_valid(file_record.get("id")):
-                print(f"\033[94m[BizyAir]\033[0m Start uploading file: {filename}")
-                file_storage = sign_data.get("storage")
-                try:
-                    self.upload_progresses_updated_at[upload_id] = 0
-
-                    def updateProgress(consume_bytes, total_bytes):
-                        current_time = time.time()
-                        if (
-                            current_time - self.upload_progresses_updated_at[upload_id]
-                            >= 1
-                        ):
-                            self.upload_progresses_updated_at[upload_id] = current_time
-
-                            progress = (
-                                f"{consume_bytes / total_bytes * 100:.0f}%"
-                                if consume_bytes / total_bytes * 100
-                                == int(consume_bytes / total_bytes * 100)
-                                else "{:.2f}%".format(consume_bytes / total_bytes * 100)
-                            )
-                            self.server.send_sync(
-                                event="progress",
-                                data={
-                                    "upload_id": upload_id,
-                                    "path": filename,
-                                    "progress": progress,
-                                },
-                                sid=sid,
-                            )
-
-                    oss_client = AliOssStorageClient(
-                        endpoint=file_storage.get("endpoint"),
-                        bucket_name=file_storage.get("bucket"),
-                        access_key=file_record.get("access_key_id"),
-                        secret_key=file_record.get("access_key_secret"),
-                        security_token=file_record.get("security_token"),
-                        onUploading=updateProgress,
-                    )
-                    await oss_client.upload_file(
-                        filepath, file_record.get("object_key")
-                    )
-                except oss2.exceptions.OssError as e:
-                    print(f"\033[31m[BizyAir]\033[0m OSS err:{str(e)}")
-                    self.server.send_sync_error(UPLOAD_ERR, sid)
-                    return
-
-                commit_data, err = await self.server.api_client.commit_file(
-                    signature=sha256sum, object_key=file_record.get("object_key")
+            files.append((filename, filepath))
+
+        # Files are hashed one at a time in order, each is signed as soon as its
+        # hash is known and uploaded once one of the upload slots is free
+        hash_slot = asyncio.Semaphore(1)
+        upload_slots = asyncio.Semaphore(max(1, BIZYAIR_UPLOAD_CONCURRENCY))
+        tasks = [
+            asyncio.ensure_future(
+                self.upload_model_file(
+                    item, filename, filepath, hash_slot, upload_slots, cancel_event
                 )
-                if err is not None:
-                    self.server.send_sync_error(err)
-                    return
-
-                print(f"\033[32m[BizyAir]\033[0m {filename} Already Uploaded")
-            self.server.send_sync(
-                event="progress",
-                data={"upload_id": upload_id, "path": filename, "progress": "100%"},
-                sid=sid,
             )
-
-            model_files.append({"sign": sha256sum, "path": filename})
+            for filename, filepath in files
+        ]
+        try:
+            model_files = await asyncio.gather(*tasks)
+        except UploadFailed as e:
+            self.server.send_sync_error(e.err, sid)
+            return
+        finally:
+            if cancel_event.is_set():
+                # Cancelling the tasks would not stop their executor threads
+                await asyncio.wait(tasks)
+            else:
+                for task in tasks:
+                    task.cancel()
+        if cancel_event.is_set():
+            raise UploadCancelled
 
         commit_ret, err = await self.server.api_client.commit_model(
             model_files=model_files,
@@ -158,44 +236,4 @@ class UploadManager:
             sid=sid,
         )
 
-        def check_sync_status():
-            while True:
-                future = asyncio.run_coroutine_threadsafe(
-                    self.server.api_client.get_models(
-                        {"type": item["type"], "available": True}
-                    ),
-                    self.server.loop,
-                )
-
-                models, err = future.result(timeout=2)
-
-                if err is not None:
-                    self.server.send_sync(
-                        event="error",
-                        data={
-                            "message": err.message,
-                            "code": err.code,
-                            "data": err.data,
-                        },
-                        sid=sid,
-                    )
-                    return
-                # 遍历models, 看当前name的model是否存在
-                for model in models:
-                    if model["name"] == item["name"]:
-                        self.server.send_sync(
-                            event="synced",
-                            data={
-                                "model_type": item["type"],
-                                "model_name": item["name"],
-                            },
-                            sid=sid,
-                        )
-                        return
-
-                time.sleep(5)
-
-        threading.Thread(
-            target=check_sync_status,
-            daemon=True,
-        ).start()
+        self.server.model_sync_watcher.watch(item["type"], item["name"], sid)
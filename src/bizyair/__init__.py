@@ -1,4 +1,9 @@
 from . import path_utils
 from .common import set_api_key, validate_api_key
+from .common.env_var import BIZYAIR_PREFETCH_CATALOGS
 from .nodes_base import NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS, BizyAirBaseNode
 from .nodes_io import BizyAirNodeIO, create_node_data
+
+if BIZYAIR_PREFETCH_CATALOGS:
+    # The plugin imports its nodes, which evaluate INPUT_TYPES, right after this
+    path_utils.prefetch_catalogs()
@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+__all__ = ["RequestCoalescer"]
+
+
+@dataclass
+class _Group:
+    """Requests whose graphs share nodes, sent as one multi-output request."""
+
+    prompt: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    last_node_ids: List[str] = field(default_factory=list)
+    future: Future = field(default_factory=Future)
+    started: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+@dataclass
+class _Request:
+    prompt: Dict[str, Dict[str, Any]]
+    node_id: str
+    ready: threading.Event = field(default_factory=threading.Event)
+    group: _Group = None
+
+
+class RequestCoalescer:
+    """
+    Collects the send_request calls made within `window` seconds of each other
+    (from nodes running concurrently) and merges the ones whose graphs overlap
+    into a single request with several last_node_ids. Each caller gets back the
+    output of its own node.
+
+    `execute(prompt, last_node_ids)` returns a dict of outputs by node id.
+    """
+
+    def __init__(self, execute: Callable, window: float):
+        self.execute = execute
+        self.window = window
+        self.requests = 0
+        self.sent = 0
+        self._pending: List[_Request] = []
+        self._lock = threading.Lock()
+
+    def submit(self, prompt: Dict[str, Dict[str, Any]], node_id: str) -> Any:
+        request = _Request(prompt, node_id)
+        with self._lock:
+            self._pending.append(request)
+            self.requests += 1
+            leader = len(self._pending) == 1
+        if leader:
+            # The first caller waits for the others and assigns everyone a group
+            time.sleep(self.window)
+            with self._lock:
+                batch, self._pending = self._pending, []
+            for group, requests in self._group(batch):
+                for member in requests:
+                    member.group = group
+                    member.ready.set()
+        request.ready.wait()
+        return self._run(request.group)[node_id]
+
+    def _group(self, batch: List[_Request]):
+        # Union-find over requests, joined when their graphs share a node id
+        parents = list(range(len(batch)))
+
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        owners: Dict[str, int] = {}
+        for index, request in enumerate(batch):
+            for node_id in request.prompt:
+                other = owners.setdefault(node_id, index)
+                parents[find(index)] = find(other)
+
+        groups: Dict[int, tuple] = {}
+        for index, request in enumerate(batch):
+            group, members = groups.setdefault(find(index), (_Group(), []))
+            group.prompt.update(request.prompt)
+            if request.node_id not in group.last_node_ids:
+                group.last_node_ids.append(request.node_id)
+            members.append(request)
+        return groups.values()
+
+    def _run(self, group: _Group) -> Dict[str, Any]:
+        # Whoever gets here first sends the request, the rest wait for it
+        with group.lock:
+            run, group.started = not group.started, True
+        if run:
+            try:
+                group.future.set_result(self._send(group))
+            except BaseException as e:
+                group.future.set_exception(e)
+        return group.future.result()
+
+    def _send(self, group: _Group) -> Dict[str, Any]:
+        with self._lock:
+            self.sent += 1
+        return self.execute(group.prompt, group.last_node_ids)
@@ -1,4 +1,17 @@
+from bizyair.common.env_var import BIZYAIR_MULTI_OUTPUT_WINDOW
+
+from .coalescer import RequestCoalescer
 from .processors.prompt_processor import PromptProcessor, SearchServiceRouter
 from .servers.prompt_server import PromptServer
 
 prompt_server = PromptServer(router=SearchServiceRouter(), processor=PromptProcessor())
+
+
+def _execute_outputs(prompt, last_node_ids):
+    out = prompt_server.execute(prompt=prompt, last_node_ids=last_node_ids)
+    return {last_node_ids[0]: out} if len(last_node_ids) == 1 else out
+
+
+request_coalescer = RequestCoalescer(
+    _execute_outputs, window=BIZYAIR_MULTI_OUTPUT_WINDOW / 1000
+)
@@ -0,0 +1,124 @@
+import time
+import uuid
+from typing import Any, Callable, Dict
+
+from bizyair.common import client
+from bizyair.common.env_var import BIZYAIR_DEBUG, BIZYAIR_JOB_POLL_INTERVAL
+from bizyair.common.job_journal import Job, JobJournal
+from bizyair.common.transport import HTTPStatusError
+from bizyair.image_utils import TaskStatus
+
+__all__ = ["JobRunner"]
+
+# Consecutive failed polls tolerated before giving up, the job stays journaled
+_MAX_POLL_FAILURES = 5
+
+
+def _is_not_found(e: Exception) -> bool:
+    return isinstance(e.__cause__, HTTPStatusError) and e.__cause__.status == 404
+
+
+class JobRunner:
+    """
+    Runs a prompt as a cloud job instead of one long request:
+
+    - submit: POST {url}/jobs -> {"data": {"job_id": ..., "status": "pending"}}
+    - poll:   GET {url}/jobs/{job_id} -> {"data": {"status": ..., "progress":
+      {"value": ..., "total": ...}, "message": ...}}
+    - fetch:  GET {url}/jobs/{job_id}/result -> the usual prompt response
+
+    Submitted jobs are written to `journal` until their result is fetched, so
+    running the same prompt again after an interruption or a network error
+    resumes the job instead of paying for a new one.
+    """
+
+    def __init__(self, journal: JobJournal, poll_interval: float = None):
+        self.journal = journal
+        self.poll_interval = (
+            BIZYAIR_JOB_POLL_INTERVAL / 1000 if poll_interval is None else poll_interval
+        )
+
+    def run(
+        self,
+        url: str,
+        key: str,
+        data: Any,
+        headers: Dict[str, str] = None,
+        on_progress: Callable[[dict], None] = None,
+    ) -> dict:
+        job = self.journal.get(key)
+        if job is not None:
+            print(f"Resuming BizyAir job {job.job_id} ({job.status.value})")
+            try:
+                return self._wait(job, on_progress)
+            except ConnectionError as e:
+                if not _is_not_found(e):
+                    raise
+                # The server no longer knows the job, run the prompt again
+                self.journal.remove(key)
+        job = self.submit(url, key, data, headers)
+        return self._wait(job, on_progress)
+
+    def submit(
+        self, url: str, key: str, data: Any, headers: Dict[str, str] = None
+    ) -> Job:
+        headers = dict(headers or client._headers())
+        # Lets the server deduplicate a submission that was retried
+        headers["x-bizyair-job-key"] = key
+        out = client.send_request(
+            url=f"{url}/jobs",
+            data=data,
+            headers=headers,
+            idempotency_key=uuid.uuid4().hex,
+        )
+        job = Job(
+            key=key,
+            job_id=out["data"]["job_id"],
+            url=url,
+            status=TaskStatus(out["data"].get("status", TaskStatus.PENDING.value)),
+        )
+        self.journal.put(job)
+        if BIZYAIR_DEBUG:
+            print(f"Submitted BizyAir job {job.job_id}")
+        return job
+
+    def poll(self, job: Job) -> dict:
+        out = client.send_request(method="GET", url=f"{job.url}/jobs/{job.job_id}")
+        status = TaskStatus(out["data"]["status"])
+        if status != job.status:
+            job.transition(status, out["data"].get("message"))
+            self.journal.put(job)
+        return out["data"]
+
+    def fetch(self, job: Job) -> dict:
+        return client.send_request(
+            method="GET", url=f"{job.url}/jobs/{job.job_id}/result"
+        )
+
+    def _wait(self, job: Job, on_progress: Callable[[dict], None] = None) -> dict:
+        failures = 0
+        while not job.status.is_final:
+            try:
+                data = self.poll(job)
+                failures = 0
+            except ConnectionError as e:
+                failures += 1
+                if _is_not_found(e) or failures >= _MAX_POLL_FAILURES:
+                    raise
+                print(f"Failed to poll BizyAir job {job.job_id}, retrying: {e}")
+                time.sleep(self.poll_interval)
+                continue
+            except (RuntimeError, ValueError):
+                # An unknown or out-of-order status, resuming would only hit it again
+                self.journal.remove(job.key)
+                raise
+            if on_progress and data.get("progress"):
+                on_progress(data["progress"])
+            if not job.status.is_final:
+                time.sleep(self.poll_interval)
+        if job.status == TaskStatus.FAILED:
+            self.journal.remove(job.key)
+            raise RuntimeError(f"BizyAir job {job.job_id} failed: {job.message}")
+        result = self.fetch(job)
+        self.journal.remove(job.key)
+        return result
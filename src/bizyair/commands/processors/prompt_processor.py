@@ -1,20 +1,27 @@
 import json
+import uuid
 from collections import deque
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Set, Union
 
 from bizyair.common import client
+from bizyair.common.content_cache import blob_references
 from bizyair.common.env_var import (
     BIZYAIR_DEBUG,
     BIZYAIR_DEV_REQUEST_URL,
     BIZYAIR_SERVER_ADDRESS,
 )
+from bizyair.common.job_journal import job_journal
+from bizyair.common.multipart import MultipartBody
+from bizyair.common.result_cache import ResultCache
 from bizyair.configs.conf import ModelRule
+from bizyair.image_utils import decode_preview
 from bizyair.path_utils import (
     convert_prompt_label_path_to_real_path,
     guess_url_from_node,
 )
 
 from ..base import Processor  # type: ignore
+from ..jobs import JobRunner
 
 
 def is_link(obj):
@@ -78,23 +85,102 @@ class SearchServiceRouter(Processor):
     def validate_input(
         self, prompt: Dict[str, Dict[str, Any]], last_node_ids: List[str]
     ):
-        assert len(last_node_ids) == 1
+        assert len(last_node_ids) >= 1
         return True
 
 
 class PromptProcessor(Processor):
+    def __init__(self, job_runner: JobRunner = None):
+        if job_runner is None and job_journal is not None:
+            job_runner = JobRunner(job_journal)
+        self.job_runner = job_runner
+
     def process(
-        self, url: str, prompt: Dict[str, Dict[str, Any]], last_node_ids: List[str]
+        self,
+        url: str,
+        prompt: Dict[str, Dict[str, Any]],
+        last_node_ids: List[str],
+        blobs: Dict[str, Union[bytes, str]] = None,
+        blob_refs: Set[str] = None,
+        progress_callback: Callable = None,
     ):
+        # Jobs are journaled under the key of the prompt as the caller encoded it
+        job_key = (
+            ResultCache.key(url, prompt, last_node_ids)
+            if self.job_runner is not None
+            else None
+        )
         prompt = convert_prompt_label_path_to_real_path(prompt)
-        return client.send_request(
+        graph = {"prompt": prompt, "last_node_id": last_node_ids[0]}
+        if len(last_node_ids) > 1:
+            # Shared upstream nodes run once for all outputs, needs server-side support
+            graph["last_node_ids"] = last_node_ids
+        graph = json.dumps(graph)
+        if not blobs and not blob_refs:
+            return self._send(
+                url, graph.encode("utf-8"), None, progress_callback, job_key
+            )
+
+        # The graph only holds BLOB:<name> references, each payload is its own part
+        parts = [("prompt", "application/json", graph)]
+        for name, blob in blobs.items():
+            is_text = isinstance(blob, str)
+            content_type = "text/plain" if is_text else "application/octet-stream"
+            parts.append((name, content_type, blob))
+        body = MultipartBody(parts)
+        headers = client._headers()
+        headers["content-type"] = body.content_type
+        headers["content-length"] = str(len(body))
+        if blob_refs is None:
+            return self._send(url, body, headers, progress_callback, job_key)
+
+        try:
+            result = self._send(url, body, headers, progress_callback, job_key)
+        except Exception:
+            # The server may have dropped a referenced blob, resend them next time
+            blob_references.forget(blob_refs)
+            raise
+        blob_references.remember(blobs)
+        return result
+
+    def _send(self, url, data, headers, progress_callback, job_key=None):
+        def on_progress(data):
+            # {"value": step, "total": steps, "preview": <base64 image, optional>}
+            preview = data.get("preview")
+            progress_callback(
+                data["value"],
+                data.get("total"),
+                decode_preview(preview) if preview else None,
+            )
+
+        if job_key is not None:
+            return self.job_runner.run(
+                url,
+                job_key,
+                data,
+                headers,
+                on_progress=on_progress if progress_callback else None,
+            )
+        kwargs = {} if headers is None else {"headers": headers}
+        # Lets the server recognise a replayed prompt instead of running it twice,
+        # prompts are only replayed with BIZYAIR_IDEMPOTENT_RETRIES set
+        kwargs["idempotency_key"] = uuid.uuid4().hex
+        if progress_callback is None:
+            return client.send_request(url=url, data=data, **kwargs)
+        return client.send_stream_request(
             url=url,
-            data=json.dumps(
-                {"prompt": prompt, "last_node_id": last_node_ids[0]}
-            ).encode("utf-8"),
+            data=data,
+            on_event=lambda event, data: event == "progress" and on_progress(data),
+            **kwargs,
         )
 
     def validate_input(
-        self, url: str, prompt: Dict[str, Dict[str, Any]], last_node_ids: List[str]
+        self,
+        url: str,
+        prompt: Dict[str, Dict[str, Any]],
+        last_node_ids: List[str],
+        blobs: Dict[str, Union[bytes, str]] = None,
+        blob_refs: Set[str] = None,
+        progress_callback: Callable = None,
     ):
         return True
@@ -1,8 +1,13 @@
 import pprint
 import traceback
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List
 
-from bizyair.common.env_var import BIZYAIR_DEBUG
+from bizyair.common.env_var import (
+    BIZYAIR_BLOB_REFERENCES,
+    BIZYAIR_DEBUG,
+    BIZYAIR_PROMPT_TRANSPORT,
+)
+from bizyair.common.result_cache import is_cacheable, result_cache
 from bizyair.common.utils import truncate_long_strings
 from bizyair.image_utils import decode_data, encode_data
 
@@ -19,9 +24,19 @@ class PromptServer(Command):
         prompt: Dict[str, Dict[str, Any]],
         last_node_ids: List[str],
         *args,
+        progress_callback: Callable = None,
         **kwargs,
     ):
-        prompt = encode_data(prompt)
+        """
+        Run `prompt` in the cloud and return the output of `last_node_ids[0]`, or
+        a dict of outputs by node id when several `last_node_ids` are given.
+        With a `progress_callback`, step progress and previews are streamed to it.
+        """
+        # Tensors and images are collected here instead of being inlined as base64
+        blobs = {} if BIZYAIR_PROMPT_TRANSPORT == "multipart" else None
+        # Content hashes of blobs the server already holds and that were not resent
+        blob_refs = set() if blobs is not None and BIZYAIR_BLOB_REFERENCES else None
+        prompt = encode_data(prompt, blobs=blobs, blob_refs=blob_refs)
         if BIZYAIR_DEBUG:
             debug_info = {
                 "prompt": truncate_long_strings(prompt, 50),
@@ -32,22 +47,50 @@ class PromptServer(Command):
         if BIZYAIR_DEBUG:
             print(f"Generated URL: {url}")
 
-        result = self.processor(url, prompt=prompt, last_node_ids=last_node_ids)
+        result, cache_key = None, None
+        if result_cache is not None and is_cacheable(prompt):
+            cache_key = result_cache.key(url, prompt, last_node_ids)
+            result = result_cache.get(cache_key)
+            if BIZYAIR_DEBUG:
+                print(
+                    f"Result cache {'miss' if result is None else 'hit'}: {cache_key}"
+                )
+            if result is not None:
+                # A hit needs no write back
+                cache_key = None
+        if result is None:
+            result = self.processor(
+                url,
+                prompt=prompt,
+                last_node_ids=last_node_ids,
+                blobs=blobs,
+                blob_refs=blob_refs,
+                progress_callback=progress_callback,
+            )
         if BIZYAIR_DEBUG:
             pprint.pprint({"result": truncate_long_strings(result, 50)}, indent=4)
 
         if result is None:
             raise RuntimeError("result is None")
 
+        # Several outputs come back as one payload per node id
+        payload_key = "payload" if len(last_node_ids) == 1 else "payloads"
         try:
-            out = result["data"]["payload"]
+            out = result["data"][payload_key]
         except Exception as e:
             raise RuntimeError(
-                f'Unexpected error accessing result["data"]["payload"]. Result: {result}'
+                f'Unexpected error accessing result["data"]["{payload_key}"]. Result: {result}'
             ) from e
         try:
-            real_out = decode_data(out)
-            return real_out[0]
+            if len(last_node_ids) == 1:
+                real_out = decode_data(out)[0]
+            else:
+                real_out = {
+                    node_id: decode_data(out[node_id])[0] for node_id in last_node_ids
+                }
+            if cache_key is not None:
+                result_cache.put(cache_key, result)
+            return real_out
         except Exception as e:
             print("Exception occurred while decoding data")
             traceback.print_exc()
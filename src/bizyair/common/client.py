@@ -1,17 +1,36 @@
 import asyncio
+import hashlib
 import json
 import pprint
-import urllib.error
-import urllib.request
+import threading
+import time
 import warnings
 
 import aiohttp
+import urllib3
 
-__all__ = ["send_request"]
+__all__ = ["send_request", "send_stream_request"]
 
 from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, Tuple
 
-from .env_var import BIZYAIR_API_KEY, BIZYAIR_DEBUG, BIZYAIR_SERVER_ADDRESS
+from .env_var import (
+    BIZYAIR_API_KEY,
+    BIZYAIR_API_KEY_VALIDATION_TTL,
+    BIZYAIR_DEBUG,
+    BIZYAIR_HEDGE_REQUESTS,
+    BIZYAIR_IDEMPOTENT_RETRIES,
+    BIZYAIR_SERVER_ADDRESS,
+)
+from .governor import governor
+from .retry import (
+    IDEMPOTENT_METHODS,
+    hedge_delay,
+    hedged_call,
+    observe_latency,
+    retry_policy,
+)
+from .transport import get_aiohttp_session, http_request
 
 IS_API_KEY_VALID = None
 
@@ -25,11 +44,68 @@ class APIKeyState:
 api_key_state = APIKeyState()
 
 
+@dataclass
+class APIKeyValidationCache:
+    """Remembers successful `/user/info` validations so that `_headers()` does not
+    pay an extra round trip before every request. Only positive results are cached,
+    entries are keyed by the sha256 of the key and expire after `ttl` seconds.
+    """
+
+    ttl: int = field(default=BIZYAIR_API_KEY_VALIDATION_TTL)
+    avoided_calls: int = field(default=0)
+    _expires_at: Dict[str, float] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @staticmethod
+    def _key_hash(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+    def is_valid(self, api_key: str) -> bool:
+        if self.ttl <= 0:
+            return False
+        key_hash = self._key_hash(api_key)
+        with self._lock:
+            expires_at = self._expires_at.get(key_hash)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._expires_at[key_hash]
+                return False
+            self.avoided_calls += 1
+            return True
+
+    def mark_valid(self, api_key: str):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._expires_at[self._key_hash(api_key)] = time.monotonic() + self.ttl
+
+    def invalidate(self, api_key: str = None):
+        with self._lock:
+            if api_key is None:
+                self._expires_at.clear()
+            else:
+                self._expires_at.pop(self._key_hash(api_key), None)
+
+
+api_key_cache = APIKeyValidationCache()
+
+
+def _invalidate_api_key_from_headers(headers: dict):
+    auth = (headers or {}).get("authorization", "")
+    if auth.startswith("Bearer "):
+        api_key_cache.invalidate(auth[len("Bearer ") :])
+    else:
+        api_key_cache.invalidate()
+
+
 def set_api_key(api_key: str = "YOUR_API_KEY", override: bool = False):
     global BIZYAIR_API_KEY, api_key_state
     if api_key_state.is_valid is not None and not override:
         warnings.warn("API key has already been set and will not be overridden.")
         return
+    if override:
+        api_key_cache.invalidate()
     if validate_api_key(api_key):
         BIZYAIR_API_KEY = api_key
         api_key_state.is_valid = True
@@ -44,9 +120,10 @@ def validate_api_key(api_key: str = None) -> bool:
     if not api_key or not isinstance(api_key, str):
         warnings.warn("API key is not set.")
         return False
-    # if api_key_state.current_api_key == api_key and api_key_state.is_valid is not None:
-    #     return api_key_state.is_valid
     api_key_state.current_api_key = api_key
+    if api_key_cache.is_valid(api_key):
+        api_key_state.is_valid = True
+        return True
     url = f"{BIZYAIR_SERVER_ADDRESS}/user/info"
     headers = {"accept": "application/json", "authorization": f"Bearer {api_key}"}
 
@@ -59,6 +136,7 @@ def validate_api_key(api_key: str = None) -> bool:
             print(f"\033[91mAPI key validation failed. API Key: {api_key}\033[0m")
         else:
             api_key_state.is_valid = True
+            api_key_cache.mark_valid(api_key)
     except Exception as e:
         api_key_state.is_valid = False
         print(f"\033[91mError validating API key: {api_key}, error: {e}\033[0m")
@@ -106,38 +184,181 @@ def send_request(
     data: bytes = None,
     verbose=False,
     callback: callable = process_response_data,
+    *,
+    idempotency_key: str = None,
+    hedge: bool = False,
+    response_headers: dict = None,
     **kwargs,
 ) -> dict:
-    try:
-        headers = kwargs.pop("headers") if "headers" in kwargs else _headers()
-        headers["User-Agent"] = "BizyAir Client"
+    """
+    Transient failures are retried per `retry.retry_policy` for idempotent
+    methods, and for other methods only when an `idempotency_key` is given and
+    BIZYAIR_IDEMPOTENT_RETRIES is set, so
+    the server can recognise the replay. `hedge` marks a small idempotent call
+    that may be duplicated when it is slower than usual, see BIZYAIR_HEDGE_REQUESTS.
 
-        req = urllib.request.Request(
-            url, data=data, headers=headers, method=method, **kwargs
-        )
-        with urllib.request.urlopen(req) as response:
-            response_data = response.read().decode("utf-8")
-    except urllib.error.URLError as e:
-        error_message = str(e)
-        if verbose:
-            print(f"URLError encountered: {error_message}")
-        if "Unauthorized" in error_message:
-            raise PermissionError(
-                "Key is invalid, please refer to https://cloud.siliconflow.cn to get the API key.\n"
-                "If you have the key, please click the 'BizyAir Key' button at the bottom right to set the key."
-            )
+    The headers of the response are copied into `response_headers` if given.
+    A 304 answer to a conditional request returns None.
+    """
+    headers = kwargs.pop("headers") if "headers" in kwargs else _headers()
+    headers["User-Agent"] = "BizyAir Client"
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+    retryable = (
+        hedge
+        or method.upper() in IDEMPOTENT_METHODS
+        or bool(idempotency_key and BIZYAIR_IDEMPOTENT_RETRIES)
+    )
+
+    def request():
+        start = time.perf_counter()
+        response = http_request(method, url, data=data, headers=headers, **kwargs)
+        response_data = response.data.decode("utf-8")
+        observe_latency(method, url, time.perf_counter() - start)
+        if response_headers is not None:
+            response_headers.update(response.headers)
+        if response.status == 304:
+            return None
+        return response_data
+
+    def attempt():
+        return retry_policy.call(request) if retryable else request()
+
+    try:
+        if hedge and BIZYAIR_HEDGE_REQUESTS:
+            response_data = hedged_call(attempt, hedge_delay(method, url))
         else:
-            raise ConnectionError(
-                f"Failed to connect to the server: {error_message}.\n"
-                + "Please check your API key and ensure the server is reachable.\n"
-                + "Also, verify your network settings and disable any proxies if necessary.\n"
-                + "After checking, please restart the ComfyUI service."
-            )
+            response_data = attempt()
+    except urllib3.exceptions.HTTPError as e:
+        raise _request_error(e, headers, verbose) from e
+    if response_data is None:
+        return None
     if callback:
         return callback(json.loads(response_data))
     return json.loads(response_data)
 
 
+def _request_error(e: urllib3.exceptions.HTTPError, headers: dict, verbose=False):
+    error_message = str(e)
+    if verbose:
+        print(f"HTTPError encountered: {error_message}")
+    if "Unauthorized" in error_message:
+        _invalidate_api_key_from_headers(headers)
+        return PermissionError(
+            "Key is invalid, please refer to https://cloud.siliconflow.cn to get the API key.\n"
+            "If you have the key, please click the 'BizyAir Key' button at the bottom right to set the key."
+        )
+    return ConnectionError(
+        f"Failed to connect to the server: {error_message}.\n"
+        + "Please check your API key and ensure the server is reachable.\n"
+        + "Also, verify your network settings and disable any proxies if necessary.\n"
+        + "After checking, please restart the ComfyUI service."
+    )
+
+
+def _iter_lines(response) -> Iterator[bytes]:
+    # read1 returns whatever has arrived, read(amt) would wait for amt bytes
+    buffer = b""
+    while True:
+        chunk = response.read1(65536)
+        if not chunk:
+            break
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        yield from lines
+    if buffer:
+        yield buffer
+
+
+def iter_sse_events(lines: Iterable[bytes]) -> Iterator[Tuple[str, str]]:
+    """Yields (event, data) for each server-sent event, see
+    https://html.spec.whatwg.org/multipage/server-sent-events.html"""
+    event, data = "message", []
+    for line in lines:
+        line = line.decode("utf-8").rstrip("\r")
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+            continue
+        if line.startswith(":"):
+            continue
+        name, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if name == "event":
+            event = value
+        elif name == "data":
+            data.append(value)
+    if data:
+        yield event, "\n".join(data)
+
+
+def send_stream_request(
+    url: str,
+    data: bytes = None,
+    on_event: Callable[[str, dict], None] = None,
+    verbose=False,
+    callback: callable = process_response_data,
+    *,
+    idempotency_key: str = None,
+    **kwargs,
+) -> dict:
+    """
+    POSTs `data` asking for a text/event-stream response. Every event other than
+    "result" and "error" is passed to `on_event(event, data)` as it arrives, the
+    "result" event carries the same JSON document `send_request` would return.
+    A server that answers with plain JSON is handled like `send_request`.
+    With an `idempotency_key` and BIZYAIR_IDEMPOTENT_RETRIES set, failures
+    before the stream starts are retried.
+    """
+    headers = kwargs.pop("headers") if "headers" in kwargs else _headers()
+    headers["User-Agent"] = "BizyAir Client"
+    headers["accept"] = "text/event-stream"
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+
+    def request():
+        return http_request(
+            "POST", url, data=data, headers=headers, preload_content=False, **kwargs
+        )
+
+    try:
+        if idempotency_key and BIZYAIR_IDEMPOTENT_RETRIES:
+            response = retry_policy.call(request)
+        else:
+            response = request()
+    except urllib3.exceptions.HTTPError as e:
+        raise _request_error(e, headers, verbose) from e
+
+    try:
+        if not response.headers.get("content-type", "").startswith("text/event-stream"):
+            result = json.loads(response.read().decode("utf-8"))
+        else:
+            result = None
+            for event, event_data in iter_sse_events(_iter_lines(response)):
+                if event == "result":
+                    result = json.loads(event_data)
+                    break
+                if event == "error":
+                    raise ConnectionError(f"Cloud execution failed: {event_data}")
+                if on_event:
+                    on_event(event, json.loads(event_data))
+            if result is None:
+                raise ConnectionError("Event stream ended without a result.")
+            response.drain_conn()
+    except urllib3.exceptions.HTTPError as e:
+        response.close()
+        raise _request_error(e, headers, verbose) from e
+    except BaseException:
+        # Do not return a half-read connection to the pool
+        response.close()
+        raise
+    finally:
+        response.release_conn()
+    if callback:
+        return callback(result)
+    return result
+
+
 async def async_send_request(
     method: str = "POST",
     url: str = None,
@@ -148,30 +369,32 @@ async def async_send_request(
 ) -> dict:
     headers = kwargs.pop("headers") if "headers" in kwargs else _headers()
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.request(
-                method, url, data=data, headers=headers, **kwargs
-            ) as response:
-                response_data = await response.text()
-                if response.status != 200:
-                    error_message = f"HTTP Status {response.status}"
-                    if verbose:
-                        print(f"Error encountered: {error_message}")
-                    if response.status == 401:
-                        raise PermissionError(
-                            "Key is invalid, please refer to https://cloud.siliconflow.cn to get the API key.\n"
-                            "If you have the key, please click the 'BizyAir Key' button at the bottom right to set the key."
-                        )
-                    else:
-                        raise ConnectionError(
-                            f"Failed to connect to the server: {error_message}.\n"
-                            + "Please check your API key and ensure the server is reachable.\n"
-                            + "Also, verify your network settings and disable any proxies if necessary.\n"
-                            + "After checking, please restart the ComfyUI service."
-                        )
-                if callback:
-                    return callback(json.loads(response_data))
-                return json.loads(response_data)
+        session = get_aiohttp_session()
+        async with governor.async_slot(), session.request(
+            method, url, data=data, headers=headers, **kwargs
+        ) as response:
+            governor.observe(response.status, response.headers.get("Retry-After"))
+            response_data = await response.text()
+            if response.status != 200:
+                error_message = f"HTTP Status {response.status}"
+                if verbose:
+                    print(f"Error encountered: {error_message}")
+                if response.status == 401:
+                    _invalidate_api_key_from_headers(headers)
+                    raise PermissionError(
+                        "Key is invalid, please refer to https://cloud.siliconflow.cn to get the API key.\n"
+                        "If you have the key, please click the 'BizyAir Key' button at the bottom right to set the key."
+                    )
+                else:
+                    raise ConnectionError(
+                        f"Failed to connect to the server: {error_message}.\n"
+                        + "Please check your API key and ensure the server is reachable.\n"
+                        + "Also, verify your network settings and disable any proxies if necessary.\n"
+                        + "After checking, please restart the ComfyUI service."
+                    )
+            if callback:
+                return callback(json.loads(response_data))
+            return json.loads(response_data)
     except aiohttp.ClientError as e:
         print(f"Error fetching data: {e}")
         return {}
@@ -181,18 +404,33 @@ async def async_send_request(
 
 
 def fetch_models_by_type(
-    url: str, model_type: str, *, method="GET", verbose=False
+    url: str,
+    model_type: str,
+    *,
+    method="GET",
+    verbose=False,
+    etag: str = None,
+    response_headers: dict = None,
 ) -> dict:
+    """
+    With the `etag` of an earlier answer, None means the list did not change.
+    """
     if not validate_api_key(BIZYAIR_API_KEY):
         return {}
 
     payload = {"type": model_type}
     if BIZYAIR_DEBUG:
         pprint.pprint(payload)
+    headers = _headers()
+    if etag:
+        headers["If-None-Match"] = etag
     msg = send_request(
         method=method,
         url=url,
         data=json.dumps(payload).encode("utf-8"),
         verbose=verbose,
+        hedge=True,
+        headers=headers,
+        response_headers=response_headers,
     )
     return msg
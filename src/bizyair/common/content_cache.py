@@ -0,0 +1,169 @@
+import hashlib
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Union
+
+import torch
+
+from .env_var import BIZYAIR_BLOB_REFERENCE_TTL, BIZYAIR_ENCODE_CACHE_SIZE
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+__all__ = [
+    "content_digest",
+    "EncodedPayloadCache",
+    "BlobReferences",
+    "payload_cache",
+    "blob_references",
+    "cache_stats",
+]
+
+Payload = Union[bytes, str]
+
+# id(tensor) -> (weakref, tensor._version, digest), so a tensor feeding several nodes
+# is hashed once. Tensors compare elementwise, which rules out a WeakKeyDictionary.
+_digests: Dict[int, tuple] = {}
+_digests_lock = threading.Lock()
+
+
+def _new_hasher():
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def _hash_tensor(tensor: torch.Tensor) -> str:
+    data = tensor.detach().cpu().contiguous()
+    hasher = _new_hasher()
+    hasher.update(f"{data.dtype}{tuple(data.shape)}".encode("utf-8"))
+    hasher.update(data.reshape(-1).view(torch.uint8).numpy())
+    return hasher.hexdigest()
+
+
+def content_digest(tensor: torch.Tensor) -> str:
+    """Hash of the dtype, shape and bytes of a tensor."""
+    # Inference tensors, as ComfyUI nodes produce them under torch.inference_mode(),
+    # have no version counter to tell an in-place update, so they are not memoized
+    if tensor.is_inference():
+        return _hash_tensor(tensor)
+
+    key = id(tensor)
+    with _digests_lock:
+        cached = _digests.get(key)
+    if cached is not None and cached[0]() is tensor and cached[1] == tensor._version:
+        return cached[2]
+
+    digest = _hash_tensor(tensor)
+    ref = weakref.ref(tensor, lambda _: _digests.pop(key, None))
+    with _digests_lock:
+        _digests[key] = (ref, tensor._version, digest)
+    return digest
+
+
+@dataclass
+class EncodedPayloadCache:
+    """LRU of encoded payloads keyed by content digest, bounded in bytes."""
+
+    max_bytes: int
+    hits: int = 0
+    misses: int = 0
+    size: int = 0
+    _entries: "OrderedDict[str, Payload]" = field(default_factory=OrderedDict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[Payload]:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, key: str, payload: Payload):
+        nbytes = len(payload)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = payload
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+@dataclass
+class BlobReferences:
+    """
+    Digests of the blobs the server received in earlier requests, which are
+    sent as references instead of payloads until `ttl` seconds have passed.
+    """
+
+    ttl: int
+    references: int = 0
+    bytes_saved: int = 0
+    # digest -> (monotonic time it was sent, payload size)
+    _sent: Dict[str, tuple] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def reference(self, digest: str) -> bool:
+        """Whether `digest` can be referenced, counting the bytes it saves if so."""
+        with self._lock:
+            sent = self._sent.get(digest)
+            if sent is None:
+                return False
+            sent_at, nbytes = sent
+            if time.monotonic() - sent_at >= self.ttl:
+                del self._sent[digest]
+                return False
+            self.references += 1
+            self.bytes_saved += nbytes
+            return True
+
+    def remember(self, blobs: Dict[str, Payload]):
+        now = time.monotonic()
+        with self._lock:
+            for digest, payload in blobs.items():
+                self._sent[digest] = (now, len(payload))
+
+    def forget(self, digests: Iterable[str] = None):
+        """Drop `digests`, or everything, e.g. after a request using them failed."""
+        with self._lock:
+            if digests is None:
+                self._sent.clear()
+                return
+            for digest in digests:
+                self._sent.pop(digest, None)
+
+
+payload_cache = EncodedPayloadCache(max_bytes=BIZYAIR_ENCODE_CACHE_SIZE * 1024 * 1024)
+blob_references = BlobReferences(ttl=BIZYAIR_BLOB_REFERENCE_TTL)
+
+
+def cache_stats() -> Dict[str, int]:
+    return {
+        "hits": payload_cache.hits,
+        "misses": payload_cache.misses,
+        "cached_bytes": payload_cache.size,
+        "references": blob_references.references,
+        "bytes_saved": blob_references.bytes_saved,
+    }
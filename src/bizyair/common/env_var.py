@@ -52,6 +52,14 @@ def env(key, type_, default=None):
                 "Invalid environment variable '%s' (expected an integer): '%s'"
                 % (key, val)
             ) from None
+    if type_ == float:
+        try:
+            return float(val)
+        except ValueError:
+            raise ValueError(
+                "Invalid environment variable '%s' (expected a float): '%s'"
+                % (key, val)
+            ) from None
     raise ValueError("The requested type '%r' is not supported" % type_)
 
 
@@ -89,6 +97,126 @@ _BIZYAIR_SERVER_ADDRESS = os.getenv(
 )
 BIZYAIR_SERVER_ADDRESS = ServerAddress(_BIZYAIR_SERVER_ADDRESS)
 BIZYAIR_API_KEY = env("BIZYAIR_API_KEY", str, load_api_key()[1])
+# Seconds a successful API key validation is reused, 0 disables the cache
+BIZYAIR_API_KEY_VALIDATION_TTL = env("BIZYAIR_API_KEY_VALIDATION_TTL", int, 600)
+# Shared HTTP transport, see bizyair.common.transport
+BIZYAIR_HTTP_POOL_HOSTS = env("BIZYAIR_HTTP_POOL_HOSTS", int, 10)
+BIZYAIR_HTTP_POOL_MAXSIZE = env("BIZYAIR_HTTP_POOL_MAXSIZE", int, 10)
+BIZYAIR_HTTP_KEEPALIVE_TIMEOUT = env("BIZYAIR_HTTP_KEEPALIVE_TIMEOUT", int, 30)
+# Retries of transient failures (408/429/5xx, connection errors, timeouts) with
+# exponential backoff and jitter, in ms. Requests that are not idempotent, such
+# as prompt POSTs, are only retried when they carry an idempotency key and
+# BIZYAIR_IDEMPOTENT_RETRIES is set, needs server-side support for the key
+BIZYAIR_HTTP_RETRIES = env("BIZYAIR_HTTP_RETRIES", int, 3)
+BIZYAIR_IDEMPOTENT_RETRIES = env("BIZYAIR_IDEMPOTENT_RETRIES", bool, False)
+BIZYAIR_HTTP_RETRY_BACKOFF = env("BIZYAIR_HTTP_RETRY_BACKOFF", int, 500)
+BIZYAIR_HTTP_RETRY_MAX_BACKOFF = env("BIZYAIR_HTTP_RETRY_MAX_BACKOFF", int, 10000)
+# Send a duplicate of small read-only calls (model lists) that take longer than
+# the given latency quantile of their endpoint, once enough samples were seen
+BIZYAIR_HEDGE_REQUESTS = env("BIZYAIR_HEDGE_REQUESTS", bool, False)
+BIZYAIR_HEDGE_QUANTILE = env("BIZYAIR_HEDGE_QUANTILE", float, 0.95)
+BIZYAIR_HEDGE_MIN_SAMPLES = env("BIZYAIR_HEDGE_MIN_SAMPLES", int, 20)
+# Client-side limits for every request to the cloud: requests per second with
+# bursts of BIZYAIR_RATE_BURST, and requests in flight. 0 disables a limit. When
+# a limit is set it is shared by all ComfyUI processes through a lock file in
+# BIZYAIR_GOVERNOR_DIR. Retry-After of 429/503 responses is always honored.
+BIZYAIR_RATE_LIMIT = env("BIZYAIR_RATE_LIMIT", float, 0.0)
+BIZYAIR_RATE_BURST = env("BIZYAIR_RATE_BURST", int, 10)
+BIZYAIR_MAX_IN_FLIGHT = env("BIZYAIR_MAX_IN_FLIGHT", int, 0)
+BIZYAIR_GOVERNOR_DIR = env(
+    "BIZYAIR_GOVERNOR_DIR",
+    str,
+    os.path.join(os.path.expanduser("~"), ".cache", "bizyair", "governor"),
+)
+# Seconds after which a request slot of a hung or killed process is reclaimed
+BIZYAIR_GOVERNOR_LEASE = env("BIZYAIR_GOVERNOR_LEASE", int, 600)
+# Experimental, needs urllib3>=2.3 and the h2 package
+BIZYAIR_HTTP2 = env("BIZYAIR_HTTP2", bool, False)
+# Wire format of non-image tensors: "pickle" (legacy) or a binary frame body
+# codec "raw", "zlib", "lz4", "zstd". Binary frames need server-side support.
+BIZYAIR_TENSOR_CODEC = env("BIZYAIR_TENSOR_CODEC", str, "pickle")
+# "json" sends the whole prompt as one JSON document, "multipart" sends the
+# graph as JSON and every tensor/image as its own part. Multipart needs server-side support.
+BIZYAIR_PROMPT_TRANSPORT = env("BIZYAIR_PROMPT_TRANSPORT", str, "json")
+# Threads used to encode/decode IMAGE batches, 1 disables the thread pool
+BIZYAIR_IMAGE_CODEC_WORKERS = env(
+    "BIZYAIR_IMAGE_CODEC_WORKERS", int, min(8, os.cpu_count() or 1)
+)
+# MiB of encoded tensors/images kept by content hash, 0 disables the cache
+BIZYAIR_ENCODE_CACHE_SIZE = env("BIZYAIR_ENCODE_CACHE_SIZE", int, 128)
+# Multipart only: reference blobs the server already received by their content
+# hash instead of resending them. Needs server-side support.
+BIZYAIR_BLOB_REFERENCES = env("BIZYAIR_BLOB_REFERENCES", bool, False)
+# Seconds the server is assumed to keep a received blob
+BIZYAIR_BLOB_REFERENCE_TTL = env("BIZYAIR_BLOB_REFERENCE_TTL", int, 3600)
+# Reuse results of identical prompts, see bizyair.common.result_cache.
+# Nodes with NOT_IDEMPOTENT = True are never cached. Sizes are in MiB.
+BIZYAIR_RESULT_CACHE = env("BIZYAIR_RESULT_CACHE", bool, False)
+BIZYAIR_RESULT_CACHE_DIR = env(
+    "BIZYAIR_RESULT_CACHE_DIR",
+    str,
+    os.path.join(os.path.expanduser("~"), ".cache", "bizyair", "results"),
+)
+BIZYAIR_RESULT_CACHE_MEMORY_SIZE = env("BIZYAIR_RESULT_CACHE_MEMORY_SIZE", int, 256)
+BIZYAIR_RESULT_CACHE_DISK_SIZE = env("BIZYAIR_RESULT_CACHE_DISK_SIZE", int, 2048)
+# Run BizyAir nodes that call the cloud as ComfyUI async nodes on worker threads,
+# so independent branches are in flight together. Needs ComfyUI with async nodes.
+BIZYAIR_CONCURRENT_EXECUTION = env("BIZYAIR_CONCURRENT_EXECUTION", bool, False)
+BIZYAIR_MAX_CONCURRENT_REQUESTS = env("BIZYAIR_MAX_CONCURRENT_REQUESTS", int, 4)
+# Merge overlapping send_request calls made within the window (ms) into one
+# request with several outputs. Needs server-side support and pays off with
+# BIZYAIR_CONCURRENT_EXECUTION, which is what makes such calls overlap.
+BIZYAIR_MULTI_OUTPUT = env("BIZYAIR_MULTI_OUTPUT", bool, False)
+BIZYAIR_MULTI_OUTPUT_WINDOW = env("BIZYAIR_MULTI_OUTPUT_WINDOW", int, 50)
+# Ask the cloud for a text/event-stream response with step progress and
+# previews for nodes that pass a progress callback. Needs server-side support.
+BIZYAIR_STREAMING = env("BIZYAIR_STREAMING", bool, False)
+# Submit prompts as cloud jobs and poll for their result instead of holding one
+# connection open. Submitted jobs are journaled, so an interrupted run resumes
+# the job of the same prompt instead of resubmitting. Needs server-side support.
+BIZYAIR_ASYNC_JOBS = env("BIZYAIR_ASYNC_JOBS", bool, False)
+BIZYAIR_JOB_JOURNAL_DIR = env(
+    "BIZYAIR_JOB_JOURNAL_DIR",
+    str,
+    os.path.join(os.path.expanduser("~"), ".cache", "bizyair", "jobs"),
+)
+# Milliseconds between status polls
+BIZYAIR_JOB_POLL_INTERVAL = env("BIZYAIR_JOB_POLL_INTERVAL", int, 1000)
+# Seconds after which a journaled job is no longer resumed
+BIZYAIR_JOB_TTL = env("BIZYAIR_JOB_TTL", int, 86400)
+# JSON file remembering the upload signature of local model files by path, size,
+# mtime and inode, so unchanged files are not hashed again. Empty disables it.
+BIZYAIR_UPLOAD_HASH_CACHE = env(
+    "BIZYAIR_UPLOAD_HASH_CACHE",
+    str,
+    os.path.join(os.path.expanduser("~"), ".cache", "bizyair", "upload_hashes.json"),
+)
+# Model hosting uploads: files from BIZYAIR_UPLOAD_MULTIPART_THRESHOLD MiB on are
+# sent as multipart uploads with BIZYAIR_UPLOAD_THREADS parts in flight, and
+# resume from a checkpoint in BIZYAIR_UPLOAD_CHECKPOINT_DIR when interrupted
+BIZYAIR_UPLOAD_THREADS = env("BIZYAIR_UPLOAD_THREADS", int, 4)
+BIZYAIR_UPLOAD_MULTIPART_THRESHOLD = env("BIZYAIR_UPLOAD_MULTIPART_THRESHOLD", int, 64)
+BIZYAIR_UPLOAD_CHECKPOINT_DIR = env(
+    "BIZYAIR_UPLOAD_CHECKPOINT_DIR",
+    str,
+    os.path.join(os.path.expanduser("~"), ".cache", "bizyair", "uploads"),
+)
+# Files of one model uploaded at once, and the MiB/s all uploads may use
+# together (0 for no limit)
+BIZYAIR_UPLOAD_CONCURRENCY = env("BIZYAIR_UPLOAD_CONCURRENCY", int, 2)
+BIZYAIR_UPLOAD_BANDWIDTH = env("BIZYAIR_UPLOAD_BANDWIDTH", float, 0)
+# Models uploaded at once by the model hosting upload queue
+BIZYAIR_UPLOAD_WORKERS = env("BIZYAIR_UPLOAD_WORKERS", int, 2)
+# Model catalogs of the file lists (LoRAs, ControlNets, ...) are kept here so
+# they are shown right away after a restart and refreshed in the background.
+# Empty keeps them in memory only.
+BIZYAIR_CATALOG_CACHE_DIR = env(
+    "BIZYAIR_CATALOG_CACHE_DIR",
+    str,
+    os.path.join(os.path.expanduser("~"), ".cache", "bizyair", "catalogs"),
+)
+# Fetch all model catalogs in the background when the plugin is loaded
+BIZYAIR_PREFETCH_CATALOGS = env("BIZYAIR_PREFETCH_CATALOGS", bool, True)
 # Development Settings
 BIZYAIR_DEV_REQUEST_URL = env("BIZYAIR_DEV_REQUEST_URL", str, None)
 BIZYAIR_DEBUG = env("BIZYAIR_DEBUG", bool, False)
@@ -0,0 +1,264 @@
+import asyncio
+import email.utils
+import json
+import os
+import threading
+import time
+import uuid
+import warnings
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+from .env_var import (
+    BIZYAIR_GOVERNOR_DIR,
+    BIZYAIR_GOVERNOR_LEASE,
+    BIZYAIR_MAX_IN_FLIGHT,
+    BIZYAIR_RATE_BURST,
+    BIZYAIR_RATE_LIMIT,
+)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+__all__ = ["RequestGovernor", "governor", "parse_retry_after"]
+
+# Longest single sleep while waiting, so a shorter Retry-After set by another
+# process or a released slot is noticed
+_MAX_WAIT_STEP = 0.25
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, either delta-seconds or an HTTP-date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name != "posix":
+        # Signal 0 would terminate the process on Windows, rely on the lease
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class _FileLock:
+    """Exclusive lock on a file, shared by every process that opens it."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a+b")
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class RequestGovernor:
+    """
+    Token bucket (`rate` requests per second, bursts of `burst`) plus a cap of
+    `max_in_flight` concurrent requests, and a pause until a Retry-After given
+    by the server has passed. 0 disables a limit.
+
+    With a `directory`, the state lives in a JSON file guarded by a file lock,
+    so every ComfyUI process of the machine shares one budget. Slots are leases
+    that expire after `lease` seconds, or when their process is gone, so a
+    crashed worker does not hold them forever.
+    """
+
+    def __init__(
+        self,
+        rate: float = 0,
+        burst: int = 1,
+        max_in_flight: int = 0,
+        directory: Optional[str] = None,
+        lease: float = 600,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_in_flight = max_in_flight
+        self.lease = lease
+        self.waits = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+        self._state = None
+        self._file_lock = None
+        self._path = None
+        if directory:
+            try:
+                self._file_lock = _FileLock(os.path.join(directory, "governor.lock"))
+                self._path = os.path.join(directory, "governor.json")
+            except OSError as e:
+                warnings.warn(f"Rate limits are not shared between processes: {e}")
+
+    @contextmanager
+    def _locked_state(self):
+        with self._lock:
+            if self._file_lock is None:
+                if self._state is None:
+                    self._state = self._new_state()
+                yield self._state
+                return
+            with self._file_lock:
+                state = self._read_state()
+                yield state
+                with open(self._path, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+
+    def _new_state(self) -> dict:
+        return {
+            "tokens": float(self.burst),
+            "updated": time.time(),
+            "blocked_until": 0.0,
+            "leases": {},
+        }
+
+    def _read_state(self) -> dict:
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return self._new_state()
+
+    def _try_acquire(self, lease_id: str) -> Optional[float]:
+        """Takes a slot and returns None, or returns how long to wait."""
+        with self._locked_state() as state:
+            now = time.time()
+            if self.rate > 0:
+                elapsed = max(0.0, now - state["updated"])
+                state["tokens"] = min(
+                    float(self.burst), state["tokens"] + elapsed * self.rate
+                )
+            state["updated"] = now
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+            leases = state["leases"]
+            if self.max_in_flight > 0:
+                for expired in [
+                    key
+                    for key, (pid, started) in leases.items()
+                    if now - started > self.lease or not _pid_alive(pid)
+                ]:
+                    del leases[expired]
+                if len(leases) >= self.max_in_flight:
+                    return _MAX_WAIT_STEP
+            if self.rate > 0:
+                if state["tokens"] < 1:
+                    return (1 - state["tokens"]) / self.rate
+                state["tokens"] -= 1
+            if self.max_in_flight > 0:
+                leases[lease_id] = [os.getpid(), now]
+            return None
+
+    def _count_wait(self, delay: float):
+        with self._lock:
+            self.waits += 1
+            self.waited += delay
+
+    def acquire(self) -> str:
+        lease_id = uuid.uuid4().hex
+        while True:
+            delay = self._try_acquire(lease_id)
+            if delay is None:
+                return lease_id
+            delay = min(delay, _MAX_WAIT_STEP)
+            self._count_wait(delay)
+            time.sleep(delay)
+
+    async def acquire_async(self) -> str:
+        lease_id = uuid.uuid4().hex
+        loop = asyncio.get_running_loop()
+        while True:
+            if self._file_lock is None:
+                delay = self._try_acquire(lease_id)
+            else:
+                # Waits for the file lock and reads the shared state
+                delay = await loop.run_in_executor(None, self._try_acquire, lease_id)
+            if delay is None:
+                return lease_id
+            delay = min(delay, _MAX_WAIT_STEP)
+            self._count_wait(delay)
+            await asyncio.sleep(delay)
+
+    def release(self, lease_id: str):
+        if self.max_in_flight <= 0:
+            return
+        with self._locked_state() as state:
+            state["leases"].pop(lease_id, None)
+
+    def defer(self, seconds: float):
+        """Holds back every request until `seconds` from now (Retry-After)."""
+        with self._locked_state() as state:
+            state["blocked_until"] = max(state["blocked_until"], time.time() + seconds)
+
+    @contextmanager
+    def slot(self):
+        lease_id = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(lease_id)
+
+    @asynccontextmanager
+    async def async_slot(self):
+        lease_id = await self.acquire_async()
+        try:
+            yield
+        finally:
+            if self._file_lock is None:
+                self.release(lease_id)
+            else:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.release, lease_id
+                )
+
+    def observe(self, status: int, retry_after: Optional[str]):
+        """Pauses requests when a throttled or unavailable response asks for it."""
+        if status in (429, 503):
+            seconds = parse_retry_after(retry_after)
+            if seconds:
+                self.defer(seconds)
+
+
+def _create_governor() -> RequestGovernor:
+    limited = BIZYAIR_RATE_LIMIT > 0 or BIZYAIR_MAX_IN_FLIGHT > 0
+    return RequestGovernor(
+        rate=BIZYAIR_RATE_LIMIT,
+        burst=BIZYAIR_RATE_BURST,
+        max_in_flight=BIZYAIR_MAX_IN_FLIGHT,
+        # Without limits only Retry-After is honored, per process
+        directory=BIZYAIR_GOVERNOR_DIR if limited else None,
+        lease=BIZYAIR_GOVERNOR_LEASE,
+    )
+
+
+governor = _create_governor()
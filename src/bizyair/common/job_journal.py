@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+import time
+import warnings
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+from ..image_utils import TaskStatus
+from .env_var import BIZYAIR_ASYNC_JOBS, BIZYAIR_JOB_JOURNAL_DIR, BIZYAIR_JOB_TTL
+
+__all__ = ["Job", "JobJournal", "job_journal"]
+
+
+@dataclass
+class Job:
+    """A prompt submitted as a cloud job, `key` is the prompt's ResultCache.key."""
+
+    key: str
+    job_id: str
+    url: str
+    status: TaskStatus = TaskStatus.PENDING
+    submitted_at: float = field(default_factory=time.time)
+    message: Optional[str] = None
+
+    def transition(self, status: TaskStatus, message: str = None):
+        if not self.status.can_transition_to(status):
+            raise RuntimeError(
+                f"Job {self.job_id} cannot go from {self.status.value} to {status.value}"
+            )
+        self.status = status
+        self.message = message
+
+
+@dataclass
+class JobJournal:
+    """
+    Jobs that were submitted but whose result was not fetched yet, one JSON file
+    per prompt key. Entries older than `ttl` seconds are dropped on read.
+    """
+
+    directory: str
+    ttl: int = BIZYAIR_JOB_TTL
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Job]:
+        with self._lock:
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                entry["status"] = TaskStatus(entry["status"])
+                job = Job(**entry)
+            except FileNotFoundError:
+                return None
+            except (OSError, ValueError, TypeError, KeyError) as e:
+                warnings.warn(f"Dropping unreadable job journal entry {key}: {e}")
+                self._remove(key)
+                return None
+            if time.time() - job.submitted_at > self.ttl:
+                self._remove(key)
+                return None
+            return job
+
+    def put(self, job: Job):
+        entry = asdict(job)
+        entry["status"] = job.status.value
+        path = self._path(job.key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(entry, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                warnings.warn(f"Failed to journal job {job.job_id}: {e}")
+
+    def remove(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def jobs(self) -> List[Job]:
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        jobs = (self.get(name[:-5]) for name in names if name.endswith(".json"))
+        return [job for job in jobs if job is not None]
+
+
+job_journal = (
+    JobJournal(directory=BIZYAIR_JOB_JOURNAL_DIR) if BIZYAIR_ASYNC_JOBS else None
+)
@@ -0,0 +1,59 @@
+import uuid
+from typing import Iterator, List, Tuple, Union
+
+__all__ = ["MultipartBody"]
+
+Payload = Union[bytes, bytearray, memoryview, str]
+
+
+class MultipartBody:
+    """
+    A multipart/form-data request body that is streamed part by part from the
+    objects it was given, instead of being concatenated into one bytes object.
+    It can be iterated several times, so a reconnect can replay it.
+
+    `parts` is a list of (name, content_type, payload) tuples.
+    """
+
+    block_size = 1024 * 1024
+
+    def __init__(self, parts: List[Tuple[str, str, Payload]], boundary: str = None):
+        self.boundary = boundary or uuid.uuid4().hex
+        self._chunks: List[Payload] = []
+        for name, content_type, payload in parts:
+            self._chunks.append(
+                (
+                    f"--{self.boundary}\r\n"
+                    f'Content-Disposition: form-data; name="{name}"\r\n'
+                    f"Content-Type: {content_type}\r\n\r\n"
+                ).encode("utf-8")
+            )
+            self._chunks.append(payload)
+            self._chunks.append(b"\r\n")
+        self._chunks.append(f"--{self.boundary}--\r\n".encode("utf-8"))
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @staticmethod
+    def _nbytes(chunk: Payload) -> int:
+        if isinstance(chunk, str):
+            return len(chunk) if chunk.isascii() else len(chunk.encode("utf-8"))
+        return memoryview(chunk).nbytes
+
+    def __len__(self) -> int:
+        return sum(self._nbytes(chunk) for chunk in self._chunks)
+
+    def __iter__(self) -> Iterator[Union[bytes, memoryview]]:
+        for chunk in self._chunks:
+            if isinstance(chunk, str):
+                if not chunk.isascii():
+                    yield chunk.encode("utf-8")
+                    continue
+                for i in range(0, len(chunk), self.block_size):
+                    yield chunk[i : i + self.block_size].encode("ascii")
+            else:
+                view = memoryview(chunk).cast("B")
+                for i in range(0, view.nbytes, self.block_size):
+                    yield view[i : i + self.block_size]
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from .env_var import (
+    BIZYAIR_RESULT_CACHE,
+    BIZYAIR_RESULT_CACHE_DIR,
+    BIZYAIR_RESULT_CACHE_DISK_SIZE,
+    BIZYAIR_RESULT_CACHE_MEMORY_SIZE,
+)
+
+__all__ = [
+    "ResultCache",
+    "result_cache",
+    "uncacheable_class_types",
+    "is_cacheable",
+]
+
+# class_type of nodes whose results must never be reused (NOT_IDEMPOTENT nodes)
+uncacheable_class_types: Set[str] = set()
+
+
+def is_cacheable(prompt: Dict[str, Dict[str, Any]]) -> bool:
+    return not any(
+        node.get("class_type") in uncacheable_class_types for node in prompt.values()
+    )
+
+
+@dataclass
+class ResultCache:
+    """
+    Results of earlier prompts keyed by a hash of the encoded graph, kept in a
+    memory tier and, if `directory` is set, in a disk tier. Both are LRUs
+    bounded in bytes of serialized result.
+    """
+
+    memory_bytes: int
+    disk_bytes: int = 0
+    directory: Optional[str] = None
+    hits: int = 0
+    misses: int = 0
+    _memory: "OrderedDict[str, str]" = field(default_factory=OrderedDict)
+    _memory_size: int = 0
+    # key -> file size, oldest first. Loaded from the directory on first use.
+    _disk: "OrderedDict[str, int]" = None
+    _disk_size: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @staticmethod
+    def key(
+        url: str, prompt: Dict[str, Dict[str, Any]], last_node_ids: List[str]
+    ) -> str:
+        """
+        Canonical hash of an encoded prompt and its target. Out-of-band blobs are
+        named by content hash, so whether they were attached or referenced does
+        not change the key.
+        """
+        graph = {"url": str(url), "prompt": prompt, "last_node_ids": last_node_ids}
+        canonical = json.dumps(graph, sort_keys=True).replace('"BLOBREF:', '"BLOB:')
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_disk_index(self):
+        self._disk = OrderedDict()
+        self._disk_size = 0
+        if not self.directory or self.disk_bytes <= 0:
+            return
+        entries = []
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(".json") and entry.is_file():
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        except OSError as e:
+            warnings.warn(f"Result cache directory is not usable, memory only: {e}")
+            self.directory = None
+            return
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+
+    def _remember(self, key: str, serialized: str):
+        size = len(serialized)
+        if size > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = serialized
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            serialized = self._memory.get(key)
+            if serialized is not None:
+                self._memory.move_to_end(key)
+                self._touch_disk(key)
+            else:
+                serialized = self._read_disk(key)
+                if serialized is not None:
+                    self._remember(key, serialized)
+            if serialized is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(serialized)
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        if self._disk is None:
+            self._load_disk_index()
+        if key not in self._disk:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                serialized = f.read()
+            os.utime(self._path(key))
+        except OSError:
+            self._disk_size -= self._disk.pop(key)
+            return None
+        self._disk.move_to_end(key)
+        return serialized
+
+    def _touch_disk(self, key: str):
+        if self._disk is not None and key in self._disk:
+            self._disk.move_to_end(key)
+            try:
+                os.utime(self._path(key))
+            except OSError:
+                pass
+
+    def put(self, key: str, result: Any):
+        serialized = json.dumps(result)
+        with self._lock:
+            self._remember(key, serialized)
+            try:
+                self._write_disk(key, serialized)
+            except OSError as e:
+                warnings.warn(f"Failed to write result cache entry {key}: {e}")
+
+    def _write_disk(self, key: str, serialized: str):
+        if self._disk is None:
+            self._load_disk_index()
+        # json.dumps escapes non-ASCII, so characters are bytes
+        size = len(serialized)
+        if not self.directory or size > self.disk_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(serialized)
+        os.replace(tmp_path, path)
+        self._disk_size += size - self._disk.pop(key, 0)
+        self._disk[key] = size
+        while self._disk_size > self.disk_bytes:
+            evicted, evicted_size = self._disk.popitem(last=False)
+            self._disk_size -= evicted_size
+            try:
+                os.remove(self._path(evicted))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            if self._disk is None:
+                self._load_disk_index()
+            for key in self._disk:
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self._disk.clear()
+            self._disk_size = 0
+
+
+result_cache = (
+    ResultCache(
+        memory_bytes=BIZYAIR_RESULT_CACHE_MEMORY_SIZE * 1024 * 1024,
+        disk_bytes=BIZYAIR_RESULT_CACHE_DISK_SIZE * 1024 * 1024,
+        directory=BIZYAIR_RESULT_CACHE_DIR,
+    )
+    if BIZYAIR_RESULT_CACHE
+    else None
+)
@@ -0,0 +1,240 @@
+import bisect
+import random
+import re
+import threading
+import time
+import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, FrozenSet, List, Optional, TypeVar
+
+import urllib3
+
+from .env_var import (
+    BIZYAIR_HEDGE_MIN_SAMPLES,
+    BIZYAIR_HEDGE_QUANTILE,
+    BIZYAIR_HTTP_RETRIES,
+    BIZYAIR_HTTP_RETRY_BACKOFF,
+    BIZYAIR_HTTP_RETRY_MAX_BACKOFF,
+)
+from .transport import HTTPStatusError
+
+__all__ = [
+    "RetryPolicy",
+    "retry_policy",
+    "LatencyHistogram",
+    "latency_histograms",
+    "observe_latency",
+    "hedge_delay",
+    "hedged_call",
+    "latency_stats",
+]
+
+T = TypeVar("T")
+
+# Methods that can be replayed without an idempotency key
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: attempt n sleeps a random time in
+    [0, min(max_backoff, backoff * 2**n)]. Only gateway errors, throttling and
+    connection failures or timeouts are retried.
+    """
+
+    retries: int = BIZYAIR_HTTP_RETRIES
+    backoff: float = BIZYAIR_HTTP_RETRY_BACKOFF / 1000
+    max_backoff: float = BIZYAIR_HTTP_RETRY_MAX_BACKOFF / 1000
+    statuses: FrozenSet[int] = frozenset({408, 429, 500, 502, 503, 504})
+    retried: int = 0
+
+    def is_retryable(self, e: Exception) -> bool:
+        if isinstance(e, HTTPStatusError):
+            return e.status in self.statuses
+        if isinstance(e, urllib3.exceptions.MaxRetryError):
+            # Connection refused/reset or a read timeout, not a TLS failure
+            return not isinstance(e.reason, urllib3.exceptions.SSLError)
+        return isinstance(
+            e, (urllib3.exceptions.TimeoutError, urllib3.exceptions.ProtocolError)
+        )
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def call(self, fn: Callable[[], T]) -> T:
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except urllib3.exceptions.HTTPError as e:
+                if attempt >= self.retries or not self.is_retryable(e):
+                    raise
+                delay = self.delay(attempt)
+                print(
+                    f"\033[31m[BizyAir]\033[0m Request failed ({e}), "
+                    f"retrying in {delay:.2f}s"
+                )
+                time.sleep(delay)
+                attempt += 1
+                self.retried += 1
+
+
+retry_policy = RetryPolicy()
+
+
+class LatencyHistogram:
+    """Request latencies in log-spaced buckets from 1 ms to ~2 min."""
+
+    bounds: List[float] = [0.001 * 2 ** (i / 2) for i in range(35)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile, None if empty."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    break
+        return self.bounds[min(index, len(self.bounds) - 1)]
+
+
+# "METHOD host/route" -> histogram of successful requests
+latency_histograms: Dict[str, LatencyHistogram] = {}
+_histograms_lock = threading.Lock()
+# Endpoints past this many are not tracked
+MAX_ENDPOINTS = 256
+
+# Routes whose path carries an id, with the template they are tracked under
+_ROUTE_TEMPLATES = [
+    (re.compile(r"/jobs/[^/]+"), "/jobs/{id}"),
+    (re.compile(r"^/[^/]+/models/files$"), "/{share_id}/models/files"),
+]
+# Path segments that look like an id anywhere else: numbers, hex digests, UUIDs
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F]{16,}|[0-9a-fA-F-]{36})$")
+
+
+def endpoint_of(method: str, url: str) -> str:
+    parts = urllib.parse.urlsplit(url)
+    path = "/".join(
+        "{id}" if _ID_SEGMENT.match(segment) else segment
+        for segment in parts.path.split("/")
+    )
+    for pattern, template in _ROUTE_TEMPLATES:
+        path = pattern.sub(template, path)
+    return f"{method} {parts.netloc}{path}"
+
+
+def observe_latency(method: str, url: str, seconds: float):
+    endpoint = endpoint_of(method, url)
+    histogram = latency_histograms.get(endpoint)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = latency_histograms.get(endpoint)
+            if histogram is None:
+                if len(latency_histograms) >= MAX_ENDPOINTS:
+                    return
+                histogram = latency_histograms[endpoint] = LatencyHistogram()
+    histogram.observe(seconds)
+
+
+def hedge_delay(method: str, url: str) -> Optional[float]:
+    """
+    How long to wait before sending a duplicate request: the BIZYAIR_HEDGE_QUANTILE
+    latency of the endpoint, or None until enough requests were observed.
+    """
+    histogram = latency_histograms.get(endpoint_of(method, url))
+    if histogram is None or histogram.count < BIZYAIR_HEDGE_MIN_SAMPLES:
+        return None
+    return histogram.quantile(BIZYAIR_HEDGE_QUANTILE)
+
+
+@dataclass
+class _HedgeStats:
+    calls: int = 0
+    hedged: int = 0
+    hedge_won: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+hedge_stats = _HedgeStats()
+_hedge_executor: ThreadPoolExecutor = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(
+                max_workers=8, thread_name_prefix="bizyair-hedge"
+            )
+    return _hedge_executor
+
+
+def hedged_call(fn: Callable[[], T], delay: Optional[float]) -> T:
+    """
+    Runs `fn`, and a second copy of it if the first has not finished after
+    `delay` seconds. Returns whichever succeeds first. Only for idempotent calls.
+    """
+    with hedge_stats._lock:
+        hedge_stats.calls += 1
+    if delay is None:
+        return fn()
+    executor = _get_hedge_executor()
+    first = executor.submit(fn)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+    second = executor.submit(fn)
+    with hedge_stats._lock:
+        hedge_stats.hedged += 1
+    pending = {first, second}
+    while True:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        succeeded = [future for future in done if future.exception() is None]
+        if succeeded:
+            if second in succeeded and first not in succeeded:
+                with hedge_stats._lock:
+                    hedge_stats.hedge_won += 1
+            return succeeded[0].result()
+        if not pending:
+            # Both failed, raise the error of the original request
+            return first.result()
+
+
+def latency_stats() -> dict:
+    return {
+        "retried": retry_policy.retried,
+        "hedge": {
+            "calls": hedge_stats.calls,
+            "hedged": hedge_stats.hedged,
+            "hedge_won": hedge_stats.hedge_won,
+        },
+        "endpoints": {
+            endpoint: {
+                "count": histogram.count,
+                "mean": histogram.total / histogram.count if histogram.count else None,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "p99": histogram.quantile(0.99),
+            }
+            for endpoint, histogram in list(latency_histograms.items())
+        },
+    }
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import urllib.parse
+import urllib.request
+import warnings
+from typing import Dict, Tuple
+
+import aiohttp
+import urllib3
+
+from .env_var import (
+    BIZYAIR_HTTP2,
+    BIZYAIR_HTTP_KEEPALIVE_TIMEOUT,
+    BIZYAIR_HTTP_POOL_HOSTS,
+    BIZYAIR_HTTP_POOL_MAXSIZE,
+)
+from .governor import governor
+
+__all__ = [
+    "HTTPStatusError",
+    "http_request",
+    "get_aiohttp_session",
+    "close_sessions",
+]
+
+# Only reconnect when the request never reached the server, never replay a body.
+_RETRIES = urllib3.Retry(total=None, connect=1, read=0, redirect=5, other=0)
+
+_lock = threading.Lock()
+_pool_managers: dict = {}
+_proxies: dict = None
+# id(loop) -> (loop, session). A session is bound to the loop it was created on
+# and keeps that loop alive, so entries of closed loops are dropped explicitly
+_aiohttp_sessions: Dict[
+    int, Tuple[asyncio.AbstractEventLoop, aiohttp.ClientSession]
+] = {}
+
+if BIZYAIR_HTTP2:
+    try:
+        import urllib3.http2
+
+        urllib3.http2.inject_into_urllib3()
+    except ImportError as e:
+        warnings.warn(f"HTTP/2 is not available, falling back to HTTP/1.1: {e}")
+
+
+class HTTPStatusError(urllib3.exceptions.HTTPError):
+    def __init__(self, status: int, reason: str, url: str):
+        super().__init__(f"HTTP Error {status}: {reason} ({url})")
+        self.status = status
+        self.reason = reason
+        self.url = url
+
+
+def _get_pool_manager(url: str) -> urllib3.PoolManager:
+    """One bounded keep-alive pool per (proxy, host), shared by the whole process."""
+    global _proxies
+    with _lock:
+        if _proxies is None:
+            _proxies = urllib.request.getproxies()
+        parts = urllib.parse.urlsplit(url)
+        proxy = _proxies.get(parts.scheme)
+        if proxy and urllib.request.proxy_bypass_environment(
+            parts.hostname or "", _proxies
+        ):
+            proxy = None
+        manager = _pool_managers.get(proxy)
+        if manager is None:
+            pool_kwargs = dict(
+                num_pools=BIZYAIR_HTTP_POOL_HOSTS,
+                maxsize=BIZYAIR_HTTP_POOL_MAXSIZE,
+                block=True,
+                retries=_RETRIES,
+            )
+            manager = (
+                urllib3.ProxyManager(proxy, **pool_kwargs)
+                if proxy
+                else urllib3.PoolManager(**pool_kwargs)
+            )
+            _pool_managers[proxy] = manager
+    return manager
+
+
+def _release_with_response(response: urllib3.BaseHTTPResponse, lease_id: str):
+    release_conn = response.release_conn
+
+    def release():
+        governor.release(lease_id)
+        release_conn()
+
+    response.release_conn = release
+
+
+def http_request(
+    method: str,
+    url: str,
+    *,
+    data: bytes = None,
+    headers: dict = None,
+    params: dict = None,
+    timeout: float = None,
+    raise_for_status: bool = True,
+    preload_content: bool = True,
+) -> urllib3.BaseHTTPResponse:
+    if params:
+        url = f"{url}{'&' if '?' in url else '?'}{urllib.parse.urlencode(params)}"
+    lease_id = governor.acquire()
+    try:
+        response = _get_pool_manager(url).request(
+            method,
+            url,
+            body=data,
+            headers=headers,
+            timeout=urllib3.Timeout(total=timeout) if timeout else None,
+            preload_content=preload_content,
+        )
+    except BaseException:
+        governor.release(lease_id)
+        raise
+    if preload_content:
+        governor.release(lease_id)
+    else:
+        # A streamed body is still being sent, the slot is held until the
+        # response goes back to the pool
+        _release_with_response(response, lease_id)
+    governor.observe(response.status, response.headers.get("Retry-After"))
+    if raise_for_status and response.status >= 400:
+        if not preload_content:
+            response.drain_conn()
+            response.release_conn()
+        raise HTTPStatusError(response.status, response.reason, url)
+    return response
+
+
+def get_aiohttp_session() -> aiohttp.ClientSession:
+    """
+    Keep-alive aiohttp session shared by every coroutine of the running loop.
+    A loop that is done with it should await close_sessions() before closing.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        for key in [
+            key for key, (other, _) in _aiohttp_sessions.items() if other.is_closed()
+        ]:
+            # Its loop closed without close_sessions(), it can no longer be
+            # closed there, the connections go with the session
+            del _aiohttp_sessions[key]
+        _, session = _aiohttp_sessions.get(id(loop), (None, None))
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=BIZYAIR_HTTP_POOL_HOSTS * BIZYAIR_HTTP_POOL_MAXSIZE,
+                limit_per_host=BIZYAIR_HTTP_POOL_MAXSIZE,
+                keepalive_timeout=BIZYAIR_HTTP_KEEPALIVE_TIMEOUT,
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            _aiohttp_sessions[id(loop)] = (loop, session)
+    return session
+
+
+async def close_sessions():
+    """Closes the pooled connections, and the aiohttp session of the running loop."""
+    with _lock:
+        for manager in _pool_managers.values():
+            manager.clear()
+        _pool_managers.clear()
+        _, session = _aiohttp_sessions.pop(id(asyncio.get_running_loop()), (None, None))
+    if session is not None and not session.closed:
+        await session.close()
@@ -1,7 +1,9 @@
 import os
+import re
 from collections import defaultdict
-from dataclasses import dataclass
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
 from bizyair.common.utils import load_config_file, recursive_extract_models
 
@@ -17,11 +19,90 @@ class ModelRule:
     inputs: dict
 
 
+# Anchored patterns without these are plain file names, "." aside
+_REGEX_METACHARACTERS = re.compile(r"[\\^$*+?{}\[\]|()]")
+
+
+@dataclass
+class InputMatcher:
+    """
+    The patterns of one rule input, split by how they can be matched: anchored
+    literals by set lookup, the rest by pre-compiled regexes. `re.search`
+    semantics are kept, including "." as a wildcard and "$" before a final
+    newline, which only ever needs a regex for values of the literal's length.
+    """
+
+    literals: FrozenSet[str] = frozenset()
+    # (literal length, pattern) for literals that contain "."
+    wildcard_literals: Tuple[Tuple[int, re.Pattern], ...] = ()
+    regexes: Tuple[re.Pattern, ...] = ()
+
+    @classmethod
+    def compile(cls, patterns: List[str]) -> "InputMatcher":
+        literals, wildcard_literals, regexes = set(), [], []
+        for pattern in patterns:
+            body = pattern[1:-1]
+            is_literal = (
+                pattern.startswith("^")
+                and pattern.endswith("$")
+                and not _REGEX_METACHARACTERS.search(body)
+            )
+            if not is_literal:
+                regexes.append(re.compile(pattern))
+                continue
+            literals.add(body)
+            if "." in body:
+                wildcard_literals.append((len(body), re.compile(pattern)))
+        return cls(frozenset(literals), tuple(wildcard_literals), tuple(regexes))
+
+    def match(self, value) -> bool:
+        if not isinstance(value, str):
+            return False
+        if value in self.literals or (
+            value.endswith("\n") and value[:-1] in self.literals
+        ):
+            return True
+        for length, regex in self.wildcard_literals:
+            if len(value) - length in (0, 1) and regex.search(value):
+                return True
+        return any(regex.search(value) for regex in self.regexes)
+
+
+@dataclass
+class CompiledRule:
+    rule: ModelRule
+    matchers: Dict[str, InputMatcher] = field(default_factory=dict)
+
+    def match(self, inputs: dict) -> bool:
+        return all(
+            matcher.match(inputs.get(key)) for key, matcher in self.matchers.items()
+        )
+
+
 class ModelRuleManager:
     def __init__(self, model_rules: list[dict]):
         self.model_rules = model_rules
         self.validate()
         self.gen_model_rule_index_mapping()
+        self.compile_rules()
+
+    def compile_rules(self):
+        """Build every ModelRule and its matchers once, grouped by class_type."""
+        self.compiled_rules: Dict[str, List[CompiledRule]] = defaultdict(list)
+        # The inputs each class_type is routed on, in a stable order
+        self.routing_keys: Dict[str, Tuple[str, ...]] = {}
+        for class_type, rule_indexes in self.model_rule_index_mapping.items():
+            keys = {}
+            for idx_1, idx_2 in rule_indexes:
+                rule = self._build_rule(class_type, idx_1, idx_2)
+                matchers = {
+                    key: InputMatcher.compile(patterns)
+                    for key, patterns in rule.inputs.items()
+                }
+                self.compiled_rules[class_type].append(CompiledRule(rule, matchers))
+                keys.update(dict.fromkeys(matchers))
+            self.routing_keys[class_type] = tuple(keys)
+        self._match_signature = lru_cache(maxsize=4096)(self._match_signature)
 
     def gen_model_rule_index_mapping(self):
         self.model_rule_index_mapping = defaultdict(list)
@@ -47,19 +128,42 @@ class ModelRuleManager:
     def find_rule_indexes(self, class_type: str) -> List[Tuple[int, int]]:
         return self.model_rule_index_mapping[class_type]
 
+    def _build_rule(self, class_type: str, idx_1: int, idx_2: int) -> ModelRule:
+        return ModelRule(
+            mode_type=self.model_rules[idx_1]["mode_type"],
+            base_model=self.model_rules[idx_1]["base_model"],
+            describe=self.model_rules[idx_1]["describe"],
+            score=self.model_rules[idx_1]["score"],
+            route=self.model_rules[idx_1]["route"],
+            class_type=class_type,
+            inputs=self.model_rules[idx_1]["nodes"][idx_2]["inputs"],
+        )
+
     def find_rules(self, class_type: str) -> List[ModelRule]:
-        rule_indexes = self.find_rule_indexes(class_type)
+        return [compiled.rule for compiled in self.compiled_rules.get(class_type, [])]
+
+    def match_rules(self, class_type: str, inputs: dict) -> List[ModelRule]:
+        """The rules of `class_type` whose input patterns all match `inputs`."""
+        keys = self.routing_keys.get(class_type)
+        if not keys:
+            return []
+        signature = tuple(inputs.get(key) for key in keys)
+        try:
+            return list(self._match_signature(class_type, signature))
+        except TypeError:  # unhashable input, e.g. a link
+            return self._match(class_type, inputs)
+
+    def _match_signature(
+        self, class_type: str, signature: Tuple[Optional[str], ...]
+    ) -> Tuple[ModelRule, ...]:
+        inputs = dict(zip(self.routing_keys[class_type], signature))
+        return tuple(self._match(class_type, inputs))
+
+    def _match(self, class_type: str, inputs: dict) -> List[ModelRule]:
         return [
-            ModelRule(
-                mode_type=self.model_rules[idx_1]["mode_type"],
-                base_model=self.model_rules[idx_1]["base_model"],
-                describe=self.model_rules[idx_1]["describe"],
-                score=self.model_rules[idx_1]["score"],
-                route=self.model_rules[idx_1]["route"],
-                class_type=class_type,
-                inputs=self.model_rules[idx_1]["nodes"][idx_2]["inputs"],
-            )
-            for idx_1, idx_2 in rule_indexes
+            compiled.rule
+            for compiled in self.compiled_rules[class_type]
+            if compiled.match(inputs)
         ]
 
 
@@ -89,6 +193,11 @@ class ConfigManager:
             class_type = class_type[8:]
         return self.model_rules.find_rules(class_type)
 
+    def match_rules(self, class_type: str, inputs: dict) -> List[ModelRule]:
+        if class_type.startswith("BizyAir_"):
+            class_type = class_type[8:]
+        return self.model_rules.match_rules(class_type, inputs)
+
 
 model_path_config = os.path.join(os.path.dirname(__file__), "models.json")
 model_rule_config = os.path.join(os.path.dirname(__file__), "models.yaml")
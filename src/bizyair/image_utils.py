@@ -3,8 +3,11 @@ import io
 import json
 import os
 import pickle
+import struct
+import threading
 import zlib
-from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum, IntEnum
 from functools import singledispatch
 from typing import Any, List, Union
 
@@ -12,17 +15,75 @@ import numpy as np
 import torch
 from PIL import Image
 
-from .common.env_var import BIZYAIR_DEBUG
+from .common.content_cache import blob_references, content_digest, payload_cache
+from .common.env_var import (
+    BIZYAIR_DEBUG,
+    BIZYAIR_IMAGE_CODEC_WORKERS,
+    BIZYAIR_TENSOR_CODEC,
+)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
 
 # Marker to identify base64-encoded tensors
 TENSOR_MARKER = "TENSOR:"
+# Marker to identify base64-encoded binary tensor frames, see `tensor_to_frame`
+BINARY_TENSOR_MARKER = "BTENSOR:"
 IMAGE_MARKER = "IMAGE:"
+# Marker to identify payloads sent out of band as separate request parts
+BLOB_MARKER = "BLOB:"
+# Marker to identify blobs of an earlier request, referenced by content hash
+BLOB_REFERENCE_MARKER = "BLOBREF:"
+
+# Longest side of streamed step previews, ComfyUI's default --preview-size
+PREVIEW_MAX_SIZE = 512
+
+TENSOR_FRAME_MAGIC = b"BZT"
+TENSOR_FRAME_VERSION = 1
+# magic, version, codec, ndim, len(dtype.str), uncompressed body size
+_TENSOR_FRAME_HEADER = struct.Struct("<3sBBBBQ")
+
+_image_codec_executor: ThreadPoolExecutor = None
+_image_codec_executor_lock = threading.Lock()
 
 
 class TaskStatus(Enum):
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
+    FAILED = "failed"
+
+    @property
+    def is_final(self) -> bool:
+        return self in (TaskStatus.COMPLETED, TaskStatus.FAILED)
+
+    def can_transition_to(self, status: "TaskStatus") -> bool:
+        return status == self or status in _TASK_STATUS_TRANSITIONS[self]
+
+
+_TASK_STATUS_TRANSITIONS = {
+    TaskStatus.PENDING: {
+        TaskStatus.PROCESSING,
+        TaskStatus.COMPLETED,
+        TaskStatus.FAILED,
+    },
+    TaskStatus.PROCESSING: {TaskStatus.COMPLETED, TaskStatus.FAILED},
+    TaskStatus.COMPLETED: set(),
+    TaskStatus.FAILED: set(),
+}
+
+
+class TensorCodec(IntEnum):
+    RAW = 0
+    ZLIB = 1
+    LZ4 = 2
+    ZSTD = 3
 
 
 def convert_image_to_rgb(image: Image.Image) -> Image.Image:
@@ -65,6 +126,16 @@ def decode_base64_to_image(img_data: str) -> Image.Image:
         return img
 
 
+def decode_preview(img_data: str) -> tuple:
+    """
+    Decodes the base64 preview of a progress event into the
+    (format, image, max_size) tuple expected by ComfyUI's ProgressBar.
+    """
+    image = Image.open(io.BytesIO(base64.b64decode(img_data)))
+    image.load()
+    return ("JPEG", convert_image_to_rgb(image), PREVIEW_MAX_SIZE)
+
+
 def format_bytes(num_bytes: int) -> str:
     """
     Converts a number of bytes to a human-readable string with units (B, KB, or MB).
@@ -80,10 +151,40 @@ def format_bytes(num_bytes: int) -> str:
         return f"{num_bytes / (1024 * 1024):.2f} MB"
 
 
+def comfy_image_to_uint8(images: torch.Tensor) -> np.ndarray:
+    """
+    Convert a float IMAGE tensor in [0, 1] to uint8, for a single image or a whole
+    batch at once. Matches `np.clip(255.0 * x, 0, 255).astype(np.uint8)`.
+
+    On CPU one float buffer the size of a single image is reused for the whole
+    batch, instead of multiply/clip/astype temporaries for every image. Other
+    devices convert there and only transfer uint8, a quarter of the float32 size.
+    """
+    images = images.detach()
+    if images.device.type != "cpu":
+        images = images.mul(255.0).clamp_(0, 255)
+        return images.to(torch.uint8).cpu().numpy()
+
+    images = images.float().numpy()
+    batch = images.reshape(-1, *images.shape[-3:]) if images.ndim > 3 else images[None]
+    output = np.empty(batch.shape, dtype=np.uint8)
+    buffer = np.empty(batch.shape[1:], dtype=np.float32)
+    for image, out in zip(batch, output):
+        np.multiply(image, np.float32(255.0), out=buffer)
+        np.clip(buffer, 0, 255, out=buffer)
+        np.copyto(out, buffer, casting="unsafe")
+    return output.reshape(images.shape)
+
+
+def uint8_to_comfy_image(image: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Convert uint8 pixels to float32 in [0, 1] in a single pass, into `out` if given."""
+    if out is None:
+        out = np.empty(image.shape, dtype=np.float32)
+    return np.divide(image, np.float32(255.0), out=out)
+
+
 def _legacy_encode_comfy_image(image: torch.Tensor, image_format="png") -> str:
-    input_image = image.cpu().detach().numpy()
-    i = 255.0 * input_image[0]
-    input_image = np.clip(i, 0, 255).astype(np.uint8)
+    input_image = comfy_image_to_uint8(image[0])
     base64ed_image = encode_image_to_base64(
         Image.fromarray(input_image), format=image_format
     )
@@ -100,11 +201,26 @@ def _legacy_decode_comfy_image(
         return combined_imgs
 
     out = decode_base64_to_np(img_data, format=image_format)
-    out = np.array(out).astype(np.float32) / 255.0
-    output = torch.from_numpy(out)[None,]
+    output = torch.from_numpy(uint8_to_comfy_image(out))[None,]
     return output
 
 
+def _map_batch(fn, items: list) -> list:
+    """Run `fn` over a batch on the image codec thread pool, PIL releases the GIL
+    while encoding and decoding."""
+    global _image_codec_executor
+    if BIZYAIR_IMAGE_CODEC_WORKERS <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    if _image_codec_executor is None:
+        with _image_codec_executor_lock:
+            if _image_codec_executor is None:
+                _image_codec_executor = ThreadPoolExecutor(
+                    max_workers=BIZYAIR_IMAGE_CODEC_WORKERS,
+                    thread_name_prefix="bizyair_image_codec",
+                )
+    return list(_image_codec_executor.map(fn, items))
+
+
 def _new_encode_comfy_image(images: torch.Tensor, image_format="WEBP", **kwargs) -> str:
     """https://docs.comfy.org/essentials/custom_node_snippets#save-an-image-batch
     Encode a batch of images to base64 strings.
@@ -116,13 +232,12 @@ def _new_encode_comfy_image(images: torch.Tensor, image_format="WEBP", **kwargs)
     Returns:
         str: A JSON string containing the base64-encoded images.
     """
-    results = {}
-    for batch_number, image in enumerate(images):
-        i = 255.0 * image.cpu().numpy()
-        img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-        base64ed_image = encode_image_to_base64(img, format=image_format, **kwargs)
-        results[batch_number] = base64ed_image
 
+    def encode(image: np.ndarray) -> str:
+        img = Image.fromarray(image)
+        return encode_image_to_base64(img, format=image_format, **kwargs)
+
+    results = dict(enumerate(_map_batch(encode, list(comfy_image_to_uint8(images)))))
     return json.dumps(results)
 
 
@@ -137,15 +252,26 @@ def _new_decode_comfy_image(img_datas: str, image_format="WEBP") -> torch.tensor
     Returns:
         torch.Tensor: A tensor containing the decoded images.
     """
-    img_datas = json.loads(img_datas)
+    img_datas = list(json.loads(img_datas).values())
 
-    decoded_imgs = []
-    for img_data in img_datas.values():
-        decoded_image = decode_base64_to_np(img_data, format=image_format)
-        decoded_image = np.array(decoded_image).astype(np.float32) / 255.0
-        decoded_imgs.append(torch.from_numpy(decoded_image)[None,])
+    # The first image gives the batch geometry, the rest is decoded in place
+    first = decode_base64_to_np(img_datas[0], format=image_format)
+    output = torch.empty((len(img_datas), *first.shape), dtype=torch.float32)
+    output_np = output.numpy()
 
-    return torch.cat(decoded_imgs, dim=0)
+    def decode(index: int):
+        decoded_image = (
+            first if index == 0 else decode_base64_to_np(img_datas[index], image_format)
+        )
+        if decoded_image.shape != first.shape:
+            raise ValueError(
+                f"Images in a batch must share one shape, got {decoded_image.shape} "
+                f"and {first.shape}"
+            )
+        uint8_to_comfy_image(decoded_image, out=output_np[index])
+
+    _map_batch(decode, list(range(len(img_datas))))
+    return output
 
 
 def encode_comfy_image(
@@ -177,6 +303,8 @@ def tensor_to_base64(tensor: torch.Tensor, compress=True) -> str:
 
 def base64_to_tensor(tensor_b64: str, compress=True) -> torch.Tensor:
     tensor_bytes = base64.b64decode(tensor_b64)
+    if tensor_bytes.startswith(TENSOR_FRAME_MAGIC):
+        return frame_to_tensor(tensor_bytes)
 
     if compress:
         tensor_bytes = zlib.decompress(tensor_bytes)
@@ -187,6 +315,99 @@ def base64_to_tensor(tensor_b64: str, compress=True) -> torch.Tensor:
     return tensor
 
 
+def _get_tensor_codec(codec: Union[str, int]) -> TensorCodec:
+    try:
+        codec = TensorCodec[codec.upper()] if isinstance(codec, str) else codec
+        codec = TensorCodec(codec)
+    except (KeyError, ValueError):
+        raise ValueError(
+            f"Unsupported tensor codec: {codec}, "
+            f"expected one of {[c.name.lower() for c in TensorCodec]}"
+        ) from None
+    if codec == TensorCodec.LZ4 and lz4 is None:
+        raise ImportError("The lz4 tensor codec requires 'pip install lz4'")
+    if codec == TensorCodec.ZSTD and zstandard is None:
+        raise ImportError("The zstd tensor codec requires 'pip install zstandard'")
+    return codec
+
+
+def tensor_to_frame(tensor: torch.Tensor, codec: Union[str, int] = "raw") -> bytes:
+    """
+    Serialize a tensor into a versioned binary frame: a fixed header, the numpy
+    dtype string, the shape and the (optionally compressed) C-ordered body.
+    Unlike `tensor_to_base64` there is no pickle step.
+    """
+    codec = _get_tensor_codec(codec)
+    tensor_np = tensor.detach().cpu().contiguous().numpy()
+    body = tensor_np.reshape(-1).view(np.uint8)
+    if codec == TensorCodec.ZLIB:
+        body = zlib.compress(body)
+    elif codec == TensorCodec.LZ4:
+        body = lz4.frame.compress(body)
+    elif codec == TensorCodec.ZSTD:
+        body = zstandard.ZstdCompressor().compress(body)
+
+    dtype = tensor_np.dtype.str.encode("ascii")
+    header = _TENSOR_FRAME_HEADER.pack(
+        TENSOR_FRAME_MAGIC,
+        TENSOR_FRAME_VERSION,
+        codec,
+        tensor_np.ndim,
+        len(dtype),
+        tensor_np.nbytes,
+    )
+    shape = struct.pack(f"<{tensor_np.ndim}q", *tensor_np.shape)
+    return b"".join((header, dtype, shape, body))
+
+
+def frame_to_tensor(frame: bytes) -> torch.Tensor:
+    """
+    Inverse of `tensor_to_frame`. The body is decompressed into a single writable
+    buffer which is wrapped by `np.frombuffer` without further copies.
+    """
+    frame = memoryview(frame)
+    magic, version, codec, ndim, dtype_len, nbytes = _TENSOR_FRAME_HEADER.unpack_from(
+        frame
+    )
+    if magic != TENSOR_FRAME_MAGIC:
+        raise ValueError("Not a BizyAir tensor frame")
+    if version > TENSOR_FRAME_VERSION:
+        raise ValueError(f"Unsupported tensor frame version: {version}")
+    codec = _get_tensor_codec(codec)
+
+    offset = _TENSOR_FRAME_HEADER.size
+    dtype = np.dtype(bytes(frame[offset : offset + dtype_len]).decode("ascii"))
+    offset += dtype_len
+    shape = struct.unpack_from(f"<{ndim}q", frame, offset)
+    offset += 8 * ndim
+    body = frame[offset:]
+
+    if codec == TensorCodec.RAW:
+        buffer = bytearray(body)
+    elif codec == TensorCodec.ZLIB:
+        buffer = bytearray(zlib.decompress(body, bufsize=max(nbytes, 1)))
+    elif codec == TensorCodec.LZ4:
+        buffer = lz4.frame.decompress(body, return_bytearray=True)
+    else:
+        buffer = bytearray(nbytes)
+        with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+            view, filled = memoryview(buffer), 0
+            while filled < nbytes and (n := reader.readinto(view[filled:])):
+                filled += n
+    if len(buffer) != nbytes:
+        raise ValueError(f"Corrupted tensor frame: {len(buffer)=} != {nbytes=}")
+
+    tensor_np = np.frombuffer(buffer, dtype=dtype).reshape(shape)
+    return torch.from_numpy(tensor_np)
+
+
+def encode_tensor(tensor: torch.Tensor, codec: str = BIZYAIR_TENSOR_CODEC) -> str:
+    if codec == "pickle":
+        return TENSOR_MARKER + tensor_to_base64(tensor)
+    frame = tensor_to_frame(tensor, codec=codec)
+    return BINARY_TENSOR_MARKER + base64.b64encode(frame).decode("utf-8")
+
+
 @singledispatch
 def decode_data(input, old_version=False):
     raise NotImplementedError(f"Unsupported type: {type(input)}")
@@ -215,6 +436,9 @@ def _(input: str, **kwargs):
     if input.startswith(TENSOR_MARKER):
         tensor_b64 = input[len(TENSOR_MARKER) :]
         return base64_to_tensor(tensor_b64)
+    elif input.startswith(BINARY_TENSOR_MARKER):
+        frame = base64.b64decode(input[len(BINARY_TENSOR_MARKER) :])
+        return frame_to_tensor(frame)
     elif input.startswith(IMAGE_MARKER):
         tensor_b64 = input[len(IMAGE_MARKER) :]
         old_version = kwargs.get("old_version", False)
@@ -266,13 +490,47 @@ def is_image_tensor(tensor) -> bool:
 
 @encode_data.register(torch.Tensor)
 def _(output, **kwargs):
-    if is_image_tensor(output) and not kwargs.get("disable_image_marker", False):
-        old_version = kwargs.get("old_version", False)
-        lossless = kwargs.get("lossless", False)
-        return IMAGE_MARKER + encode_comfy_image(
-            output, image_format="WEBP", old_version=old_version, lossless=lossless
+    blobs = kwargs.get("blobs", None)
+    blob_refs = kwargs.get("blob_refs", None)
+    codec = kwargs.get("tensor_codec", BIZYAIR_TENSOR_CODEC)
+    old_version = kwargs.get("old_version", False)
+    lossless = kwargs.get("lossless", False)
+    as_image = is_image_tensor(output) and not kwargs.get("disable_image_marker", False)
+    if not as_image and blobs is not None:
+        # Out-of-band parts are binary, so there is no base64 to pay for
+        codec = "raw" if codec == "pickle" else codec
+    if as_image:
+        variant = (
+            "webp" + ("-lossless" if lossless else "") + ("-v0" if old_version else "")
         )
-    return TENSOR_MARKER + tensor_to_base64(output)
+    else:
+        variant = f"{'frame' if blobs is not None else 'tensor'}-{codec}"
+
+    key = None
+    # Blobs are always named by content, which also dedups them within a prompt
+    if payload_cache.enabled or blobs is not None:
+        key = f"{content_digest(output)}-{variant}"
+    if blob_refs is not None and blob_references.reference(key):
+        blob_refs.add(key)
+        return BLOB_REFERENCE_MARKER + key
+
+    encoded = payload_cache.get(key) if payload_cache.enabled else None
+    if encoded is None:
+        if as_image:
+            encoded = IMAGE_MARKER + encode_comfy_image(
+                output, image_format="WEBP", old_version=old_version, lossless=lossless
+            )
+        elif blobs is None:
+            encoded = encode_tensor(output, codec=codec)
+        else:
+            encoded = tensor_to_frame(output, codec=codec)
+        if payload_cache.enabled:
+            payload_cache.put(key, encoded)
+    if blobs is None:
+        return encoded
+    # Hand the payload to the caller and only leave a reference in the prompt
+    blobs[key] = encoded
+    return BLOB_MARKER + key
 
 
 @encode_data.register(int)
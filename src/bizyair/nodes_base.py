@@ -1,9 +1,17 @@
+import asyncio
 import importlib
 import logging
+import threading
 import warnings
-from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
 from typing import List
 
+from .common.env_var import (
+    BIZYAIR_CONCURRENT_EXECUTION,
+    BIZYAIR_MAX_CONCURRENT_REQUESTS,
+)
+from .common.result_cache import uncacheable_class_types
 from .data_types import is_send_request_datatype
 from .nodes_io import BizyAirNodeIO, create_node_data
 
@@ -16,6 +24,9 @@ except ModuleNotFoundError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_request_executor: ThreadPoolExecutor = None
+_request_executor_lock = threading.Lock()
+
 LOGO = "☁️"
 PREFIX = f"BizyAir"
 NODE_CLASS_MAPPINGS = {}
@@ -72,6 +83,45 @@ def ensure_unique_id(org_func, original_has_unique_id=False):
     return new_func
 
 
+def comfy_supports_async_nodes() -> bool:
+    # https://github.com/comfyanonymous/ComfyUI/pull/8830
+    try:
+        execution = importlib.import_module("execution")
+    except ModuleNotFoundError:
+        return False
+    return hasattr(execution, "_async_map_node_over_list")
+
+
+def _get_request_executor() -> ThreadPoolExecutor:
+    global _request_executor
+    if _request_executor is None:
+        with _request_executor_lock:
+            if _request_executor is None:
+                _request_executor = ThreadPoolExecutor(
+                    max_workers=BIZYAIR_MAX_CONCURRENT_REQUESTS,
+                    thread_name_prefix="bizyair_request",
+                )
+    return _request_executor
+
+
+def ensure_concurrent(org_func):
+    """
+    Turn a node function into a coroutine running it on a worker thread. ComfyUI
+    keeps executing other ready nodes while an async node is pending, so the
+    cloud requests of independent branches overlap instead of queueing.
+    """
+
+    @wraps(org_func)
+    async def new_func(self, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _get_request_executor(), partial(org_func, self, **kwargs)
+        )
+
+    new_func.sync_function = org_func
+    return new_func
+
+
 def ensure_hidden_unique_id(org_input_types_func):
     original_has_unique_id = False
 
@@ -101,6 +151,9 @@ class BizyAirBaseNode:
             cls.CATEGORY = f"{LOGO}{PREFIX}/{cls.CATEGORY}"
         register_node(cls, PREFIX)
         cls.setup_input_types()
+        # NOT_IDEMPOTENT is ComfyUI's flag for nodes that must always run again
+        if getattr(cls, "NOT_IDEMPOTENT", False):
+            uncacheable_class_types.add(cls._class_type_of())
 
     @classmethod
     def setup_input_types(cls):
@@ -109,11 +162,27 @@ class BizyAirBaseNode:
             cls.INPUT_TYPES
         )
         cls.INPUT_TYPES = new_input_types_func
-        setattr(
-            cls,
-            cls.FUNCTION,
-            ensure_unique_id(getattr(cls, cls.FUNCTION), original_has_unique_id),
-        )
+        func = getattr(cls, cls.FUNCTION)
+        # Subclasses inherit the already wrapped function of their parent
+        func = getattr(func, "sync_function", func)
+        func = ensure_unique_id(func, original_has_unique_id)
+        if cls._runs_concurrently():
+            func = ensure_concurrent(func)
+        setattr(cls, cls.FUNCTION, func)
+
+    @classmethod
+    def _runs_concurrently(cls) -> bool:
+        global BIZYAIR_CONCURRENT_EXECUTION
+        if not BIZYAIR_CONCURRENT_EXECUTION:
+            return False
+        if not comfy_supports_async_nodes():
+            warnings.warn(
+                "BIZYAIR_CONCURRENT_EXECUTION needs a ComfyUI version with async "
+                "nodes, running BizyAir nodes sequentially."
+            )
+            BIZYAIR_CONCURRENT_EXECUTION = False
+            return False
+        return any(is_send_request_datatype(t) for t in cls.RETURN_TYPES)
 
     @property
     def assigned_id(self):
@@ -136,12 +205,16 @@ class BizyAirBaseNode:
             if is_send_request_datatype(return_type)
         ]
 
-    def _determine_class_type(self):
-        class_type = getattr(self, "CLASS_TYPE_NAME", type(self).__name__)
+    @classmethod
+    def _class_type_of(cls):
+        class_type = getattr(cls, "CLASS_TYPE_NAME", cls.__name__)
         if class_type.startswith(f"{PREFIX}_"):
             class_type = class_type[len(PREFIX) + 1 :]
         return class_type
 
+    def _determine_class_type(self):
+        return self._class_type_of()
+
     def _process_non_send_request_types(self, class_type, kwargs):
         outs = []
         for slot_index, _ in enumerate(self.RETURN_TYPES):
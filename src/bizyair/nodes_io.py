@@ -1,7 +1,8 @@
 import warnings
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 from bizyair.commands import invoker
+from bizyair.common.env_var import BIZYAIR_MULTI_OUTPUT, BIZYAIR_STREAMING
 
 from .image_utils import encode_data
 
@@ -22,17 +23,64 @@ def create_node_data(class_type: str, inputs: dict, outputs: dict):
     return out
 
 
+class _Graph:
+    """
+    An immutable piece of a BizyAir graph: the nodes added at one step and links
+    to the graphs it was built from. Ancestors are shared instead of copied, the
+    full dict is only assembled by `flatten`.
+    """
+
+    __slots__ = ("own", "parents", "_flat")
+
+    def __init__(self, own: Dict[str, Dict[str, Any]], parents: Tuple["_Graph", ...]):
+        self.own = own
+        self.parents = parents
+        self._flat = None
+
+    def flatten(self) -> Dict[str, Dict[str, Any]]:
+        if self._flat is not None:
+            return self._flat
+        # Iterative post-order: ancestors first, later graphs override earlier ones
+        flat, visited = {}, set()
+        stack = [(self, False)]
+        while stack:
+            graph, expanded = stack.pop()
+            if expanded:
+                flat.update(graph.own)
+                continue
+            if id(graph) in visited:
+                continue
+            visited.add(id(graph))
+            stack.append((graph, True))
+            stack.extend((parent, False) for parent in reversed(graph.parents))
+        self._flat = flat
+        return flat
+
+    def shallow_contains(self, node_id: str) -> bool:
+        return node_id in self.own or any(node_id in p.own for p in self.parents)
+
+
 class BizyAirNodeIO:
     def __init__(
         self,
         node_id: int = "0",  # Unique identifier for the current node
-        nodes: Dict[str, Dict[str, any]] = {},
+        nodes: Dict[str, Dict[str, any]] = None,
         *args,
         **kwargs,
     ):
         self._validate_node_id(node_id=node_id)
         self.node_id = node_id
-        self.nodes = nodes
+        self._graph = _Graph(dict(nodes or {}), ())
+
+    @property
+    def nodes(self) -> Dict[str, Dict[str, Any]]:
+        """The whole graph, built once per state. Treat it as read-only."""
+        return self._graph.flatten()
+
+    def get_node(self, node_id: str) -> Dict[str, Any]:
+        if node_id in self._graph.own:
+            return self._graph.own[node_id]
+        return self.nodes[node_id]
 
     def _validate_node_id(self, node_id) -> bool:
         if node_id is None:
@@ -47,13 +95,14 @@ class BizyAirNodeIO:
 
     def copy(self, new_node_id: str = None):
         self._validate_node_id(new_node_id)
-        if new_node_id in self.nodes:
+        # Only the nearest nodes are checked, a full lookup would flatten the graph
+        if self._graph.shallow_contains(new_node_id):
             raise ValueError(f"Node ID '{new_node_id}' already exists.")
 
-        return BizyAirNodeIO(
-            nodes=self.nodes.copy(),
-            node_id=new_node_id,
-        )
+        new_io = BizyAirNodeIO.__new__(BizyAirNodeIO)
+        new_io.node_id = new_node_id
+        new_io._graph = _Graph({}, (self._graph,))
+        return new_io
 
     def add_node_data(
         self,
@@ -69,24 +118,38 @@ class BizyAirNodeIO:
 
         self.update_nodes_from_others(*inputs.values())
 
-        if self.node_id in self.nodes:
+        if self._graph.shallow_contains(self.node_id):
             warnings.warn(
                 f"Node ID {self.node_id} already exists. Data will be overwritten.",
                 RuntimeWarning,
             )
 
-        self.nodes[self.node_id] = node_data
+        self._graph = _Graph(
+            {**self._graph.own, self.node_id: node_data}, self._graph.parents
+        )
 
     def update_nodes_from_others(self, *others):
+        parents = ()
         for other in others:
-            if isinstance(other, BizyAirNodeIO):
-                self.nodes.update(other.nodes)
+            if not isinstance(other, BizyAirNodeIO):
+                continue
+            graph = other._graph
+            if graph is not self._graph and graph not in self._graph.parents + parents:
+                parents += (graph,)
+        if parents:
+            self._graph = _Graph(self._graph.own, self._graph.parents + parents)
 
     def send_request(
         self, url=None, headers=None, *, progress_callback=None, stream=False
     ) -> any:
+        if BIZYAIR_MULTI_OUTPUT:
+            return invoker.request_coalescer.submit(self.nodes, self.node_id)
+        if not (stream or BIZYAIR_STREAMING):
+            progress_callback = None
         out = invoker.prompt_server.execute(
-            prompt=self.nodes, last_node_ids=[self.node_id]
+            prompt=self.nodes,
+            last_node_ids=[self.node_id],
+            progress_callback=progress_callback,
         )
         return out
 
@@ -94,5 +157,5 @@ class BizyAirNodeIO:
 @encode_data.register(BizyAirNodeIO)
 def _(output: BizyAirNodeIO, **kwargs):
     origin_id = output.node_id
-    origin_slot = output.nodes[origin_id]["outputs"]["slot_index"]
+    origin_slot = output.get_node(origin_id)["outputs"]["slot_index"]
     return [origin_id, origin_slot]
@@ -5,5 +5,6 @@ from .path_manager import (
     get_filename_list,
     guess_config,
     guess_url_from_node,
+    prefetch_catalogs,
 )
 from .utils import filter_files_extensions
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import threading
+import warnings
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Optional
+
+from ..common.env_var import BIZYAIR_CATALOG_CACHE_DIR
+
+
+@dataclass
+class Catalog:
+    # label path -> real path
+    mapping: Dict[str, str]
+    etag: Optional[str] = None
+    fetched_at: float = 0.0
+
+
+class CatalogCache:
+    """
+    Model catalogs by key, kept in memory and as one JSON file per key under
+    `directory` so they survive a restart. `refresh` updates a catalog in the
+    background, with at most one refresh per key in flight.
+    """
+
+    def __init__(self, directory: Optional[str], max_workers: int = 4):
+        self.directory = directory
+        self._catalogs: Dict[str, Catalog] = {}
+        self._refreshing: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bizyair-catalog"
+        )
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, key: str) -> Optional[Catalog]:
+        with self._lock:
+            catalog = self._catalogs.get(key)
+        if catalog is not None or not self.directory:
+            return catalog
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            warnings.warn(f"Ignoring unreadable model catalog {self._path(key)}: {e}")
+            return None
+        if state.get("key") != key:
+            return None
+        catalog = Catalog(state["mapping"], state.get("etag"), state["fetched_at"])
+        with self._lock:
+            return self._catalogs.setdefault(key, catalog)
+
+    def put(self, key: str, catalog: Catalog):
+        with self._lock:
+            self._catalogs[key] = catalog
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"key": key, **asdict(catalog)}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            warnings.warn(f"Failed to write model catalog {path}: {e}")
+
+    def refreshing(self, key: str) -> Optional[Future]:
+        """The refresh of `key` in flight, if any."""
+        with self._lock:
+            future = self._refreshing.get(key)
+        return future if future is not None and not future.done() else None
+
+    def refresh(
+        self, key: str, fetch: Callable[[Optional[Catalog]], Optional[Catalog]]
+    ) -> Future:
+        """
+        Runs `fetch(current catalog or None)` in the background and stores the
+        catalog it returns. The future gives that catalog, or None when the
+        fetch failed, in which case the current one is kept.
+        """
+        with self._lock:
+            future = self._refreshing.get(key)
+            if future is not None and not future.done():
+                return future
+            future = self._executor.submit(self._refresh, key, fetch)
+            self._refreshing[key] = future
+            return future
+
+    def _refresh(self, key, fetch):
+        try:
+            catalog = fetch(self.get(key))
+        except Exception as e:
+            warnings.warn(f"Failed to refresh model catalog: {e}")
+            return None
+        if catalog is not None:
+            self.put(key, catalog)
+        return catalog
+
+
+catalog_cache = CatalogCache(BIZYAIR_CATALOG_CACHE_DIR)
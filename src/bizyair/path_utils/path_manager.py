@@ -1,17 +1,20 @@
 import copy
+import hashlib
 import json
 import os
 import pprint
-import re
+import time
 import warnings
 from collections import defaultdict
+from concurrent.futures import Future
 from dataclasses import dataclass
 from functools import lru_cache
 from typing import Any, Collection, Dict, List, Union
 
-from ..common import fetch_models_by_type
+from ..common import client, fetch_models_by_type
 from ..common.env_var import BIZYAIR_DEBUG, BIZYAIR_SERVER_ADDRESS
 from ..configs.conf import ModelRule, config_manager
+from .catalog_cache import Catalog, catalog_cache
 from .utils import filter_files_extensions, get_service_route, load_yaml_config
 
 supported_pt_extensions: set[str] = {
@@ -73,16 +76,7 @@ models_config: Dict[str, Dict[str, Any]] = load_yaml_config(
 def guess_url_from_node(
     node: Dict[str, Dict[str, Any]], class_type_table: Dict[str, bool]
 ) -> Union[List[ModelRule], None]:
-    rules: List[ModelRule] = config_manager.get_rules(node["class_type"])
-    out = [
-        rule
-        for rule in rules
-        if all(
-            any(re.search(p, node["inputs"][key]) is not None for p in patterns)
-            for key, patterns in rule.inputs.items()
-        )
-    ]
-    return out
+    return config_manager.match_rules(node["class_type"], node["inputs"])
 
 
 def guess_config(
@@ -109,38 +103,129 @@ def get_config_file_list(base_path=None) -> list:
     return config_files
 
 
+def _request_catalog(
+    url: str, model_type: str, current: Catalog = None, *, verbose=False
+):
+    """The catalog response at `url`, conditional on the ETag of `current`."""
+    response_headers = {}
+    msg = fetch_models_by_type(
+        url=url,
+        method="GET",
+        model_type=model_type,
+        etag=current.etag if current else None,
+        response_headers=response_headers,
+    )
+    if verbose:
+        pprint.pprint({"cached_filename_list": msg})
+    return msg, response_headers
+
+
+def _parse_catalog(
+    msg: dict, response_headers: dict, current: Catalog = None
+) -> Union[Catalog, None]:
+    if msg is None and current is not None:
+        # Not modified
+        return Catalog(current.mapping, current.etag, time.time())
+    if not msg or "data" not in msg or msg["data"] is None:
+        return None
+    mapping = {
+        x["label_path"]: x["real_path"] for x in msg["data"]["files"] if x["label_path"]
+    }
+    return Catalog(mapping, response_headers.get("ETag"), time.time())
+
+
+def _catalog_key(url: str, model_type: str) -> str:
+    # Catalogs differ between accounts
+    api_key = hashlib.sha256((client.BIZYAIR_API_KEY or "").encode("utf-8")).hexdigest()
+    return f"{url}|{model_type}|{api_key}"
+
+
+def refresh_catalog(folder_name: str, *, verbose=False) -> Future:
+    """
+    Fetches the catalog of `folder_name` in the background and uses it once it
+    arrives. The future gives the catalog, None if it could not be fetched.
+    """
+    url = get_service_route(models_config["model_hub"]["find_model"])
+    model_type = models_config["model_types"][folder_name]
+
+    def fetch(current):
+        msg, response_headers = _request_catalog(
+            url, model_type, current, verbose=verbose
+        )
+        catalog = _parse_catalog(msg, response_headers, current)
+        if catalog is not None:
+            filename_path_mapping[folder_name] = catalog.mapping
+            disable_refresh_options(folder_name)
+        return catalog
+
+    return catalog_cache.refresh(_catalog_key(url, model_type), fetch)
+
+
+def prefetch_catalogs(*, verbose=False) -> Dict[str, Future]:
+    """
+    Starts fetching the catalogs of all model types at once, so INPUT_TYPES
+    finds them ready instead of downloading them one after another at import.
+    """
+    if not client.BIZYAIR_API_KEY:
+        return {}
+    return {
+        folder_name: refresh_catalog(folder_name, verbose=verbose)
+        for folder_name in models_config["model_types"]
+    }
+
+
+def wait_for_catalog(folder_name: str, timeout: float = None):
+    """Waits for a catalog that is not known yet but is being fetched."""
+    if folder_name in filename_path_mapping:
+        return
+    url = get_service_route(models_config["model_hub"]["find_model"])
+    model_type = models_config["model_types"][folder_name]
+    future = catalog_cache.refreshing(_catalog_key(url, model_type))
+    if future is not None:
+        future.result(timeout=timeout)
+
+
 def cached_filename_list(
     folder_name: str, *, share_id: str = None, verbose=False, refresh=False
 ) -> list[str]:
     global filename_path_mapping
     if refresh or folder_name not in filename_path_mapping:
-        model_types: Dict[str, str] = models_config["model_types"]
+        model_type = models_config["model_types"][folder_name]
+        catalog = None
         if share_id:
             url = f"{BIZYAIR_SERVER_ADDRESS}/{share_id}/models/files"
         else:
             url = get_service_route(models_config["model_hub"]["find_model"])
-        msg = fetch_models_by_type(
-            url=url, method="GET", model_type=model_types[folder_name]
-        )
-        if verbose:
-            pprint.pprint({"cached_filename_list": msg})
-
-        try:
-            if not msg or "data" not in msg or msg["data"] is None:
-                return []
-
-            filename_path_mapping[folder_name] = {
-                x["label_path"]: x["real_path"]
-                for x in msg["data"]["files"]
-                if x["label_path"]
-            }
-        except Exception as e:
-            warnings.warn(f"Failed to get filename list: {e}")
+            catalog = catalog_cache.get(_catalog_key(url, model_type))
+
+        if catalog is not None:
+            # Stale while revalidate: the known catalog is used right away, also
+            # after a restart, and replaced once a newer one arrives
+            filename_path_mapping[folder_name] = catalog.mapping
+            refresh_catalog(folder_name, verbose=verbose)
+            disable_refresh_options(folder_name)
+        elif share_id is None and catalog_cache.refreshing(
+            _catalog_key(url, model_type)
+        ):
+            # Being prefetched, the list is filled in once it arrives instead of
+            # fetching it a second time and blocking meanwhile
             return []
-        finally:
-            # TODO fix share_id vaild refresh settings
-            if share_id is None:
-                disable_refresh_options(folder_name)
+        else:
+            msg, response_headers = _request_catalog(url, model_type, verbose=verbose)
+            try:
+                catalog = _parse_catalog(msg, response_headers)
+                if catalog is None:
+                    return []
+                filename_path_mapping[folder_name] = catalog.mapping
+                if share_id is None:
+                    catalog_cache.put(_catalog_key(url, model_type), catalog)
+            except Exception as e:
+                warnings.warn(f"Failed to get filename list: {e}")
+                return []
+            finally:
+                # TODO fix share_id vaild refresh settings
+                if share_id is None:
+                    disable_refresh_options(folder_name)
 
     return list(
         filter_files_extensions(
@@ -162,6 +247,7 @@ def convert_prompt_label_path_to_real_path(prompt: dict[str, dict[str, any]]) ->
             ("control_net_name", "controlnet"),
         ]:
             if key in inputs:
+                wait_for_catalog(folder_name)
                 value = inputs[key]
                 new_value = filename_path_mapping.get(folder_name, {}).get(value, None)
                 if new_value:
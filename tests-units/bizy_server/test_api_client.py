@@ -0,0 +1,140 @@
+import asyncio
+import importlib
+import json
+import sys
+import threading
+import types
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+import bizyair
+import bizyair.common
+from bizyair.common import transport
+from bizyair.common.governor import RequestGovernor
+
+
+def _load(name):
+    # Importing the bizy_server package starts the ComfyUI-bound model hosting
+    # server, its modules are loaded under a bare package instead
+    package = types.ModuleType("bizy_server")
+    package.__path__ = [str(Path(bizyair.__file__).parents[1] / "bizy_server")]
+    sys.modules.setdefault("bizy_server", package)
+    return importlib.import_module(f"bizy_server.{name}")
+
+
+api_client = _load("api_client")
+errno = _load("errno")
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    """Answers every path from `server.answers`: (status, headers, body)."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.seen.append((url.path, url.query, dict(self.headers)))
+        status, headers, body = self.server.answers[url.path]
+        body = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ApiHandler)
+    server.answers, server.seen = {}, []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(
+        api_client,
+        "BIZYAIR_SERVER_ADDRESS",
+        f"http://127.0.0.1:{server.server_address[1]}",
+    )
+    monkeypatch.setattr(api_client, "governor", RequestGovernor())
+    monkeypatch.setattr(bizyair.common, "get_api_key", lambda: "sk-test")
+    yield server
+    server.shutdown()
+
+
+def run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await transport.close_sessions()
+
+    return asyncio.run(main())
+
+
+def ok(data):
+    return 200, {}, {"code": errno.CODE_OK, "message": "ok", "data": data}
+
+
+def test_params_are_stringified(api_server):
+    api_server.answers["/models/files"] = ok({"files": []})
+    files, err = run(
+        api_client.APIClient().get_model_files({"type": "lora", "public": True})
+    )
+    assert (files, err) == ([], None)
+    path, query, headers = api_server.seen[0]
+    assert urllib.parse.parse_qs(query) == {"type": ["lora"], "public": ["True"]}
+    assert headers["authorization"] == "Bearer sk-test"
+
+
+def test_errors_map_to_error_numbers(api_server):
+    client = api_client.APIClient()
+    api_server.answers["/models/check"] = (
+        200,
+        {},
+        {"code": 400999, "message": "bad name", "data": None},
+    )
+    data, err = run(client.check_model("lora", "a"))
+    assert data is None
+    assert (err.http_status_code, err.code, err.message) == (500, 400999, "bad name")
+
+    api_server.answers["/models/files"] = (
+        200,
+        {},
+        {"code": errno.CODE_NO_MODEL_FOUND, "message": "none", "data": None},
+    )
+    assert run(client.get_model_files({"type": "lora"})) == ([], None)
+
+    # Not JSON, as from a proxy in between
+    api_server.answers["/models/check"] = (502, {}, b"<html>Bad Gateway</html>")
+    assert run(client.check_model("lora", "a")) == (None, errno.CHECK_MODEL_EXISTS_ERR)
+
+
+def test_invalid_api_key(api_server, monkeypatch):
+    monkeypatch.setattr(errno.INVALID_API_KEY_ERR, "message", "Invalid API key")
+
+    def get_api_key():
+        raise ValueError("BIZYAIR_API_KEY is not set or invalid.")
+
+    monkeypatch.setattr(bizyair.common, "get_api_key", get_api_key)
+    headers, err = run(api_client.APIClient().auth_header())
+    assert headers is None and err is errno.INVALID_API_KEY_ERR
+    assert err.message == "BIZYAIR_API_KEY is not set or invalid."
+    assert run(api_client.APIClient().check_model("lora", "a")) == (None, err)
+    assert api_server.seen == []
+
+
+def test_throttling_pauses_requests(api_server):
+    api_server.answers["/models"] = (
+        429,
+        {"Retry-After": "30"},
+        {"code": 429, "message": "Too Many Requests"},
+    )
+    models, etag, err = run(api_client.APIClient().poll_models({"type": "lora"}))
+    assert models is None and err is not None
+    assert 25 < api_client.governor._try_acquire("next") <= 30
@@ -0,0 +1,106 @@
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import bizyair
+
+
+def _load_execution():
+    # Importing the bizy_server package starts the ComfyUI-bound model hosting
+    # server, so the module is loaded on its own
+    path = Path(bizyair.__file__).parents[1] / "bizy_server" / "execution.py"
+    spec = importlib.util.spec_from_file_location("execution", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+execution = _load_execution()
+
+
+def item(upload_id):
+    return {"upload_id": upload_id, "files": [{"path": "model.safetensors"}]}
+
+
+def test_priority_then_fifo():
+    started = []
+
+    async def handler(upload, cancel_event):
+        started.append(upload["upload_id"])
+        await asyncio.sleep(0.01)
+
+    async def main():
+        queue = execution.UploadQueue(workers=1)
+        # Items with equal dicts and priorities must not be compared
+        for upload_id, priority in [("a", 5), ("b", 0), ("c", 5), ("d", 0)]:
+            queue.put(item(upload_id), priority=priority)
+        queue.start(asyncio.get_running_loop(), handler)
+        while queue.waiting or queue.running:
+            await asyncio.sleep(0.01)
+        return queue.metrics()
+
+    metrics = asyncio.run(main())
+    assert started == ["b", "d", "a", "c"]
+    assert metrics["completed"] == 4
+    assert metrics["depth"] == 0
+    assert metrics["wait_max"] >= metrics["wait_mean"] > 0
+
+
+def test_workers_and_cancel():
+    running = set()
+    peak = 0
+
+    async def handler(upload, cancel_event):
+        nonlocal peak
+        running.add(upload["upload_id"])
+        peak = max(peak, len(running))
+        try:
+            for _ in range(5):
+                if cancel_event.is_set():
+                    raise InterruptedError
+                await asyncio.sleep(0.01)
+        finally:
+            running.discard(upload["upload_id"])
+
+    async def main():
+        queue = execution.UploadQueue(workers=2)
+        queue.start(asyncio.get_running_loop(), handler)
+        for upload_id in "abcde":
+            queue.put(item(upload_id))
+        await asyncio.sleep(0.01)
+        assert await queue.cancel("a")  # running
+        assert "a" not in running
+        assert await queue.cancel("e")  # waiting
+        assert not await queue.cancel("unknown")
+        await asyncio.sleep(0.01)
+        assert queue.metrics()["running"] == 2
+        while queue.waiting or queue.running:
+            await asyncio.sleep(0.01)
+        for task in queue.worker_tasks:
+            task.cancel()
+        return queue.metrics()
+
+    metrics = asyncio.run(main())
+    assert peak == 2
+    assert metrics["cancelled"] == 2
+    assert metrics["completed"] == 3
+    assert metrics["submitted"] == 5
+
+
+def test_failed_upload_keeps_worker():
+    async def handler(upload, cancel_event):
+        if upload["upload_id"] == "bad":
+            raise RuntimeError("boom")
+
+    async def main():
+        queue = execution.UploadQueue(workers=1)
+        queue.start(asyncio.get_running_loop(), handler)
+        queue.put(item("bad"))
+        queue.put(item("good"))
+        while queue.waiting or queue.running:
+            await asyncio.sleep(0.01)
+        return queue.metrics()
+
+    metrics = asyncio.run(main())
+    assert metrics["failed"] == 1
+    assert metrics["completed"] == 1
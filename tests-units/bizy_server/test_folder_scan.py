@@ -0,0 +1,71 @@
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+import bizyair
+
+
+def _load_folder_scan():
+    # Importing the bizy_server package starts the ComfyUI-bound model hosting
+    # server, so the module is loaded on its own
+    path = Path(bizyair.__file__).parents[1] / "bizy_server" / "folder_scan.py"
+    spec = importlib.util.spec_from_file_location("folder_scan", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+folder_scan = _load_folder_scan()
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    for path, size in [
+        ("a.safetensors", 10),
+        ("sub/b.bin", 20),
+        ("sub/deeper/c.json", 3),
+        (".git/objects/x", 5),
+    ]:
+        file = tmp_path / path
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_bytes(b"x" * size)
+    return tmp_path
+
+
+def walk(root):
+    found = []
+    for current, dirs, files in os.walk(root):
+        if ".git" in dirs:
+            dirs.remove(".git")
+        for file in files:
+            path = os.path.join(current, file)
+            found.append(
+                (os.path.relpath(path, root).replace("\\", "/"), os.path.getsize(path))
+            )
+    return sorted(found)
+
+
+def test_scan_matches_walk(model_dir):
+    files = folder_scan.FolderScanner().scan(str(model_dir))
+    assert sorted((f["path"], f["size"]) for f in files) == walk(model_dir)
+
+
+def test_listings_cached_by_mtime(model_dir, monkeypatch):
+    scanner = folder_scan.FolderScanner()
+    scanner.scan(str(model_dir))
+
+    listed = []
+    scandir = os.scandir
+    monkeypatch.setattr(
+        folder_scan.os, "scandir", lambda path: listed.append(path) or scandir(path)
+    )
+    scanner.scan(str(model_dir))
+    assert listed == []
+
+    (model_dir / "sub" / "new.bin").write_bytes(b"new")
+    files = scanner.scan(str(model_dir))
+    # Only the changed directory is listed again
+    assert len(listed) == 1 and listed[0].endswith("sub/")
+    assert {"path": "sub/new.bin", "size": 3} in files
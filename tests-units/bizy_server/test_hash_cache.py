@@ -0,0 +1,66 @@
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+import bizyair
+
+
+def _load_hash_cache():
+    # Importing the bizy_server package starts the ComfyUI-bound model hosting
+    # server, so the module is loaded on its own
+    path = Path(bizyair.__file__).parents[1] / "bizy_server" / "hash_cache.py"
+    spec = importlib.util.spec_from_file_location("hash_cache", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+hash_cache = _load_hash_cache()
+
+
+def test_key_follows_size_and_mtime(tmp_path):
+    path = tmp_path / "model.safetensors"
+    path.write_bytes(b"a" * 10)
+    key = hash_cache.FileHashCache.key(str(path))
+    assert hash_cache.FileHashCache.key(str(path)) == key
+
+    os.utime(path, ns=(0, 10**9))
+    touched = hash_cache.FileHashCache.key(str(path))
+    assert touched != key
+
+    path.write_bytes(b"a" * 11)
+    os.utime(path, ns=(0, 10**9))
+    assert hash_cache.FileHashCache.key(str(path)) not in (key, touched)
+
+
+def test_put_replaces_file(tmp_path, monkeypatch):
+    path = tmp_path / "cache" / "hashes.json"
+    replaced = []
+    replace = os.replace
+    monkeypatch.setattr(
+        hash_cache.os,
+        "replace",
+        lambda src, dst: replaced.append((src, dst)) or replace(src, dst),
+    )
+    cache = hash_cache.FileHashCache(str(path), max_entries=2)
+    for key in "abc":
+        cache.put(key, f"sig-{key}")
+
+    assert [dst for _, dst in replaced] == [str(path)] * 3
+    assert all(src.endswith(".tmp") for src, _ in replaced)
+    assert os.listdir(path.parent) == ["hashes.json"]
+    # A new process sees the newest entries
+    reloaded = hash_cache.FileHashCache(str(path))
+    assert [reloaded.get(key) for key in "abc"] == [None, "sig-b", "sig-c"]
+
+
+def test_unreadable_file_is_ignored(tmp_path):
+    path = tmp_path / "hashes.json"
+    path.write_text("{not json")
+    cache = hash_cache.FileHashCache(str(path))
+    with pytest.warns(UserWarning, match="unreadable"):
+        assert cache.get("a") is None
+    cache.put("a", "sig")
+    assert hash_cache.FileHashCache(str(path)).get("a") == "sig"
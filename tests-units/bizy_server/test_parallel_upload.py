@@ -0,0 +1,207 @@
+import hashlib
+import importlib.util
+import os
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import oss2
+import pytest
+
+import bizyair
+
+
+def _load_parallel_upload():
+    # Importing the bizy_server package starts the ComfyUI-bound model hosting
+    # server, so the module is loaded on its own
+    path = Path(bizyair.__file__).parents[1] / "bizy_server" / "parallel_upload.py"
+    spec = importlib.util.spec_from_file_location("parallel_upload", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+parallel_upload = _load_parallel_upload()
+
+
+class _OssHandler(BaseHTTPRequestHandler):
+    """Just enough of the OSS multipart API, with path-style bucket URLs."""
+
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status, body=b"", headers=None):
+        self.send_response(status)
+        self.send_header("x-oss-request-id", "stand-in")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _parse(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query, keep_blank_values=True)
+        return urllib.parse.unquote(url.path), {
+            key: values[0] for key, values in query.items()
+        }
+
+    def do_POST(self):
+        path, query = self._parse()
+        body = self._body()
+        server = self.server
+        if "uploads" in query:
+            upload_id = f"upload{len(server.uploads)}"
+            server.uploads[upload_id] = {}
+            xml = (
+                "<InitiateMultipartUploadResult><Bucket>bucket</Bucket>"
+                f"<Key>{path}</Key><UploadId>{upload_id}</UploadId>"
+                "</InitiateMultipartUploadResult>"
+            )
+            return self._reply(200, xml.encode())
+        parts = server.uploads.pop(query["uploadId"], None)
+        if parts is None:
+            return self._no_such_upload()
+        numbers = [int(n) for n in re.findall(rb"<PartNumber>(\d+)</PartNumber>", body)]
+        server.objects[path] = b"".join(parts[n] for n in numbers)
+        xml = (
+            "<CompleteMultipartUploadResult><Bucket>bucket</Bucket>"
+            f'<Key>{path}</Key><ETag>"done"</ETag></CompleteMultipartUploadResult>'
+        )
+        self._reply(200, xml.encode())
+
+    def do_PUT(self):
+        _, query = self._parse()
+        body = self._body()
+        server = self.server
+        parts = server.uploads.get(query.get("uploadId"))
+        if parts is None:
+            return self._no_such_upload()
+        number = int(query["partNumber"])
+        with server.lock:
+            server.part_requests.append(number)
+            fail = number in server.fail_parts
+            server.fail_parts.discard(number)
+        if fail:
+            xml = (
+                "<Error><Code>AccessDenied</Code><Message>interrupted</Message></Error>"
+            )
+            return self._reply(403, xml.encode())
+        parts[number] = body
+        etag = hashlib.md5(body).hexdigest().upper()
+        self._reply(200, headers={"ETag": f'"{etag}"'})
+
+    def _no_such_upload(self):
+        xml = "<Error><Code>NoSuchUpload</Code><Message>gone</Message></Error>"
+        self._reply(404, xml.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def oss_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OssHandler)
+    server.lock = threading.Lock()
+    server.uploads, server.objects = {}, {}
+    server.part_requests, server.fail_parts = [], set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def bucket(oss_server):
+    endpoint = f"http://127.0.0.1:{oss_server.server_address[1]}"
+    return oss2.Bucket(oss2.Auth("ak", "sk"), endpoint, "bucket")
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    path = tmp_path / "model.safetensors"
+    path.write_bytes(os.urandom(10 * 1000 + 7))
+    return str(path)
+
+
+def make_uploader(bucket, tmp_path):
+    return parallel_upload.ParallelUploader(
+        bucket,
+        num_threads=4,
+        checkpoint_dir=str(tmp_path / "checkpoints"),
+        part_size=1000,
+    )
+
+
+def test_choose_part_size():
+    choose = parallel_upload.choose_part_size
+    assert choose(10 * 1024**2, 4) == parallel_upload.MIN_PART_SIZE
+    assert choose(10 * 1024**3, 4) == parallel_upload.MAX_PART_SIZE
+    # Never more than the 10000 parts OSS allows
+    assert 2 * 1024**4 / choose(2 * 1024**4, 4) <= 10000
+
+
+def test_bandwidth_limiter():
+    limiter = parallel_upload.BandwidthLimiter(100_000)
+    sent = []
+    callback = limiter.throttle(lambda done, total: sent.append(done))
+    start = time.monotonic()
+    for done in range(25_000, 150_001, 25_000):
+        callback(done, 150_000)
+    # The first 100 KB are a burst, the rest waits for the bucket to refill
+    assert 0.4 < time.monotonic() - start < 1.5
+    assert sent[-1] == 150_000
+
+    unlimited = parallel_upload.BandwidthLimiter(0)
+    start = time.monotonic()
+    unlimited.consume(10**12)
+    assert time.monotonic() - start < 0.1
+
+
+def test_parallel_upload(oss_server, bucket, model_file, tmp_path):
+    progress = []
+    uploader = make_uploader(bucket, tmp_path)
+    uploader.upload(model_file, "models/a", lambda *p: progress.append(p))
+
+    data = Path(model_file).read_bytes()
+    assert oss_server.objects["/bucket/models/a"] == data
+    assert sorted(oss_server.part_requests) == list(range(1, 12))
+    assert progress[-1] == (len(data), len(data))
+    assert all(a[0] <= b[0] for a, b in zip(progress, progress[1:]))
+    assert os.listdir(tmp_path / "checkpoints") == []
+
+
+def test_resume_after_interruption(oss_server, bucket, model_file, tmp_path):
+    oss_server.fail_parts = {5}
+    uploader = make_uploader(bucket, tmp_path)
+    uploader.num_threads = 1
+    with pytest.raises(oss2.exceptions.AccessDenied):
+        uploader.upload(model_file, "models/a")
+    assert len(os.listdir(tmp_path / "checkpoints")) == 1
+
+    oss_server.part_requests.clear()
+    progress = []
+    make_uploader(bucket, tmp_path).upload(
+        model_file, "models/a", lambda *p: progress.append(p)
+    )
+    # Parts finished before the failure were not sent again
+    resent = sorted(oss_server.part_requests)
+    assert resent[0] == 5 and resent[-1] == 11
+    assert progress[0][0] == (11 - len(resent)) * 1000
+    assert oss_server.objects["/bucket/models/a"] == Path(model_file).read_bytes()
+
+
+def test_restart_when_upload_expired(oss_server, bucket, model_file, tmp_path):
+    oss_server.fail_parts = {3}
+    uploader = make_uploader(bucket, tmp_path)
+    uploader.num_threads = 1
+    with pytest.raises(oss2.exceptions.AccessDenied):
+        uploader.upload(model_file, "models/a")
+    oss_server.uploads.clear()
+
+    make_uploader(bucket, tmp_path).upload(model_file, "models/a")
+    assert oss_server.objects["/bucket/models/a"] == Path(model_file).read_bytes()
@@ -0,0 +1,155 @@
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import bizyair
+
+
+def _load_sync_watcher():
+    # Importing the bizy_server package starts the ComfyUI-bound model hosting
+    # server, so the module is loaded on its own
+    path = Path(bizyair.__file__).parents[1] / "bizy_server" / "sync_watcher.py"
+    spec = importlib.util.spec_from_file_location("sync_watcher", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+sync_watcher = _load_sync_watcher()
+
+
+class _Error:
+    message, code, data = "Failed to list model", 500112, None
+
+
+class _FakeApiClient:
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = []
+
+    async def poll_models(self, payload, etag=None):
+        self.calls.append((payload["type"], etag))
+        if len(self.answers) > 1:
+            return self.answers.pop(0)
+        return self.answers[0]
+
+
+class _FakeServer:
+    def __init__(self, answers):
+        self.api_client = _FakeApiClient(answers)
+        self.sent = []
+        self.loop = None
+
+    async def send_json(self, event, data, sid=None):
+        self.sent.append((event, data, sid))
+
+
+def run_watcher(server, watches, **kwargs):
+    async def main():
+        server.loop = asyncio.get_running_loop()
+        watcher = sync_watcher.ModelSyncWatcher(server, interval=0.01, **kwargs)
+        for watch in watches:
+            watcher.watch(*watch)
+        await asyncio.sleep(0)
+        while watcher.tasks:
+            await asyncio.gather(*watcher.tasks.values())
+        return watcher
+
+    return asyncio.run(main())
+
+
+def models(*names):
+    return [{"name": name} for name in names]
+
+
+def test_one_task_per_type_batches_names():
+    server = _FakeServer(
+        [
+            (models("a"), "v1", None),
+            (None, "v1", None),
+            (models("a", "b"), "v2", None),
+        ]
+    )
+    run_watcher(
+        server,
+        [("lora", "a", "s1"), ("lora", "b", "s2"), ("lora", "b", "s3")],
+    )
+    # One request for all names, conditional on the last ETag
+    assert server.api_client.calls == [("lora", None), ("lora", "v1"), ("lora", "v1")]
+    synced = sorted((data["model_name"], sid) for _, data, sid in server.sent)
+    assert synced == [("a", "s1"), ("b", "s2"), ("b", "s3")]
+
+
+def test_types_are_watched_separately():
+    server = _FakeServer([(models("a"), None, None)])
+    run_watcher(server, [("lora", "a", "s1"), ("checkpoint", "a", "s2")])
+    assert sorted(call[0] for call in server.api_client.calls) == [
+        "checkpoint",
+        "lora",
+    ]
+    assert {data["model_type"] for _, data, _ in server.sent} == {
+        "lora",
+        "checkpoint",
+    }
+
+
+def test_errors_are_reported_after_retries():
+    server = _FakeServer([(None, None, _Error())])
+    watcher = run_watcher(server, [("lora", "a", "s1")], max_errors=3)
+    assert len(server.api_client.calls) == 3
+    assert server.sent == [
+        ("error", {"message": _Error.message, "code": 500112, "data": None}, "s1")
+    ]
+    assert not watcher.pending["lora"]
+
+
+def test_gives_up_after_timeout():
+    server = _FakeServer([(models("other"), None, None)])
+    watcher = run_watcher(server, [("lora", "a", "s1")], timeout=0.05)
+    assert server.sent == []
+    assert not watcher.pending["lora"]
+
+
+class _ConditionalApiClient:
+    """The model list answers 304 while the ETag sent is the current one."""
+
+    def __init__(self, names, etag):
+        self.names, self.etag = names, etag
+        self.calls = []
+
+    async def poll_models(self, payload, etag=None):
+        self.calls.append(etag)
+        if etag == self.etag:
+            return None, etag, None
+        return models(*self.names), self.etag, None
+
+
+def test_new_name_polls_without_etag():
+    server = _FakeServer([])
+    # "b" is in the list before it is watched, its ETag does not change
+    server.api_client = _ConditionalApiClient(["b"], "v1")
+
+    async def main():
+        server.loop = asyncio.get_running_loop()
+        watcher = sync_watcher.ModelSyncWatcher(
+            server, interval=0.01, max_interval=0.02
+        )
+        watcher.watch("lora", "a", "s1")
+        await asyncio.sleep(0.1)
+        assert server.api_client.calls[1:] == ["v1"] * (
+            len(server.api_client.calls) - 1
+        )
+        polls = len(server.api_client.calls)
+        watcher.watch("lora", "b", "s2")
+
+        async def synced():
+            while not server.sent:
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(synced(), 1)
+        watcher.tasks["lora"].cancel()
+        return polls
+
+    polls = asyncio.run(main())
+    assert server.api_client.calls[polls] is None
+    assert server.sent == [("synced", {"model_type": "lora", "model_name": "b"}, "s2")]
@@ -0,0 +1,244 @@
+import asyncio
+import base64
+import functools
+import hashlib
+import importlib
+import os
+import sys
+import threading
+import time
+import types
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import crcmod
+import pytest
+
+import bizyair
+
+
+def _load(name):
+    # Importing the bizy_server package starts the ComfyUI-bound model hosting
+    # server, its modules are loaded under a bare package instead
+    package = types.ModuleType("bizy_server")
+    package.__path__ = [str(Path(bizyair.__file__).parents[1] / "bizy_server")]
+    sys.modules.setdefault("bizy_server", package)
+    return importlib.import_module(f"bizy_server.{name}")
+
+
+execution = _load("execution")
+hash_cache = _load("hash_cache")
+oss = _load("oss")
+parallel_upload = _load("parallel_upload")
+upload_manager = _load("upload_manager")
+
+
+class _OssHandler(BaseHTTPRequestHandler):
+    """Multipart uploads whose parts are held back until `gate` is set."""
+
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("x-oss-request-id", "stand-in")
+        self.send_header("ETag", '"part"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _query(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        query = urllib.parse.urlsplit(self.path).query
+        return urllib.parse.parse_qs(query, keep_blank_values=True)
+
+    def do_POST(self):
+        self._query()
+        xml = (
+            "<InitiateMultipartUploadResult><Bucket>bucket</Bucket>"
+            "<Key>models/a</Key><UploadId>upload0</UploadId>"
+            "</InitiateMultipartUploadResult>"
+        )
+        self._reply(200, xml.encode())
+
+    def do_PUT(self):
+        number = int(self._query()["partNumber"][0])
+        self.server.parts.append(number)
+        self.server.gate.wait(5)
+        self._reply(200)
+
+    def do_DELETE(self):
+        self.server.aborted.append(self._query()["uploadId"][0])
+        self._reply(204)
+
+    def log_message(self, *args):
+        pass
+
+
+class _FakeApiClient:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.committed = []
+
+    async def sign(self, signature):
+        return {
+            "file": {
+                "object_key": "models/a",
+                "access_key_id": "ak",
+                "access_key_secret": "sk",
+            },
+            "storage": {"endpoint": self.endpoint, "bucket": "bucket"},
+        }, None
+
+    async def commit_file(self, signature, object_key):
+        return {}, None
+
+    async def commit_model(self, **kwargs):
+        self.committed.append(kwargs)
+        return {}, None
+
+
+class _FakeServer:
+    def __init__(self, endpoint):
+        self.api_client = _FakeApiClient(endpoint)
+        self.events = []
+
+    def send_sync(self, event, data, sid=None):
+        self.events.append((event, data))
+
+    def send_sync_error(self, err, sid=None):
+        self.events.append(("error", err))
+
+
+@pytest.fixture
+def oss_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OssHandler)
+    server.gate = threading.Event()
+    server.parts, server.aborted = [], []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.gate.set()
+    server.shutdown()
+
+
+@pytest.fixture
+def manager(oss_server, monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        upload_manager, "file_hash_cache", hash_cache.FileHashCache(None)
+    )
+    # Every file is a multipart upload of 1000 byte parts
+    monkeypatch.setattr(oss, "BIZYAIR_UPLOAD_MULTIPART_THRESHOLD", 0)
+    monkeypatch.setattr(
+        oss,
+        "ParallelUploader",
+        functools.partial(
+            parallel_upload.ParallelUploader,
+            num_threads=2,
+            checkpoint_dir=str(tmp_path / "checkpoints"),
+            part_size=1000,
+        ),
+    )
+    (tmp_path / "model").mkdir()
+    (tmp_path / "model" / "a.safetensors").write_bytes(b"x" * 10_000)
+    endpoint = f"http://127.0.0.1:{oss_server.server_address[1]}"
+    return upload_manager.UploadManager(_FakeServer(endpoint))
+
+
+def test_cancel_stops_upload_threads(oss_server, manager, tmp_path):
+    item = {
+        "upload_id": "u1",
+        "sid": "s",
+        "root": str(tmp_path / "model"),
+        "files": [{"path": "a.safetensors"}],
+        "type": "bizyair/lora",
+        "name": "a",
+    }
+
+    async def main():
+        queue = execution.UploadQueue(workers=1)
+        queue.start(asyncio.get_running_loop(), manager.do_upload)
+        queue.put(item)
+        while len(oss_server.parts) < 2:
+            await asyncio.sleep(0.01)
+
+        cancelling = asyncio.ensure_future(queue.cancel("u1"))
+        await asyncio.sleep(0.1)
+        # The parts in flight are still running, nothing is reported yet
+        assert not cancelling.done()
+        oss_server.gate.set()
+        assert await cancelling
+        for task in queue.worker_tasks:
+            task.cancel()
+        return queue.metrics()
+
+    metrics = asyncio.run(main())
+    assert metrics["cancelled"] == 1 and metrics["failed"] == 0
+    assert not any(t.name.startswith("bizyair-upload") for t in threading.enumerate())
+    sent = len(oss_server.parts)
+    assert sent < 10 and oss_server.aborted == ["upload0"]
+    assert list((tmp_path / "checkpoints").iterdir()) == []
+    assert manager.server.api_client.committed == []
+    assert all(data.get("status") != "finish" for _, data in manager.server.events)
+    time.sleep(0.1)
+    assert len(oss_server.parts) == sent
+
+
+def two_pass_signature(path):
+    # How upload signatures were computed before hash_file, CRC64 and MD5 each
+    # read the file on their own
+    do_crc64 = crcmod.mkCrcFun(
+        0x142F0E1EBA9EA3693, initCrc=0, xorOut=0xFFFFFFFFFFFFFFFF, rev=True
+    )
+    crc64_signature = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(65536 * 16):
+            crc64_signature = do_crc64(chunk, crc64_signature)
+    md5_hash = hashlib.md5()
+    with open(path, "rb") as f:
+        while chunk := f.read(65536 * 16):
+            md5_hash.update(chunk)
+    md5_str = base64.b64encode(md5_hash.digest()).decode("utf-8")
+    return hashlib.sha256(f"{md5_str}{crc64_signature}".encode("utf-8")).hexdigest()
+
+
+@pytest.mark.parametrize("size", [0, 1000, 2_500_000])
+def test_hash_file_matches_two_pass(tmp_path, monkeypatch, size):
+    # Blocks smaller than the file, and not a multiple of the old chunk size
+    monkeypatch.setattr(upload_manager, "HASH_BLOCK_SIZE", 300_000)
+    path = tmp_path / "model.safetensors"
+    path.write_bytes(os.urandom(size))
+    assert upload_manager.hash_file(str(path)) == two_pass_signature(path)
+
+
+def test_calculate_hash_caches(tmp_path, monkeypatch):
+    cache = hash_cache.FileHashCache(str(tmp_path / "hashes.json"))
+    monkeypatch.setattr(upload_manager, "file_hash_cache", cache)
+    hashed = []
+    hash_file = upload_manager.hash_file
+    monkeypatch.setattr(
+        upload_manager,
+        "hash_file",
+        lambda *args: hashed.append(threading.current_thread()) or hash_file(*args),
+    )
+    path = tmp_path / "model.safetensors"
+    path.write_bytes(b"x" * 1000)
+    manager = upload_manager.UploadManager(None)
+
+    first = asyncio.run(manager.calculate_hash(str(path)))
+    assert asyncio.run(manager.calculate_hash(str(path))) == first
+    assert len(hashed) == 1 and hashed[0] is not threading.main_thread()
+    assert hash_cache.FileHashCache(cache.path).get(cache.key(str(path))) == first
+
+    path.write_bytes(b"y" * 1000)
+    os.utime(path, ns=(0, 10**9))
+    assert asyncio.run(manager.calculate_hash(str(path))) != first
+    assert len(hashed) == 2
+
+
+def test_cancel_hashing(tmp_path):
+    path = tmp_path / "a.safetensors"
+    path.write_bytes(b"x" * 10)
+    cancel_event = threading.Event()
+    cancel_event.set()
+    with pytest.raises(parallel_upload.UploadCancelled):
+        upload_manager.hash_file(str(path), cancel_event)
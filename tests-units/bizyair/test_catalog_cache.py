@@ -0,0 +1,155 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from bizyair.common import client
+from bizyair.path_utils import path_manager
+from bizyair.path_utils.catalog_cache import Catalog, CatalogCache
+
+
+class _CatalogHandler(BaseHTTPRequestHandler):
+    """Model catalog with an ETag, answers 304 while it is unchanged."""
+
+    protocol_version = "HTTP/1.1"
+    files = []
+    version = "v1"
+    seen = []
+    # Holds answers back until set
+    gate = None
+
+    def do_GET(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.gate is not None:
+            self.gate.wait(5)
+        etag = f'"{self.version}"'
+        self.seen.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps({"data": {"files": self.files}}).encode()
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def lora(name):
+    return {"label_path": f"{name}.safetensors", "real_path": f"real/{name}"}
+
+
+@pytest.fixture
+def catalog_server(monkeypatch, tmp_path):
+    _CatalogHandler.files = [lora("a")]
+    _CatalogHandler.version = "v1"
+    _CatalogHandler.seen = []
+    _CatalogHandler.gate = None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _CatalogHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setattr(client, "BIZYAIR_API_KEY", "sk-test")
+    monkeypatch.setattr(client, "validate_api_key", lambda api_key=None: True)
+    models_config = dict(path_manager.models_config)
+    models_config["model_hub"] = {
+        "find_model": {
+            "service_address": f"http://127.0.0.1:{server.server_address[1]}",
+            "route": "/models/files",
+        }
+    }
+    monkeypatch.setattr(path_manager, "models_config", models_config)
+    monkeypatch.setattr(path_manager, "filename_path_mapping", {})
+    monkeypatch.setattr(path_manager, "catalog_cache", CatalogCache(str(tmp_path)))
+    yield _CatalogHandler
+    server.shutdown()
+
+
+def restart(monkeypatch, tmp_path):
+    monkeypatch.setattr(path_manager, "filename_path_mapping", {})
+    monkeypatch.setattr(path_manager, "catalog_cache", CatalogCache(str(tmp_path)))
+
+
+def test_served_from_disk_then_revalidated(catalog_server, monkeypatch, tmp_path):
+    assert path_manager.cached_filename_list("loras") == ["a.safetensors"]
+    assert catalog_server.seen == [None]
+
+    catalog_server.files = [lora("a"), lora("b")]
+    catalog_server.version = "v2"
+    restart(monkeypatch, tmp_path)
+    # The catalog from disk is shown without waiting for the server
+    assert path_manager.cached_filename_list("loras") == ["a.safetensors"]
+
+    # Waits for the refresh started above, or revalidates once more
+    catalog = path_manager.refresh_catalog("loras").result(timeout=5)
+    assert catalog_server.seen[1] == '"v1"'
+    assert catalog.etag == '"v2"'
+    assert path_manager.cached_filename_list("loras") == [
+        "a.safetensors",
+        "b.safetensors",
+    ]
+
+
+def test_not_modified_keeps_catalog(catalog_server, monkeypatch, tmp_path):
+    path_manager.cached_filename_list("loras")
+    restart(monkeypatch, tmp_path)
+
+    catalog = path_manager.refresh_catalog("loras").result(timeout=5)
+    assert catalog_server.seen == [None, '"v1"']
+    assert catalog.mapping == {"a.safetensors": "real/a"}
+    assert path_manager.filename_path_mapping["loras"] == catalog.mapping
+
+
+def test_refresh_single_flight_and_failures(tmp_path):
+    cache = CatalogCache(str(tmp_path))
+    cache.put("k", Catalog({"a": "real/a"}, '"v1"', 1.0))
+    release = threading.Event()
+    calls = []
+
+    def slow_fetch(current):
+        calls.append(current)
+        release.wait(5)
+        return Catalog({"b": "real/b"}, '"v2"', time.time())
+
+    first = cache.refresh("k", slow_fetch)
+    assert cache.refresh("k", slow_fetch) is first
+    release.set()
+    assert first.result(timeout=5).mapping == {"b": "real/b"}
+    assert calls[0].etag == '"v1"' and len(calls) == 1
+
+    def failing_fetch(current):
+        raise ConnectionError("offline")
+
+    with pytest.warns(UserWarning, match="offline"):
+        assert cache.refresh("k", failing_fetch).result(timeout=5) is None
+    # Kept, also for a new process
+    assert CatalogCache(str(tmp_path)).get("k").mapping == {"b": "real/b"}
+
+
+def test_prefetch_does_not_block(catalog_server):
+    catalog_server.gate = threading.Event()
+    futures = path_manager.prefetch_catalogs()
+    assert set(futures) == set(path_manager.models_config["model_types"])
+
+    start = time.perf_counter()
+    assert path_manager.cached_filename_list("loras", refresh=True) == []
+    assert time.perf_counter() - start < 1
+
+    catalog_server.gate.set()
+    prompt = {
+        "1": {"class_type": "LoraLoader", "inputs": {"lora_name": "a.safetensors"}}
+    }
+    # Running a prompt waits for the catalog
+    converted = path_manager.convert_prompt_label_path_to_real_path(prompt)
+    assert converted["1"]["inputs"]["lora_name"] == "real/a"
+    for future in futures.values():
+        future.result(timeout=5)
+    assert catalog_server.seen == [None, None]
+    assert path_manager.cached_filename_list("loras") == ["a.safetensors"]
@@ -0,0 +1,252 @@
+import asyncio
+import base64
+import email.parser
+import gc
+import io
+import json
+import threading
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from bizyair.commands.processors.prompt_processor import PromptProcessor
+from bizyair.common import client, transport
+from bizyair.common.multipart import MultipartBody
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Set by the client when it has seen the first progress event
+    first_event_seen = threading.Event()
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path.startswith("/stream"):
+            return self._stream()
+        status = 401 if self.path == "/unauthorized" else 200
+        out = {"message": "Ok", "client": self.client_address}
+        if self.headers.get("Content-Type", "").startswith("multipart/form-data"):
+            message = email.parser.BytesParser().parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + data
+            )
+            out["parts"] = {
+                part.get_param("name", header="content-disposition"): [
+                    part.get_content_type(),
+                    len(part.get_payload(decode=True)),
+                ]
+                for part in message.get_payload()
+            }
+        body = json.dumps(out).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self):
+        # Fake sampler steps as server-sent events, sent with chunked encoding
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(text):
+            chunk = text.encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.flush()
+
+        preview = io.BytesIO()
+        Image.new("RGB", (8, 8), "red").save(preview, format="JPEG")
+        preview = base64.b64encode(preview.getvalue()).decode()
+        send(": keep-alive\n\n")
+        send(
+            f'event: progress\ndata: {{"value": 1, "total": 3, "preview": "{preview}"}}\n\n'
+        )
+        # The rest only follows once the client got the first step
+        self.first_event_seen.wait(5)
+        send('event: progress\ndata: {"value": 2,')
+        send(' "total": 3}\r\n\r\nevent: progress\ndata: {"value": 3, "total": 3}\n\n')
+        if self.path == "/stream/error":
+            send('event: error\ndata: {"message": "out of memory"}\n\n')
+        else:
+            send(
+                'event: result\ndata: {"message": "Ok",\ndata: "client": %s}\n\n'
+                % json.dumps(self.client_address)
+            )
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def fake_user_info(monkeypatch):
+    calls = []
+
+    def fake_send_request(method="POST", url=None, headers=None, **kwargs):
+        calls.append(headers["authorization"])
+        return {"message": "Ok"}
+
+    monkeypatch.setattr(client, "send_request", fake_send_request)
+    monkeypatch.setattr(client, "api_key_cache", client.APIKeyValidationCache(ttl=60))
+    return calls
+
+
+def test_validate_api_key_is_cached(fake_user_info):
+    for _ in range(5):
+        assert client.validate_api_key("sk-test")
+    assert len(fake_user_info) == 1
+    assert client.api_key_cache.avoided_calls == 4
+
+
+def test_validate_api_key_cache_invalidation(fake_user_info):
+    assert client.validate_api_key("sk-test")
+    client._invalidate_api_key_from_headers({"authorization": "Bearer sk-test"})
+    assert client.validate_api_key("sk-test")
+    client.set_api_key("sk-test", override=True)
+    assert len(fake_user_info) == 3
+
+
+def test_validate_api_key_cache_disabled(fake_user_info):
+    client.api_key_cache.ttl = 0
+    for _ in range(3):
+        assert client.validate_api_key("sk-test")
+    assert len(fake_user_info) == 3
+    assert client.api_key_cache.avoided_calls == 0
+
+
+def test_send_request_reuses_connection(stand_in_server):
+    headers = {"authorization": "Bearer sk-test"}
+    outs = [
+        client.send_request(
+            url=f"{stand_in_server}/ok",
+            data=b"{}",
+            headers=dict(headers),
+            callback=None,
+        )
+        for _ in range(3)
+    ]
+    assert all(out["message"] == "Ok" for out in outs)
+    assert len({tuple(out["client"]) for out in outs}) == 1
+
+
+def test_aiohttp_sessions_per_loop():
+    async def session_of_loop(close):
+        session = transport.get_aiohttp_session()
+        assert transport.get_aiohttp_session() is session
+        if close:
+            await transport.close_sessions()
+        return weakref.ref(asyncio.get_running_loop())
+
+    closed_loop = asyncio.run(session_of_loop(close=True))
+    assert transport._aiohttp_sessions == {}
+
+    # A loop closed without close_sessions() is dropped by the next lookup
+    with pytest.warns(ResourceWarning, match="Unclosed"):
+        abandoned_loop = asyncio.run(session_of_loop(close=False))
+        asyncio.run(session_of_loop(close=True))
+        gc.collect()
+    assert transport._aiohttp_sessions == {}
+    assert closed_loop() is None and abandoned_loop() is None
+
+
+def test_send_request_unauthorized(stand_in_server):
+    with pytest.raises(PermissionError):
+        client.send_request(
+            url=f"{stand_in_server}/unauthorized",
+            data=b"{}",
+            headers={"authorization": "Bearer sk-test"},
+        )
+
+
+def test_send_request_multipart(stand_in_server):
+    body = MultipartBody(
+        [
+            ("prompt", "application/json", json.dumps({"prompt": {}})),
+            ("blob0", "application/octet-stream", bytearray(range(256)) * 10),
+            ("blob1", "text/plain", "IMAGE:" + "a" * 100),
+        ]
+    )
+    body.block_size = 7
+    assert len(body) == sum(len(chunk) for chunk in body)
+    out = client.send_request(
+        url=f"{stand_in_server}/multipart",
+        data=body,
+        headers={"content-type": body.content_type, "content-length": str(len(body))},
+        callback=None,
+    )
+    assert out["parts"] == {
+        "prompt": ["application/json", 14],
+        "blob0": ["application/octet-stream", 2560],
+        "blob1": ["text/plain", 106],
+    }
+
+
+@pytest.fixture
+def progress_events():
+    _StandInHandler.first_event_seen.clear()
+    events = []
+
+    def progress_callback(value, total=None, preview=None):
+        events.append((value, total, preview))
+        _StandInHandler.first_event_seen.set()
+
+    progress_callback.events = events
+    return progress_callback
+
+
+def test_stream_request_progress(stand_in_server, progress_events):
+    outs = [
+        PromptProcessor()._send(
+            f"{stand_in_server}/stream",
+            b"{}",
+            {"authorization": "Bearer sk-test"},
+            progress_events,
+        )
+        for _ in range(2)
+    ]
+    assert outs[0]["message"] == "Ok"
+    # Events were delivered while the request was running, not after it ended
+    assert _StandInHandler.first_event_seen.is_set()
+    assert [event[:2] for event in progress_events.events] == [
+        (1, 3),
+        (2, 3),
+        (3, 3),
+    ] * 2
+    image_format, image, max_size = progress_events.events[0][2]
+    assert (image_format, image.size, max_size) == ("JPEG", (8, 8), 512)
+    assert progress_events.events[1][2] is None
+    # The connection went back to the pool in a clean state
+    assert outs[0]["client"] == outs[1]["client"]
+
+
+def test_stream_request_error(stand_in_server, progress_events):
+    with pytest.raises(ConnectionError, match="out of memory"):
+        client.send_stream_request(
+            url=f"{stand_in_server}/stream/error",
+            data=b"{}",
+            headers={"authorization": "Bearer sk-test"},
+            on_event=lambda event, data: progress_events(data["value"]),
+        )
+    assert len(progress_events.events) == 3
+
+
+def test_stream_request_plain_json(stand_in_server):
+    events = []
+    out = client.send_stream_request(
+        url=f"{stand_in_server}/ok",
+        data=b"{}",
+        headers={"authorization": "Bearer sk-test"},
+        on_event=lambda *event: events.append(event),
+        callback=None,
+    )
+    assert out["message"] == "Ok" and events == []
@@ -0,0 +1,75 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import torch
+
+from bizyair.commands.coalescer import RequestCoalescer
+from bizyair.commands.servers.prompt_server import PromptServer
+from bizyair.image_utils import encode_data
+
+shared = {"1": {"class_type": "VAELoader", "inputs": {}}}
+image = {**shared, "2": {"class_type": "VAEDecode", "inputs": {"vae": ["1", 0]}}}
+mask = {**shared, "3": {"class_type": "ImageToMask", "inputs": {"vae": ["1", 0]}}}
+other = {"4": {"class_type": "EmptyImage", "inputs": {}}}
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def coalescer(calls):
+    lock = threading.Lock()
+
+    def execute(prompt, last_node_ids):
+        with lock:
+            calls.append((sorted(prompt), last_node_ids))
+        if "error" in last_node_ids:
+            raise ConnectionError("boom")
+        return {node_id: f"out{node_id}" for node_id in last_node_ids}
+
+    return RequestCoalescer(execute, window=0.1)
+
+
+def submit_all(coalescer, requests):
+    with ThreadPoolExecutor(len(requests)) as pool:
+        futures = [pool.submit(coalescer.submit, *request) for request in requests]
+        return [future.result() for future in futures]
+
+
+def test_overlapping_graphs_share_a_request(coalescer, calls):
+    outs = submit_all(coalescer, [(image, "2"), (mask, "3"), (other, "4")])
+    assert outs == ["out2", "out3", "out4"]
+    assert sorted(calls) == [(["1", "2", "3"], ["2", "3"]), (["4"], ["4"])]
+    assert (coalescer.requests, coalescer.sent) == (3, 2)
+
+
+def test_errors_reach_every_member(coalescer, calls):
+    failing = {**shared, "error": {"class_type": "VAEDecode", "inputs": {}}}
+    with ThreadPoolExecutor(2) as pool:
+        futures = [
+            pool.submit(coalescer.submit, image, "2"),
+            pool.submit(coalescer.submit, failing, "error"),
+        ]
+        for future in futures:
+            with pytest.raises(ConnectionError):
+                future.result()
+    assert len(calls) == 1
+
+
+def test_prompt_server_fans_out_payloads():
+    def processor(url, prompt, last_node_ids, **kwargs):
+        payloads = {
+            node_id: encode_data([torch.full((1, 2), float(node_id))])
+            for node_id in last_node_ids
+        }
+        return {"data": {"payloads": payloads}}
+
+    server = PromptServer(
+        router=lambda **kwargs: "http://stand-in", processor=processor
+    )
+    outs = server.execute(prompt={**image, **mask}, last_node_ids=["2", "3"])
+    assert set(outs) == {"2", "3"}
+    assert torch.equal(outs["3"], torch.full((1, 2), 3.0))
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from bizyair.common import transport
+from bizyair.common.governor import RequestGovernor, parse_retry_after
+
+
+def test_token_bucket():
+    governor = RequestGovernor(rate=20, burst=2)
+    start = time.perf_counter()
+    for _ in range(6):
+        with governor.slot():
+            pass
+    # 2 from the burst, 4 at 20/s
+    assert 0.15 < time.perf_counter() - start < 0.5
+    assert governor.waits > 0
+
+
+def test_in_flight_limit_is_shared(tmp_path):
+    # Two governors on one directory behave like two ComfyUI processes
+    first = RequestGovernor(max_in_flight=1, directory=str(tmp_path))
+    second = RequestGovernor(max_in_flight=1, directory=str(tmp_path))
+    lease_id = first.acquire()
+    assert second._try_acquire("other") is not None
+    first.release(lease_id)
+    assert second._try_acquire("other") is None
+
+
+def test_dead_process_leases_are_reclaimed(tmp_path):
+    governor = RequestGovernor(max_in_flight=1, directory=str(tmp_path))
+    with governor._locked_state() as state:
+        state["leases"]["crashed"] = [2**22 + 12345, time.time()]
+    assert governor._try_acquire("mine") is None
+
+
+def test_async_acquire_off_the_loop(tmp_path):
+    governor = RequestGovernor(max_in_flight=1, directory=str(tmp_path))
+    threads = []
+    try_acquire = governor._try_acquire
+
+    def record(lease_id):
+        threads.append(threading.current_thread())
+        return try_acquire(lease_id)
+
+    governor._try_acquire = record
+
+    async def main():
+        async with governor.async_slot():
+            assert governor._read_state()["leases"]
+
+    asyncio.run(main())
+    assert threads and threading.main_thread() not in threads
+    assert governor._read_state()["leases"] == {}
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert 5 < parse_retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
+
+
+class _ThrottlingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = json.dumps({"message": "Too Many Requests"}).encode()
+        self.send_response(429)
+        self.send_header("Retry-After", "30")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def throttling_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ThrottlingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_retry_after_pauses_requests(throttling_server, monkeypatch):
+    governor = RequestGovernor()
+    monkeypatch.setattr(transport, "governor", governor)
+    response = transport.http_request("GET", throttling_server, raise_for_status=False)
+    assert response.status == 429
+    delay = governor._try_acquire("next")
+    assert 25 < delay <= 30
+
+
+def test_streamed_response_holds_slot(throttling_server, monkeypatch):
+    governor = RequestGovernor(max_in_flight=1)
+    monkeypatch.setattr(transport, "governor", governor)
+    response = transport.http_request(
+        "GET", throttling_server, raise_for_status=False, preload_content=False
+    )
+    assert len(governor._state["leases"]) == 1
+    response.read()
+    response.release_conn()
+    assert governor._state["leases"] == {}
@@ -0,0 +1,173 @@
+import base64
+
+import numpy as np
+import pytest
+import torch
+
+from bizyair import image_utils
+from bizyair.common.content_cache import BlobReferences, EncodedPayloadCache
+from bizyair.image_utils import (
+    BINARY_TENSOR_MARKER,
+    BLOB_MARKER,
+    BLOB_REFERENCE_MARKER,
+    TENSOR_MARKER,
+    TensorCodec,
+    base64_to_tensor,
+    comfy_image_to_uint8,
+    decode_comfy_image,
+    decode_data,
+    encode_comfy_image,
+    encode_data,
+    frame_to_tensor,
+    lz4,
+    tensor_to_base64,
+    tensor_to_frame,
+    uint8_to_comfy_image,
+    zstandard,
+)
+
+codecs = [
+    "raw",
+    "zlib",
+    pytest.param("lz4", marks=pytest.mark.skipif(lz4 is None, reason="no lz4")),
+    pytest.param(
+        "zstd", marks=pytest.mark.skipif(zstandard is None, reason="no zstandard")
+    ),
+]
+tensors = [
+    torch.randn(2, 4, 16, 16),
+    torch.randn(1, 77, 64).half(),
+    torch.randn(6, 4).t(),
+    torch.tensor(3.0),
+    torch.zeros(0, 3),
+    torch.arange(10),
+    torch.ones(2, dtype=torch.bool),
+]
+
+
+@pytest.mark.parametrize("codec", codecs)
+@pytest.mark.parametrize("tensor", tensors)
+def test_tensor_frame_roundtrip(codec, tensor):
+    encoded = encode_data(tensor, tensor_codec=codec)
+    assert encoded.startswith(BINARY_TENSOR_MARKER)
+
+    decoded = decode_data(encoded)
+    assert decoded.dtype == tensor.dtype
+    assert torch.equal(decoded, tensor)
+    assert decoded.numpy().flags.writeable
+
+
+def test_tensor_frame_header():
+    frame = tensor_to_frame(torch.zeros(2, 3), codec="zlib")
+    assert frame[:3] == b"BZT"
+    assert frame[4] == TensorCodec.ZLIB
+
+    with pytest.raises(ValueError):
+        frame_to_tensor(b"XXX" + frame[3:])
+    with pytest.raises(ValueError):
+        frame_to_tensor(frame[:3] + bytes([255]) + frame[4:])
+    with pytest.raises(ValueError):
+        tensor_to_frame(torch.zeros(1), codec="snappy")
+
+
+def test_legacy_tensor_marker():
+    tensor = torch.randn(1, 4, 8, 8)
+    encoded = encode_data(tensor, tensor_codec="pickle")
+    assert encoded.startswith(TENSOR_MARKER)
+    assert torch.equal(decode_data(encoded), tensor)
+
+    # base64_to_tensor keeps accepting pickles and also understands frames
+    assert torch.equal(base64_to_tensor(tensor_to_base64(tensor)), tensor)
+    frame_b64 = base64.b64encode(tensor_to_frame(tensor)).decode("utf-8")
+    assert torch.equal(base64_to_tensor(frame_b64), tensor)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_image_batch_roundtrip(monkeypatch, workers):
+    monkeypatch.setattr(image_utils, "BIZYAIR_IMAGE_CODEC_WORKERS", workers)
+    images = torch.randint(0, 256, (5, 32, 48, 3)).float() / 255.0
+
+    decoded = decode_comfy_image(encode_comfy_image(images, lossless=True))
+    assert decoded.shape == images.shape
+    assert decoded.dtype == torch.float32
+    assert torch.allclose(decoded, images)
+
+
+@pytest.mark.parametrize("shape", [(3, 17, 9, 3), (17, 9, 3), (2, 17, 9)])
+def test_comfy_image_uint8_conversion(shape):
+    images = torch.rand(shape) * 1.2 - 0.1
+    expected = np.clip(255.0 * images.numpy(), 0, 255).astype(np.uint8)
+    converted = comfy_image_to_uint8(images)
+    assert converted.dtype == np.uint8
+    assert np.array_equal(converted, expected)
+
+    restored = uint8_to_comfy_image(converted)
+    assert np.array_equal(restored, converted.astype(np.float32) / 255.0)
+
+
+def test_encode_payload_cache(monkeypatch):
+    cache = EncodedPayloadCache(max_bytes=1 << 20)
+    monkeypatch.setattr(image_utils, "payload_cache", cache)
+    tensor = torch.randn(1, 4, 8, 8)
+
+    encoded = encode_data(tensor, tensor_codec="zlib")
+    assert encode_data(tensor.clone(), tensor_codec="zlib") is encoded
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Another wire format or an in-place update is a different payload
+    assert encode_data(tensor, tensor_codec="raw") != encoded
+    tensor.add_(1)
+    assert torch.equal(decode_data(encode_data(tensor, tensor_codec="zlib")), tensor)
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    cache.max_bytes = cache.size
+    cache.put("other", "x")
+    assert cache.size <= cache.max_bytes
+    assert cache.get("other") == "x"
+
+
+def test_encode_inference_tensors(monkeypatch):
+    cache = EncodedPayloadCache(max_bytes=1 << 20)
+    monkeypatch.setattr(image_utils, "payload_cache", cache)
+    # ComfyUI runs nodes under inference mode, their outputs have no version counter
+    with torch.inference_mode():
+        image = torch.rand(1, 8, 8, 3)
+        latent = torch.randn(1, 4, 8, 8)
+    assert image.is_inference() and latent.is_inference()
+
+    encoded_image = encode_data(image)
+    encoded = encode_data(latent, tensor_codec="zlib")
+    assert encode_data(latent, tensor_codec="zlib") is encoded
+    assert torch.equal(decode_data(encoded), latent)
+
+    with torch.inference_mode():
+        latent.add_(1)
+    assert torch.equal(decode_data(encode_data(latent, tensor_codec="zlib")), latent)
+    assert encode_data(image) is encoded_image
+
+
+def test_blob_references(monkeypatch):
+    references = BlobReferences(ttl=60)
+    monkeypatch.setattr(image_utils, "blob_references", references)
+    prompt = {"1": {"inputs": {"a": torch.randn(2, 3), "b": torch.randn(2, 3)}}}
+
+    blobs, refs = {}, set()
+    first = encode_data(prompt, blobs=blobs, blob_refs=refs)
+    assert first["1"]["inputs"]["a"].startswith(BLOB_MARKER)
+    assert len(blobs) == 2 and not refs
+    references.remember(blobs)
+
+    prompt["1"]["inputs"]["c"] = torch.randn(2, 3)
+    blobs2, refs2 = {}, set()
+    second = encode_data(prompt, blobs=blobs2, blob_refs=refs2)
+    assert (
+        second["1"]["inputs"]["a"]
+        == BLOB_REFERENCE_MARKER + first["1"]["inputs"]["a"][5:]
+    )
+    assert refs2 == set(blobs) and len(blobs2) == 1
+    assert references.bytes_saved == sum(len(blob) for blob in blobs.values())
+
+    # After a failed request the referenced blobs are sent again
+    references.forget(refs2)
+    third = encode_data(prompt, blobs={}, blob_refs=set())
+    assert all(v.startswith(BLOB_MARKER) for v in third["1"]["inputs"].values())
@@ -0,0 +1,141 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from bizyair.commands.jobs import JobRunner
+from bizyair.commands.processors.prompt_processor import PromptProcessor
+from bizyair.common.job_journal import Job, JobJournal
+from bizyair.image_utils import TaskStatus
+
+
+class _JobServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _JobHandler)
+        self.submitted = []
+        # job id -> remaining statuses, the last one sticks
+        self.statuses = {}
+        self.fail_polls = 0
+
+
+class _JobHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status, out):
+        body = json.dumps(out).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        job_id = f"job{len(self.server.submitted)}"
+        self.server.submitted.append(self.headers["x-bizyair-job-key"])
+        self.server.statuses[job_id] = ["pending", "processing", "completed"]
+        self._reply(200, {"data": {"job_id": job_id, "status": "pending"}})
+
+    def do_GET(self):
+        parts = self.path.split("/jobs/")[1].split("/")
+        job_id = parts[0]
+        if job_id not in self.server.statuses:
+            return self._reply(404, {"message": "Not Found"})
+        if parts[-1] == "result":
+            return self._reply(200, {"data": {"payload": job_id}})
+        if self.server.fail_polls:
+            self.server.fail_polls -= 1
+            return self._reply(502, {"message": "Bad Gateway"})
+        statuses = self.server.statuses[job_id]
+        status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        out = {"status": status, "progress": {"value": 1, "total": 2}}
+        if status == "failed":
+            out["message"] = "out of memory"
+        self._reply(200, {"data": out})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def job_server():
+    server = _JobServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/supernode/test"
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        "bizyair.common.client._headers",
+        lambda: {"authorization": "Bearer sk-test"},
+    )
+    return JobRunner(JobJournal(directory=str(tmp_path)), poll_interval=0.01)
+
+
+def test_task_status_transitions():
+    job = Job(key="k", job_id="1", url="u")
+    job.transition(TaskStatus.PROCESSING)
+    job.transition(TaskStatus.COMPLETED)
+    assert job.status.is_final
+    with pytest.raises(RuntimeError):
+        job.transition(TaskStatus.PENDING)
+
+
+def test_submit_poll_fetch(job_server, runner):
+    events = []
+    processor = PromptProcessor(job_runner=runner)
+    out = processor._send(
+        job_server.url, b"{}", None, lambda *event: events.append(event), "key"
+    )
+    assert out == {"data": {"payload": "job0"}}
+    assert events == [(1, 2, None)] * 3
+    assert job_server.submitted == ["key"]
+    assert runner.journal.jobs() == []
+
+
+def test_resume_after_interruption(job_server, runner):
+    def interrupt(progress):
+        raise InterruptedError
+
+    with pytest.raises(InterruptedError):
+        runner.run(job_server.url, "key", b"{}", on_progress=interrupt)
+    (job,) = runner.journal.jobs()
+    assert (job.job_id, job.status) == ("job0", TaskStatus.PENDING)
+
+    # A new journal, as after a restart, picks up the running job
+    resumed = JobRunner(JobJournal(runner.journal.directory), poll_interval=0.01)
+    job_server.fail_polls = 2
+    assert resumed.run(job_server.url, "key", b"{}") == {"data": {"payload": "job0"}}
+    assert job_server.submitted == ["key"]
+    assert resumed.journal.jobs() == []
+
+
+def test_resubmit_unknown_job(job_server, runner):
+    runner.journal.put(Job(key="key", job_id="lost", url=job_server.url))
+    assert runner.run(job_server.url, "key", b"{}") == {"data": {"payload": "job0"}}
+    assert job_server.submitted == ["key"]
+
+
+def test_failed_job(job_server, runner):
+    job_server.statuses["job0"] = ["failed"]
+    runner.journal.put(Job(key="key", job_id="job0", url=job_server.url))
+    with pytest.raises(RuntimeError, match="out of memory"):
+        runner.run(job_server.url, "key", b"{}")
+    assert runner.journal.jobs() == []
+
+
+def test_expired_jobs_are_not_resumed(runner):
+    runner.journal.put(Job(key="key", job_id="job0", url="u", submitted_at=0))
+    assert runner.journal.get("key") is None
+
+
+@pytest.mark.parametrize("status", ["pending", "paused"])
+def test_unfollowable_status_drops_job(job_server, runner, status):
+    job_server.statuses["job0"] = ["processing", status]
+    runner.journal.put(Job(key="key", job_id="job0", url=job_server.url))
+    with pytest.raises((RuntimeError, ValueError)):
+        runner.run(job_server.url, "key", b"{}")
+    assert runner.journal.get("key") is None
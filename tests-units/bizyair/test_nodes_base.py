@@ -0,0 +1,71 @@
+import asyncio
+import inspect
+import time
+
+import pytest
+
+from bizyair import nodes_base
+from bizyair.nodes_base import NODE_CLASS_MAPPINGS, BizyAirBaseNode, ensure_concurrent
+
+
+class _Sleeper:
+    def run(self, seconds):
+        time.sleep(seconds)
+        return (seconds,)
+
+
+def test_concurrent_nodes_overlap():
+    run = ensure_concurrent(_Sleeper.run)
+    assert inspect.iscoroutinefunction(run)
+    assert run.sync_function is _Sleeper.run
+
+    async def main():
+        return await asyncio.gather(*(run(_Sleeper(), seconds=0.2) for _ in range(4)))
+
+    start = time.perf_counter()
+    assert asyncio.run(main()) == [(0.2,)] * 4
+    # Sequential execution would take 0.8s
+    assert time.perf_counter() - start < 0.6
+
+
+@pytest.fixture
+def concurrent_execution(monkeypatch):
+    monkeypatch.setattr(nodes_base, "BIZYAIR_CONCURRENT_EXECUTION", True)
+    monkeypatch.setattr(nodes_base, "comfy_supports_async_nodes", lambda: True)
+    before = set(NODE_CLASS_MAPPINGS)
+    yield
+    for name in set(NODE_CLASS_MAPPINGS) - before:
+        NODE_CLASS_MAPPINGS.pop(name)
+        nodes_base.NODE_DISPLAY_NAME_MAPPINGS.pop(name)
+
+
+def test_only_cloud_nodes_become_async(concurrent_execution):
+    class ConcurrentDecode(BizyAirBaseNode):
+        CATEGORY = "testing"
+        RETURN_TYPES = ("IMAGE",)
+        FUNCTION = "decode"
+
+        @classmethod
+        def INPUT_TYPES(cls):
+            return {"required": {}}
+
+        def decode(self, **kwargs):
+            return (self.assigned_id,)
+
+    class ConcurrentDecodeSubclass(ConcurrentDecode):
+        pass
+
+    class ConcurrentLoader(BizyAirBaseNode):
+        CATEGORY = "testing"
+        RETURN_TYPES = ("BIZYAIR_MODEL",)
+
+        @classmethod
+        def INPUT_TYPES(cls):
+            return {"required": {}}
+
+    assert not inspect.iscoroutinefunction(ConcurrentLoader.default_function)
+    for cls in (ConcurrentDecode, ConcurrentDecodeSubclass):
+        assert inspect.iscoroutinefunction(cls.decode)
+        # The inherited coroutine is not wrapped a second time
+        assert not inspect.iscoroutinefunction(cls.decode.sync_function)
+        assert asyncio.run(cls().decode(unique_id="7")) == ("7",)
@@ -0,0 +1,59 @@
+import pytest
+
+from bizyair.image_utils import encode_data
+from bizyair.nodes_io import BizyAirNodeIO
+
+
+def make_chain(n):
+    io = BizyAirNodeIO("1")
+    io.add_node_data(class_type="CheckpointLoaderSimple", inputs={"ckpt_name": "a"})
+    for node_id in range(2, n + 1):
+        new_io = io.copy(str(node_id))
+        new_io.add_node_data(class_type="LoraLoader", inputs={"model": io})
+        io = new_io
+    return io
+
+
+def test_chain_flattens_once_at_the_end():
+    io = make_chain(300)
+    nodes = io.nodes
+    assert list(nodes) == [str(i) for i in range(1, 301)]
+    assert nodes["300"]["inputs"]["model"].node_id == "299"
+    assert io.nodes is nodes
+    assert encode_data(nodes)["300"]["inputs"]["model"] == ["299", 0]
+
+
+def test_fan_in_shares_ancestors():
+    base = make_chain(3)
+    left, right = base.copy("10"), base.copy("20")
+    left.add_node_data(class_type="CLIPTextEncode", inputs={"clip": base})
+    right.add_node_data(class_type="CLIPTextEncode", inputs={"clip": base})
+    combined = left.copy("30")
+    combined.add_node_data(
+        class_type="ConditioningCombine",
+        inputs={"conditioning_1": left, "conditioning_2": right},
+    )
+    assert sorted(combined.nodes, key=int) == ["1", "2", "3", "10", "20", "30"]
+
+
+def test_graphs_are_snapshots():
+    parent = make_chain(2)
+    child = parent.copy("3")
+    child.add_node_data(class_type="VAEDecode", inputs={"vae": parent})
+
+    # Adding to the parent afterwards does not leak into the child
+    parent.add_node_data(class_type="LoraLoader", inputs={"strength": 2})
+    assert "strength" not in child.nodes["2"]["inputs"]
+    assert parent.nodes["2"]["inputs"] == {"strength": 2}
+
+
+def test_no_shared_default_nodes():
+    first, second = BizyAirNodeIO("1"), BizyAirNodeIO("2")
+    first.add_node_data(class_type="UpscaleModelLoader", inputs={})
+    assert second.nodes == {}
+
+
+def test_copy_to_existing_id():
+    io = make_chain(2)
+    with pytest.raises(ValueError):
+        io.copy("2")
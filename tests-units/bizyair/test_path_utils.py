@@ -1,6 +1,7 @@
 import pytest
 
-from bizyair.path_utils import guess_config
+from bizyair.configs.conf import InputMatcher
+from bizyair.path_utils import guess_config, guess_url_from_node
 
 test_data = {
     "ckpt_name": [
@@ -41,3 +42,33 @@ def test_guess_config(input_type, input_values_with_expected):
         assert result.endswith(
             expected_result
         ), f"Test failed for {input_type=} and {input_value=}. Expected {expected_result}, but got {result}."
+
+
+@pytest.mark.parametrize(
+    "value, matched",
+    [
+        ("flux/flux1-dev.sft", True),
+        ("flux/flux1-dev.sft\n", True),
+        # "." is a regex wildcard in the rule patterns
+        ("flux/flux1-devXsft", True),
+        ("flux/flux1-dev.sft.bak", False),
+        ("sdxl/HelloWorldXL_v70.safetensors", True),
+        (["1", 0], False),
+        (None, False),
+    ],
+)
+def test_input_matcher(value, matched):
+    matcher = InputMatcher.compile(["^flux/flux1-dev.sft$", "^sdxl.*"])
+    assert matcher.literals == {"flux/flux1-dev.sft"}
+    assert matcher.match(value) is matched
+
+
+def test_guess_url_from_node():
+    node = {
+        "class_type": "BizyAir_UNETLoader",
+        "inputs": {"unet_name": "flux/flux1-dev.sft"},
+    }
+    rules = guess_url_from_node(node, {})
+    assert [rule.describe for rule in rules] == ["flux1-dev"]
+    assert guess_url_from_node(node, {}) == rules
+    assert guess_url_from_node({"class_type": "KSampler", "inputs": {}}, {}) == []
@@ -0,0 +1,85 @@
+import pytest
+import torch
+
+from bizyair.commands.servers import prompt_server
+from bizyair.commands.servers.prompt_server import PromptServer
+from bizyair.common import result_cache as result_cache_module
+from bizyair.common.result_cache import ResultCache
+from bizyair.image_utils import encode_data
+
+
+def make_result(value):
+    return {"data": {"payload": encode_data([torch.full((1, 4), value)])}}
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    cache = ResultCache(memory_bytes=1 << 20, disk_bytes=1 << 20, directory=tmp_path)
+    key = ResultCache.key("url", {"1": {"class_type": "A", "inputs": {}}}, ["1"])
+    assert cache.get(key) is None
+
+    cache.put(key, {"data": 1})
+    assert cache.get(key) == {"data": 1}
+
+    # A new process only has the disk tier
+    fresh = ResultCache(memory_bytes=1 << 20, disk_bytes=1 << 20, directory=tmp_path)
+    assert fresh.get(key) == {"data": 1}
+    assert (fresh.hits, fresh.misses) == (1, 0)
+
+
+def test_lru_eviction(tmp_path):
+    entry = {"data": "x" * 100}
+    cache = ResultCache(memory_bytes=250, disk_bytes=250, directory=tmp_path)
+    for key in ("a", "b"):
+        cache.put(key, entry)
+    cache.get("a")
+    cache.put("c", entry)
+
+    assert set(cache._memory) == {"a", "c"}
+    assert sorted(p.stem for p in tmp_path.iterdir()) == ["a", "c"]
+
+
+def test_key_is_canonical():
+    prompt = {"1": {"class_type": "A", "inputs": {"x": 1, "y": "BLOB:abc-raw"}}}
+    same = {"1": {"inputs": {"y": "BLOBREF:abc-raw", "x": 1}, "class_type": "A"}}
+    assert ResultCache.key("u", prompt, ["1"]) == ResultCache.key("u", same, ["1"])
+    assert ResultCache.key("u", prompt, ["1"]) != ResultCache.key("u", prompt, ["2"])
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    calls = []
+
+    def processor(url, prompt, last_node_ids, **kwargs):
+        calls.append(prompt)
+        return make_result(len(calls))
+
+    cache = ResultCache(memory_bytes=1 << 20, disk_bytes=1 << 20, directory=tmp_path)
+    monkeypatch.setattr(prompt_server, "result_cache", cache)
+    server = PromptServer(
+        router=lambda **kwargs: "http://stand-in", processor=processor
+    )
+    return server, calls
+
+
+def test_prompt_server_reuses_results(server):
+    server, calls = server
+    prompt = {"1": {"class_type": "VAEDecode", "inputs": {"seed": 1}}}
+
+    first = server.execute(prompt=prompt, last_node_ids=["1"])
+    second = server.execute(prompt=prompt, last_node_ids=["1"])
+    assert len(calls) == 1
+    assert torch.equal(first, second)
+
+    server.execute(
+        prompt={"1": {**prompt["1"], "inputs": {"seed": 2}}}, last_node_ids=["1"]
+    )
+    assert len(calls) == 2
+
+
+def test_prompt_server_skips_not_idempotent(server, monkeypatch):
+    server, calls = server
+    monkeypatch.setattr(result_cache_module, "uncacheable_class_types", {"Random"})
+    prompt = {"1": {"class_type": "Random", "inputs": {}}}
+    for _ in range(2):
+        server.execute(prompt=prompt, last_node_ids=["1"])
+    assert len(calls) == 2
@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from bizyair.common import client, retry
+from bizyair.common.retry import LatencyHistogram, RetryPolicy, hedged_call
+
+
+class _FlakyHandler(BaseHTTPRequestHandler):
+    """Answers 503 to the first `failures` requests of each path."""
+
+    protocol_version = "HTTP/1.1"
+    failures = 2
+    seen = {}
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        calls = self.seen.setdefault(self.path, [])
+        calls.append(self.headers.get("Idempotency-Key"))
+        status = 503 if len(calls) <= self.failures else 200
+        body = json.dumps({"message": "Ok", "calls": len(calls)}).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def flaky_server(monkeypatch):
+    monkeypatch.setattr(client, "retry_policy", RetryPolicy(retries=3, backoff=0.001))
+    _FlakyHandler.seen = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FlakyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_get_is_retried(flaky_server):
+    out = client.send_request(
+        method="GET", url=f"{flaky_server}/get", headers={}, callback=None
+    )
+    assert out["calls"] == 3
+    assert client.retry_policy.retried == 2
+
+
+def test_post_needs_idempotency_key(flaky_server, monkeypatch):
+    with pytest.raises(ConnectionError):
+        client.send_request(url=f"{flaky_server}/once", data=b"{}", headers={})
+    assert len(_FlakyHandler.seen["/once"]) == 1
+
+    # The key alone is not trusted, the server may not deduplicate on it
+    for send in (client.send_request, client.send_stream_request):
+        with pytest.raises(ConnectionError):
+            send(
+                url=f"{flaky_server}/{send.__name__}",
+                data=b"{}",
+                headers={},
+                idempotency_key="abc",
+            )
+        assert _FlakyHandler.seen[f"/{send.__name__}"] == ["abc"]
+
+    monkeypatch.setattr(client, "BIZYAIR_IDEMPOTENT_RETRIES", True)
+
+    out = client.send_request(
+        url=f"{flaky_server}/keyed",
+        data=b"{}",
+        headers={},
+        idempotency_key="abc",
+        callback=None,
+    )
+    assert out["calls"] == 3
+    # Every replay carries the same key
+    assert _FlakyHandler.seen["/keyed"] == ["abc"] * 3
+
+
+def test_retries_give_up(flaky_server, monkeypatch):
+    monkeypatch.setattr(_FlakyHandler, "failures", 10)
+    with pytest.raises(ConnectionError, match="503"):
+        client.send_request(method="GET", url=f"{flaky_server}/down", headers={})
+    assert len(_FlakyHandler.seen["/down"]) == 4
+
+
+def test_backoff_is_bounded():
+    policy = RetryPolicy(backoff=1, max_backoff=5)
+    assert all(0 <= policy.delay(attempt) <= 5 for attempt in range(10))
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.5) is None
+    for seconds in [0.01] * 90 + [1.0] * 10:
+        histogram.observe(seconds)
+    assert 0.01 <= histogram.quantile(0.5) < 0.015
+    assert 1.0 <= histogram.quantile(0.95) < 1.5
+
+    retry.observe_latency("GET", "http://host/models?type=lora", 0.02)
+    assert retry.latency_stats()["endpoints"]["GET host/models"]["count"] >= 1
+
+
+def test_endpoints_by_route(monkeypatch):
+    endpoint_of = retry.endpoint_of
+    assert endpoint_of("GET", "http://host/supernode/x/jobs/job0/result") == (
+        "GET host/supernode/x/jobs/{id}/result"
+    )
+    assert endpoint_of("GET", "http://host/ab12cd/models/files?type=lora") == (
+        "GET host/{share_id}/models/files"
+    )
+    assert endpoint_of("DELETE", "http://host/models/1234") == "DELETE host/models/{id}"
+    assert endpoint_of("GET", f"http://host/files/{'f' * 64}") == "GET host/files/{id}"
+    assert endpoint_of("GET", "http://host/models/files") == "GET host/models/files"
+
+    monkeypatch.setattr(retry, "latency_histograms", {})
+    monkeypatch.setattr(retry, "MAX_ENDPOINTS", 2)
+    for route in ["a", "b", "c"]:
+        retry.observe_latency("GET", f"http://host/{route}", 0.01)
+    assert sorted(retry.latency_histograms) == ["GET host/a", "GET host/b"]
+
+
+def test_hedged_call():
+    calls = []
+
+    def slow_then_fast():
+        calls.append(None)
+        time.sleep(0.5 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    start = time.perf_counter()
+    assert hedged_call(slow_then_fast, delay=0.05) == 2
+    assert time.perf_counter() - start < 0.3
+    assert hedged_call(lambda: "fast", delay=1) == "fast"
@@ -0,0 +1,165 @@
+"""
+python tools/benchmark_http_transport.py \
+    -n <requests_per_mode>
+
+Compares requests/s of the legacy per-call urllib/aiohttp clients with the
+pooled keep-alive transport in bizyair.common.transport against a local
+aiohttp stand-in for bizyair-api.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from bizyair.common import client  # noqa: E402
+from bizyair.common.transport import close_sessions  # noqa: E402
+
+HEADERS = {
+    "accept": "application/json",
+    "content-type": "application/json",
+    "authorization": "Bearer sk-benchmark",
+}
+PAYLOAD = json.dumps({"prompt": {}, "last_node_id": "1"}).encode("utf-8")
+
+
+def make_self_signed_cert() -> ssl.SSLContext:
+    if "BIZYAIR_BENCH_KEY_FILE" not in os.environ:
+        workdir = tempfile.mkdtemp()
+        certfile = os.path.join(workdir, "cert.pem")
+        keyfile = os.path.join(workdir, "key.pem")
+        subprocess.check_call(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1"]
+            + ["-keyout", keyfile, "-out", certfile, "-subj", "/CN=127.0.0.1"]
+            + ["-addext", "subjectAltName=IP:127.0.0.1"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        # aiohttp builds its default SSL context at import time, so restart with
+        # SSL_CERT_FILE set for urllib, urllib3 and aiohttp alike.
+        os.environ["SSL_CERT_FILE"] = certfile
+        os.environ["BIZYAIR_BENCH_KEY_FILE"] = keyfile
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ssl_context.load_cert_chain(
+        os.environ["SSL_CERT_FILE"], os.environ["BIZYAIR_BENCH_KEY_FILE"]
+    )
+    return ssl_context
+
+
+def start_stand_in_server(ssl_context=None) -> str:
+    async def handler(request):
+        await request.read()
+        return web.json_response({"message": "Ok", "data": {"payload": []}})
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+    runner = web.AppRunner(app, access_log=None)
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", port, ssl_context=ssl_context)
+        loop.run_until_complete(site.start())
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    time.sleep(0.5)
+    scheme = "https" if ssl_context else "http"
+    return f"{scheme}://127.0.0.1:{port}/supernode/benchmark"
+
+
+def legacy_send_request(url):
+    req = urllib.request.Request(url, data=PAYLOAD, headers=HEADERS, method="POST")
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+async def legacy_async_send_request(url):
+    async with aiohttp.ClientSession() as session:
+        async with session.request("POST", url, data=PAYLOAD, headers=HEADERS) as r:
+            return json.loads(await r.text())
+
+
+def bench_sync(name, fn, url, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn(url)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {n / elapsed:>10.1f} req/s")
+
+
+async def bench_async(name, fn, url, n, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await fn(url)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {n / elapsed:>10.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=500)
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--tls", action="store_true", help="serve https to include handshake cost"
+    )
+    args = parser.parse_args()
+
+    ssl_context = make_self_signed_cert() if args.tls else None
+    url = start_stand_in_server(ssl_context)
+
+    def pooled_send_request(url):
+        return client.send_request(
+            url=url, data=PAYLOAD, headers=dict(HEADERS), callback=None
+        )
+
+    async def pooled_async_send_request(url):
+        return await client.async_send_request(
+            url=url, data=PAYLOAD, headers=dict(HEADERS), callback=None
+        )
+
+    bench_sync("sync urllib (legacy)", legacy_send_request, url, args.n)
+    bench_sync("sync pooled", pooled_send_request, url, args.n)
+
+    async def run_async():
+        await bench_async(
+            "async session/call (legacy)",
+            legacy_async_send_request,
+            url,
+            args.n,
+            args.concurrency,
+        )
+        await bench_async(
+            "async pooled", pooled_async_send_request, url, args.n, args.concurrency
+        )
+        await close_sessions()
+
+    asyncio.run(run_async())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+python tools/benchmark_image_conversion.py \
+    -b <batch size> -r <repeats>
+
+Compares the per-image float <-> uint8 conversions bizyair.image_utils used before
+with comfy_image_to_uint8 / uint8_to_comfy_image, reporting the best time and the
+peak memory numpy allocates while converting one batch (outputs included).
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from bizyair.image_utils import (  # noqa: E402
+    comfy_image_to_uint8,
+    format_bytes,
+    uint8_to_comfy_image,
+)
+
+SHAPES = {
+    "512x512": (512, 512, 3),
+    "1024x1024": (1024, 1024, 3),
+    "2048x2048": (2048, 2048, 3),
+}
+
+
+def legacy_to_uint8(images):
+    return [
+        np.clip(255.0 * image.cpu().numpy(), 0, 255).astype(np.uint8)
+        for image in images
+    ]
+
+
+def legacy_to_float(arrays):
+    return torch.cat(
+        [
+            torch.from_numpy(np.array(a).astype(np.float32) / 255.0)[None,]
+            for a in arrays
+        ]
+    )
+
+
+def fused_to_float(arrays):
+    output = torch.empty((len(arrays), *arrays[0].shape), dtype=torch.float32)
+    output_np = output.numpy()
+    for index, array in enumerate(arrays):
+        uint8_to_comfy_image(array, out=output_np[index])
+    return output
+
+
+def measure(fn, arg, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = fn(arg)
+        best = min(best, time.perf_counter() - start)
+
+    # torch.empty/torch.cat outputs are not traced, numpy arrays are
+    tracemalloc.start()
+    fn(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--batch", type=int, default=4)
+    parser.add_argument("-r", "--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'shape':<12} {'path':<16} {'time ms':>9} {'peak alloc':>11}")
+    for name, shape in SHAPES.items():
+        images = torch.rand(args.batch, *shape)
+        rows = []
+        for label, fn in (
+            ("encode legacy", legacy_to_uint8),
+            ("encode fused", comfy_image_to_uint8),
+        ):
+            rows.append((label, *measure(fn, images, args.repeats)))
+        assert np.array_equal(np.stack(rows[0][3]), rows[1][3])
+
+        arrays = list(rows[1][3])
+        for label, fn in (
+            ("decode legacy", legacy_to_float),
+            ("decode fused", fused_to_float),
+        ):
+            rows.append((label, *measure(fn, arrays, args.repeats)))
+        assert torch.equal(rows[2][3], rows[3][3])
+
+        for label, seconds, peak, _ in rows:
+            print(
+                f"{name:<12} {label:<16} {seconds * 1000:>9.2f} {format_bytes(peak):>11}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+python tools/benchmark_node_graph.py \
+    -n <nodes per chain> -r <repeats>
+
+Builds BizyAir graphs the way nodes.py does (copy the input, add one node) with
+the dict-copying BizyAirNodeIO of before and the parent-linked one, for a LoRA
+style chain and for conditioning combines of two chains, and flattens each
+once as send_request does.
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+warnings.simplefilter("ignore")
+
+from bizyair.nodes_io import BizyAirNodeIO, create_node_data  # noqa: E402
+
+
+class LegacyNodeIO:
+    """BizyAirNodeIO before the parent-linked graph."""
+
+    def __init__(self, node_id="0", nodes=None):
+        self.node_id = node_id
+        self.nodes = {} if nodes is None else nodes
+
+    def copy(self, new_node_id=None):
+        if new_node_id in self.nodes:
+            raise ValueError(f"Node ID '{new_node_id}' already exists.")
+        return LegacyNodeIO(nodes=self.nodes.copy(), node_id=new_node_id)
+
+    def add_node_data(self, class_type, inputs, outputs={"slot_index": 0}):
+        node_data = create_node_data(class_type, inputs, outputs)
+        for other in inputs.values():
+            if isinstance(other, LegacyNodeIO):
+                self.nodes.update(other.nodes)
+        self.nodes[self.node_id] = node_data
+
+
+def chain(cls, n, first_id=1):
+    io = cls(
+        str(first_id),
+        {str(first_id): create_node_data("Loader", {}, {"slot_index": 0})},
+    )
+    for node_id in range(first_id + 1, first_id + n):
+        new_io = io.copy(str(node_id))
+        new_io.add_node_data("LoraLoader", {"model": io, "strength": 1.0})
+        io = new_io
+    return io
+
+
+def combines(cls, n):
+    left, right = chain(cls, n // 2, 1), chain(cls, n // 2, 100000)
+    for node_id in range(200000, 200000 + n):
+        io = left.copy(str(node_id))
+        io.add_node_data("ConditioningCombine", {"a": left, "b": right})
+        left = io
+    return left
+
+
+def measure(build, cls, n, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        nodes = build(cls, n).nodes
+        best = min(best, time.perf_counter() - start)
+    return best, len(nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--nodes", type=int, default=200)
+    parser.add_argument("-r", "--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    for name, build in (("chain", chain), ("combines", combines)):
+        legacy, legacy_nodes = measure(build, LegacyNodeIO, args.nodes, args.repeats)
+        linked, linked_nodes = measure(build, BizyAirNodeIO, args.nodes, args.repeats)
+        assert legacy_nodes == linked_nodes
+        print(
+            f"{name:<9} {linked_nodes:>5} nodes  legacy {legacy * 1000:8.3f} ms  "
+            f"parent-linked {linked * 1000:8.3f} ms  ({legacy / linked:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
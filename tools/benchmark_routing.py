@@ -0,0 +1,122 @@
+"""
+python tools/benchmark_routing.py \
+    -r <repeats>
+
+Routes every examples/*.json workflow with SearchServiceRouter, once with the
+per-lookup rule construction and re.search of before and once with the
+compiled routing index of ConfigManager, and checks both pick the same route.
+
+The examples are saved in the UI format, so they are converted to prompts:
+links become [node_id, slot] and the first widget of a node that has routing
+rules is named after the input those rules look at (the model file name).
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from bizyair.commands.processors import prompt_processor  # noqa: E402
+from bizyair.commands.processors.prompt_processor import (  # noqa: E402
+    SearchServiceRouter,
+)
+from bizyair.configs.conf import config_manager  # noqa: E402
+
+
+def to_prompts(workflow: dict) -> list:
+    """One (prompt, [last_node_id]) per BizyAir node that feeds no BizyAir node,
+    which is what a queued workflow sends."""
+    links = {link[0]: link for link in workflow["links"]}
+    types = {str(node["id"]): node["type"] for node in workflow["nodes"]}
+    rule_manager = config_manager.model_rules
+    prompt, feeds_bizyair = {}, set()
+    for node in workflow["nodes"]:
+        class_type = node["type"]
+        inputs = {}
+        for node_input in node.get("inputs") or []:
+            link = links.get(node_input.get("link"))
+            if link is not None:
+                inputs[node_input["name"]] = [str(link[1]), link[2]]
+                if class_type.startswith("BizyAir_"):
+                    feeds_bizyair.add(str(link[1]))
+        widgets = node.get("widgets_values")
+        keys = rule_manager.routing_keys.get(class_type.replace("BizyAir_", "", 1))
+        if keys and isinstance(widgets, list) and widgets:
+            inputs[keys[0]] = widgets[0]
+        prompt[str(node["id"])] = {"class_type": class_type, "inputs": inputs}
+    return [
+        (prompt, [node_id])
+        for node_id, class_type in types.items()
+        if class_type.startswith("BizyAir_") and node_id not in feeds_bizyair
+    ]
+
+
+def legacy_guess_url_from_node(node, class_type_table):
+    # A new ModelRule per rule on every lookup and a re.search per pattern
+    class_type = node["class_type"].replace("BizyAir_", "", 1)
+    rule_manager = config_manager.model_rules
+    rules = [
+        rule_manager._build_rule(class_type, idx_1, idx_2)
+        for idx_1, idx_2 in rule_manager.find_rule_indexes(class_type)
+    ]
+    return [
+        rule
+        for rule in rules
+        if all(
+            any(re.search(p, node["inputs"][key]) is not None for p in patterns)
+            for key, patterns in rule.inputs.items()
+        )
+    ]
+
+
+def route_all(router, prompts, repeats):
+    best, routes = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        routes = [
+            router.process(prompt, last_node_ids) for prompt, last_node_ids in prompts
+        ]
+        best = min(best, time.perf_counter() - start)
+    return best, routes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(ROOT, "examples", "*.json")))
+    prompts = []
+    for file in files:
+        with open(file, "r", encoding="utf-8") as f:
+            prompts.extend(to_prompts(json.load(f)))
+    router = SearchServiceRouter()
+
+    compiled_guess = prompt_processor.guess_url_from_node
+    prompt_processor.guess_url_from_node = legacy_guess_url_from_node
+    try:
+        legacy_time, legacy_routes = route_all(router, prompts, args.repeats)
+    finally:
+        prompt_processor.guess_url_from_node = compiled_guess
+    compiled_time, compiled_routes = route_all(router, prompts, args.repeats)
+    assert legacy_routes == compiled_routes
+
+    print(f"{len(files)} workflows, {len(prompts)} requests")
+    for name, seconds in (("legacy", legacy_time), ("compiled", compiled_time)):
+        print(
+            f"{name:<9} {seconds * 1000:8.3f} ms for all workflows, "
+            f"{seconds / len(files) * 1e6:8.1f} us per workflow"
+        )
+    print(
+        f"memoized signatures: {config_manager.model_rules._match_signature.cache_info()}"
+    )
+
+
+if __name__ == "__main__":
+    main()
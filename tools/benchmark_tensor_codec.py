@@ -0,0 +1,73 @@
+"""
+python tools/benchmark_tensor_codec.py \
+    -r <repeats>
+
+Compares the legacy pickle+zlib+base64 tensor encoding with the binary tensor
+frames of bizyair.image_utils on typical LATENT and CONDITIONING shapes.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from bizyair.image_utils import (  # noqa: E402
+    decode_data,
+    encode_tensor,
+    format_bytes,
+    lz4,
+    zstandard,
+)
+
+SHAPES = {
+    "LATENT sdxl 1x4x128x128": (1, 4, 128, 128),
+    "LATENT sdxl 4x4x128x128": (4, 4, 128, 128),
+    "LATENT flux 1x16x128x128": (1, 16, 128, 128),
+    "COND sdxl 1x77x2048": (1, 77, 2048),
+    "COND sdxl pooled 1x1280": (1, 1280),
+    "COND flux t5 1x256x4096": (1, 256, 4096),
+}
+
+
+def timeit(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    codecs = ["pickle", "raw", "zlib"]
+    codecs += ["lz4"] if lz4 is not None else []
+    codecs += ["zstd"] if zstandard is not None else []
+
+    print(
+        f"{'shape':<26} {'codec':<7} {'size':>10} {'encode ms':>10} {'decode ms':>10}"
+    )
+    for name, shape in SHAPES.items():
+        # Sampled latents/embeddings are noisy, randn is a realistic worst case
+        tensor = torch.randn(shape)
+        for codec in codecs:
+            enc_time, encoded = timeit(
+                lambda: encode_tensor(tensor, codec), args.repeats
+            )
+            dec_time, decoded = timeit(lambda: decode_data(encoded), args.repeats)
+            assert torch.equal(decoded, tensor)
+            print(
+                f"{name:<26} {codec:<7} {format_bytes(len(encoded)):>10} "
+                f"{enc_time * 1000:>10.2f} {dec_time * 1000:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,13 @@ import base64
 import json
 import os
 import pickle
-import urllib.parse
-import urllib.request
 import zlib
 from typing import List, Tuple, Union
 
 import numpy as np
+import urllib3
+
+from bizyair.common.transport import http_request
 
 BIZYAIR_DEBUG = os.getenv("BIZYAIR_DEBUG", False)
 
@@ -26,11 +27,10 @@ def send_post_request(api_url, payload, headers):
     """
     try:
         data = json.dumps(payload).encode("utf-8")
-        req = urllib.request.Request(api_url, data=data, headers=headers, method="POST")
-        with urllib.request.urlopen(req) as response:
-            response_data = response.read().decode("utf-8")
+        response = http_request("POST", api_url, data=data, headers=headers)
+        response_data = response.data.decode("utf-8")
         return response_data
-    except urllib.error.URLError as e:
+    except urllib3.exceptions.HTTPError as e:
         if "Unauthorized" in str(e):
             raise Exception(
                 "Key is invalid, please refer to https://cloud.siliconflow.cn to get the API key.\n"